@@ -55,7 +55,11 @@ class Blacklist_Source:
         return os.path.join(self.csv_dir, self.__class__.__name__)
 
     def parse(self):
-        with open(self.path, 'r', encoding="utf-8", errors="ignore") as f:
+        # gzipped sources are decompressed as they are read
+        with utils.open_decompressed(self.path,
+                                     "rt",
+                                     encoding="utf-8",
+                                     errors="ignore") as f:
             return self.parse_file(f)
 
     def parse_file(self, f):
@@ -11,8 +11,8 @@ using Python's built-in FTP library.
 Guidelines:
 1. Maintain a table of files that have been parsed.
 2. Extract the URLs. This step is not multiprocessed.
-3. Use the URLs to multiprocess the downloading, reformatting, and insertion
-of all roas.csv files.
+3. Use the URLs to multiprocess the downloading, and the streaming
+reformat and insertion of all roas.csv files.
 """
 
 __author__ = "Tony Zheng"
@@ -57,7 +57,7 @@ class Historical_ROAs_Parser(Parser):
         # using four times # of CPUs
         with utils.Pool(0, 4, self.name) as pool:
             pool.map(utils.download_file, urls, download_paths)
-            pool.map(self._reformat_csv, download_paths)
+            # Reformatted as they are copied, no rewrite of the csv
             pool.map(self._db_insert, download_paths)
 
         with Historical_ROAs_Table() as t:
@@ -100,24 +100,25 @@ class Historical_ROAs_Parser(Parser):
 
         return download_paths
 
-    def _reformat_csv(self, csv):
-        """Delete URI (1st) column using cut,
-           delete the first row (column names),
-           delete 'AS', add the date, replace commas with tabs using sed"""
+    def _reformat_lines(self, csv):
+        """Yields the csv reformatted in a single streaming pass
 
-        # avoid using extra backslashes because sed uses them as delimiter
-        date = csv[-19:-9].replace('/', '-')
-        cmds = [f'cut -d , -f 1 --complement <{csv} >{csv}.new',
-                f'mv {csv}.new {csv}',
-                f'sed -i "1d" {csv}',
-                f'sed -i "s/AS//g" {csv}',
-                f'sed -i "s/,/\t/g" {csv}',
-                f'sed -i "s/$/\t{date}/" {csv}']
+        Deletes the URI (1st) column, the first row (column names),
+        and 'AS', adds the date, and replaces commas with tabs. This
+        used to be a cut and five sed passes, each rewriting the file.
+        """
 
-        utils.run_cmds(cmds)
+        date = csv[-19:-9].replace('/', '-')
+        with utils.open_decompressed(csv, "rt") as f:
+            # Skip the column names
+            next(f, None)
+            for line in f:
+                line = line.rstrip("\n").replace("AS", "")
+                yield line.split(",", 1)[-1].replace(",", "\t") \
+                    + f"\t{date}\n"
 
     def _db_insert(self, csv):
-        utils.csv_to_db(Historical_ROAs_Table, csv)
+        utils.stream_to_db(Historical_ROAs_Table, self._reformat_lines(csv))
 
     def _get_csvs(self):
         """
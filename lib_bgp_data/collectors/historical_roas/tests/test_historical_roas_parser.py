@@ -75,7 +75,7 @@ class Test_Historical_ROAs_Parser:
             sql = f"DELETE FROM {t.name} WHERE file = '{file_name}'"
             t.execute(sql)
 
-    def test_reformat_csv(self):
+    def test_reformat_lines(self):
         """
         Tests the reformatting. See the docstring for the method
         for what it does exactly.
@@ -101,8 +101,6 @@ class Test_Historical_ROAs_Parser:
             f.write(s)
 
         try:
-            parser._reformat_csv(test_csv)
-            with open(test_csv, 'r') as f:
-                assert f.read() == correct
+            assert "".join(parser._reformat_lines(test_csv)) == correct
         finally:
             utils.delete_paths(os.path.join(parser.path, 'test_reformat_csv'))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Ingest_Telemetry
+
+The purpose of this class is to know where the time of an MRT_Parser
+run went. Runs used to only log when they started and ended, so there
+was no way to tell if a slow run was slow because of a collector's
+mirror, bz2 decompression, decoding, or COPY, or to tell if a change
+made any of them faster.
+
+Every file records the bytes downloaded, the seconds to download it,
+the decompressed bytes, the rows emitted, and the seconds spent
+decoding, in COPY, and in CHECKPOINT (see MRT_File.parse_file). These
+are summed per collector, written to mrt_ingest_summary, and written
+as a json report that also has every file's metrics.
+
+Design choices:
+    -Metrics are plain dicts returned by parse_file, so they are
+     pickled back from the parse processes with no shared state
+    -Decoding and COPY run at the same time, since rows are decoded as
+     COPY reads them. Decode seconds are the time spent making rows,
+     and copy seconds are the rest of the time spent in COPY
+    -Collectors are the same as in Parse_Cost_Model keys, so that the
+     report and the cost model can be compared
+    -rows_per_second is rows over parse seconds, which is what the
+     parse pool is limited by
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import json
+import logging
+import os
+
+from .parse_cost_model import Parse_Cost_Model
+from .tables import MRT_Ingest_Summary_Table
+from ....utils import utils
+
+
+class Ingest_Telemetry:
+    """Collects per file MRT ingest metrics and sums them per collector.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["files"]
+
+    # Metrics that are summed per collector
+    summed = ["bytes", "decompressed_bytes", "rows", "download_seconds",
+              "decode_seconds", "copy_seconds", "checkpoint_seconds",
+              "parse_seconds"]
+
+    def __init__(self):
+        """Starts with no files"""
+
+        # List of metric dicts, one per file
+        self.files = []
+
+    def add(self, metrics: dict):
+        """Adds the metrics of one file, see MRT_File.parse_file"""
+
+        self.files.append(metrics)
+
+    def summarize(self) -> list:
+        """Returns one dict of summed metrics per collector
+
+        decompressed_bytes is None for a collector if any of its files
+        were not decoded natively. Sorted by parse seconds, slowest
+        first.
+        """
+
+        # collector: summary
+        summaries = {}
+        for metrics in self.files:
+            collector = self.get_collector(metrics["url"])
+            summary = summaries.get(collector)
+            if summary is None:
+                summary = summaries[collector] = {"collector": collector,
+                                                  "files": 0}
+                summary.update({x: 0 for x in self.summed})
+            summary["files"] += 1
+            for key in self.summed:
+                value = metrics.get(key)
+                if value is None or summary[key] is None:
+                    summary[key] = None
+                else:
+                    summary[key] += value
+        for summary in summaries.values():
+            seconds = summary["parse_seconds"]
+            summary["rows_per_second"] = (summary["rows"] / seconds
+                                          if seconds else 0)
+        return sorted(summaries.values(),
+                      key=lambda x: x["parse_seconds"],
+                      reverse=True)
+
+    @staticmethod
+    def get_collector(url: str) -> str:
+        """Returns the collector part of the url's Parse_Cost_Model key"""
+
+        return Parse_Cost_Model.get_key(url).split("|")[0]
+
+    def to_db(self, clear_table=True):
+        """Writes the summary to mrt_ingest_summary"""
+
+        columns = MRT_Ingest_Summary_Table.columns
+        # NULL is an empty string in stream_to_db
+        lines = ("\t".join("" if x[col] is None else str(x[col])
+                           for col in columns) + "\n"
+                 for x in self.summarize())
+        utils.stream_to_db(MRT_Ingest_Summary_Table,
+                           lines,
+                           clear_table=clear_table,
+                           columns=columns,
+                           checkpoint=False)
+
+    def write_json(self, path: str):
+        """Writes the summary and every file's metrics to path
+
+        Written to a .part file and then renamed, like Parse_Cost_Model
+        """
+
+        report = {"collectors": self.summarize(), "files": self.files}
+        os.makedirs(os.path.dirname(path) or ".", mode=0o777, exist_ok=True)
+        with open(f"{path}.part", "w") as f:
+            json.dump(report, f, indent=4)
+        os.replace(f"{path}.part", path)
+        logging.info(f"Wrote MRT ingest report to {path}")
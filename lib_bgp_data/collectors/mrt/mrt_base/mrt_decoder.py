@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class MRT_Decoder
+
+The purpose of this class is to read MRT files (RFC 6396) in process,
+without bgpscanner, cut, or sed. Previously every line of bgpscanner
+output was re-parsed by two sed regexes, which was the slow part of
+MRT parsing. Now the binary records are decoded with struct and
+(prefix, as_path, origin, time) tuples are yielded directly.
+
+Only what we need is decoded:
+    -TABLE_DUMP_V2 PEER_INDEX_TABLE (so we know the peers)
+    -TABLE_DUMP_V2 RIB_IPV4_UNICAST and RIB_IPV6_UNICAST
+     (and their ADDPATH variants from RFC 8050)
+    -The AS_PATH and AS4_PATH attributes of each RIB entry
+All other records and attributes are skipped over, as are RIB records
+of an address family that was not asked for (IPV4/IPV6). Skipped
+record types are counted, and a file with no RIB records is logged,
+since BGP4MP update files and TABLE_DUMP (v1) RIBs can't be read this
+way. MRT_File checks get_first_type and parses those with bgpscanner.
+The first record is read from the same handle that decoding goes on
+with, so the file is only opened once.
+
+For replaying updates (see RIB_State_Engine), there is also:
+    -rib_entries, which is the same as iterating but yields the peer
+     of each entry instead of the origin
+    -updates, which decodes BGP4MP and BGP4MP_ET update files into
+     withdrawn and announced prefixes with their AS path, and
+     state changes that take a peer out of Established
+
+The output matches the old bgpscanner pipeline:
+    -Entries that have an AS_SET (or confederation segment) in their
+     path are dropped, since the sed regex dropped anything with a {
+    -The time is the originated time of the RIB entry
+    -The origin is the last ASN in the path, None if the path is empty
+
+Design choices:
+    -Files are read through utils.open_decompressed, which detects
+     bz2/gz by magic bytes (MRT_File renames downloads to
+     num.extension) and never writes a decompressed copy
+    -The as path is returned as a tuple of ints so that callers can
+     format it however they like (CSV or COPY)
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import logging
+from socket import inet_ntop, AF_INET, AF_INET6
+from struct import Struct, unpack_from
+
+from ....utils import utils
+
+
+class MRT_Decoder:
+    """Decodes TABLE_DUMP_V2 MRT files into announcements.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["path", "peers", "IPV4", "IPV6", "bytes_read", "skipped",
+                 "_records", "_first"]
+
+    # MRT types and subtypes, RFC 6396 and RFC 8050
+    TABLE_DUMP_V2 = 13
+    PEER_INDEX_TABLE = 1
+    RIB_IPV4_UNICAST = 2
+    RIB_IPV6_UNICAST = 4
+    RIB_IPV4_UNICAST_ADDPATH = 8
+    RIB_IPV6_UNICAST_ADDPATH = 10
+    BGP4MP = 16
+    BGP4MP_ET = 17
+    BGP4MP_STATE_CHANGE = 0
+    BGP4MP_MESSAGE = 1
+    BGP4MP_MESSAGE_AS4 = 4
+    BGP4MP_STATE_CHANGE_AS4 = 5
+    BGP4MP_MESSAGE_LOCAL = 6
+    BGP4MP_MESSAGE_AS4_LOCAL = 7
+    # BGP message type, FSM state, and AFI/SAFI numbers, RFC 4271/4760
+    UPDATE = 2
+    ESTABLISHED = 6
+    AFI_IPV4 = 1
+    AFI_IPV6 = 2
+    SAFI_UNICAST = 1
+
+    # BGP path attribute type codes, RFC 4271 and RFC 6793
+    AS_PATH = 2
+    MP_REACH_NLRI = 14
+    MP_UNREACH_NLRI = 15
+    AS4_PATH = 17
+    AS_SEQUENCE = 2
+    AS_TRANS = 23456
+    # Attribute flag that says the length field is two bytes
+    EXTENDED_LENGTH = 0x10
+
+    _header = Struct("!IHHI")
+    _rib_entry = Struct("!HIH")
+    _rib_entry_addpath = Struct("!HIIH")
+
+    def __init__(self, path: str, IPV4=True, IPV6=True):
+        """Saves path, peers are filled when PEER_INDEX_TABLE is read
+
+        RIB records of a family that is not wanted are skipped without
+        being decoded.
+        """
+
+        self.path = path
+        self.IPV4 = IPV4
+        self.IPV6 = IPV6
+        # List of (peer_ip, peer_asn), indexed by the RIB peer index
+        self.peers = []
+        # Decompressed bytes of every whole record read so far
+        self.bytes_read = 0
+        # MRT type: count of records that were not TABLE_DUMP_V2
+        self.skipped = {}
+        # Open records of the file, and the first one, see get_first_type
+        self._records = None
+        self._first = None
+
+    def __iter__(self):
+        """Yields (prefix, as_path, origin, time) for every RIB entry"""
+
+        v4_subtypes = (self.RIB_IPV4_UNICAST, self.RIB_IPV4_UNICAST_ADDPATH)
+        v6_subtypes = (self.RIB_IPV6_UNICAST, self.RIB_IPV6_UNICAST_ADDPATH)
+        # Records of unwanted families match neither and are ignored
+        v4_subtypes = v4_subtypes if self.IPV4 else ()
+        v6_subtypes = v6_subtypes if self.IPV6 else ()
+        addpath_subtypes = (self.RIB_IPV4_UNICAST_ADDPATH,
+                            self.RIB_IPV6_UNICAST_ADDPATH)
+
+        rib_records = 0
+        for _type, subtype, body in self.records():
+            if _type != self.TABLE_DUMP_V2:
+                self.skipped[_type] = self.skipped.get(_type, 0) + 1
+                continue
+            if subtype in v4_subtypes:
+                rib_records += 1
+                yield from self._decode_rib(body,
+                                            AF_INET,
+                                            4,
+                                            subtype in addpath_subtypes)
+            elif subtype in v6_subtypes:
+                rib_records += 1
+                yield from self._decode_rib(body,
+                                            AF_INET6,
+                                            16,
+                                            subtype in addpath_subtypes)
+            elif subtype == self.PEER_INDEX_TABLE:
+                self.peers = self._decode_peer_index_table(body)
+        if rib_records == 0:
+            logging.warning(f"No RIB entries in {self.path}. Records that "
+                            f"aren't TABLE_DUMP_V2 by type: {self.skipped}")
+
+    def rib_entries(self):
+        """Yields ((peer_ip, peer_asn), prefix, as_path, time)
+
+        Same as iterating over the decoder, but with the peer that the
+        entry came from rather than the origin.
+        """
+
+        subtypes = {}
+        if self.IPV4:
+            subtypes[self.RIB_IPV4_UNICAST] = (AF_INET, 4, False)
+            subtypes[self.RIB_IPV4_UNICAST_ADDPATH] = (AF_INET, 4, True)
+        if self.IPV6:
+            subtypes[self.RIB_IPV6_UNICAST] = (AF_INET6, 16, False)
+            subtypes[self.RIB_IPV6_UNICAST_ADDPATH] = (AF_INET6, 16, True)
+        for _type, subtype, body in self.records():
+            if _type != self.TABLE_DUMP_V2:
+                continue
+            if subtype in subtypes:
+                yield from self._decode_rib(body,
+                                            *subtypes[subtype],
+                                            with_peers=True)
+            elif subtype == self.PEER_INDEX_TABLE:
+                self.peers = self._decode_peer_index_table(body)
+
+    def updates(self):
+        """Yields (time, (peer_ip, peer_asn), withdrawn, announced, as_path)
+
+        One is yielded per BGP UPDATE message, in file order. withdrawn
+        and announced are lists of prefixes. as_path is None if it has
+        an AS_SET, just like RIB entries with sets are dropped. When a
+        peer's session leaves Established, every route from it is gone,
+        which is yielded with withdrawn and announced both None.
+        """
+
+        messages = (self.BGP4MP_MESSAGE,
+                    self.BGP4MP_MESSAGE_AS4,
+                    self.BGP4MP_MESSAGE_LOCAL,
+                    self.BGP4MP_MESSAGE_AS4_LOCAL)
+        state_changes = (self.BGP4MP_STATE_CHANGE,
+                         self.BGP4MP_STATE_CHANGE_AS4)
+        as4_subtypes = (self.BGP4MP_MESSAGE_AS4,
+                        self.BGP4MP_MESSAGE_AS4_LOCAL,
+                        self.BGP4MP_STATE_CHANGE_AS4)
+        for time, _type, subtype, body in self.records(with_time=True):
+            if _type not in (self.BGP4MP, self.BGP4MP_ET):
+                continue
+            if subtype not in messages and subtype not in state_changes:
+                continue
+            # Extended timestamps have microseconds before the body
+            offset = 4 if _type == self.BGP4MP_ET else 0
+            asn_size = 4 if subtype in as4_subtypes else 2
+            peer, offset = self._decode_bgp4mp_peer(body, offset, asn_size)
+            if subtype in state_changes:
+                old_state, new_state = unpack_from("!HH", body, offset)
+                if old_state == self.ESTABLISHED != new_state:
+                    yield time, peer, None, None, None
+                continue
+            # Marker (16), length (2), type (1)
+            if body[offset + 18] != self.UPDATE:
+                continue
+            withdrawn, announced, as_path = self._decode_update(
+                body, offset + 19, asn_size)
+            if withdrawn or announced:
+                yield time, peer, withdrawn, announced, as_path
+
+    def get_first_type(self):
+        """Returns the MRT type of the first record, None if there is none
+
+        A TABLE_DUMP_V2 RIB starts with its PEER_INDEX_TABLE, so this
+        tells what kind of file it is without reading the rest. The
+        file is left open, and the next pass over the records starts
+        with this one.
+        """
+
+        if self._records is None:
+            self._records = self._read_records()
+            self._first = next(self._records, None)
+        return None if self._first is None else self._first[1]
+
+    def close(self):
+        """Closes the file, if get_first_type left it open"""
+
+        if self._records is not None:
+            self._records.close()
+        self._first = self._records = None
+
+    def records(self, with_time=False):
+        """Yields (type, subtype, body) for every record in the file
+
+        With with_time, the time from the header is yielded first.
+        """
+
+        self.get_first_type()
+        # Taken, so that another pass opens the file again
+        first, records = self._first, self._records
+        self._first = self._records = None
+        if first is None:
+            return
+        if with_time:
+            yield first
+            yield from records
+        else:
+            yield first[1:]
+            for _, _type, subtype, body in records:
+                yield _type, subtype, body
+
+########################
+### Helper Functions ###
+########################
+
+    def _read_records(self):
+        """Yields (time, type, subtype, body) for every record in the file"""
+
+        header_len = self._header.size
+        with utils.open_decompressed(self.path) as f:
+            read = f.read
+            while True:
+                header = read(header_len)
+                if len(header) < header_len:
+                    return
+                time, _type, subtype, length = self._header.unpack(header)
+                body = read(length)
+                # Truncated download, nothing more can be decoded
+                if len(body) < length:
+                    return
+                self.bytes_read += header_len + length
+                yield time, _type, subtype, body
+
+    def _decode_peer_index_table(self, body: bytes) -> list:
+        """Returns a list of (peer_ip, peer_asn) from a PEER_INDEX_TABLE
+
+        Format: collector id (4), view name length (2), view name,
+        peer count (2), then peer entries of peer type (1), bgp id (4),
+        peer ip (4 or 16), peer as (2 or 4). Bit 0 of the peer type is
+        set for IPV6 and bit 1 is set for 4 byte ASNs.
+        """
+
+        view_len, = unpack_from("!H", body, 4)
+        offset = 6 + view_len
+        peer_count, = unpack_from("!H", body, offset)
+        offset += 2
+        peers = []
+        for _ in range(peer_count):
+            peer_type = body[offset]
+            offset += 5
+            if peer_type & 1:
+                peer_ip = inet_ntop(AF_INET6, body[offset: offset + 16])
+                offset += 16
+            else:
+                peer_ip = inet_ntop(AF_INET, body[offset: offset + 4])
+                offset += 4
+            if peer_type & 2:
+                peer_asn, = unpack_from("!I", body, offset)
+                offset += 4
+            else:
+                peer_asn, = unpack_from("!H", body, offset)
+                offset += 2
+            peers.append((peer_ip, peer_asn))
+        return peers
+
+    def _decode_rib(self, body: bytes, family: int, addr_len: int,
+                    addpath: bool, with_peers=False):
+        """Yields (prefix, as_path, origin, time) for a RIB record
+
+        With with_peers, yields (peer, prefix, as_path, time) instead,
+        see rib_entries.
+
+        Format: sequence number (4), prefix length (1), prefix bytes,
+        entry count (2), then entries of peer index (2),
+        originated time (4), [path id (4) for addpath], attr length (2),
+        attributes.
+        """
+
+        prefix_len = body[4]
+        prefix_bytes = (prefix_len + 7) // 8
+        offset = 5 + prefix_bytes
+        addr = body[5: offset] + bytes(addr_len - prefix_bytes)
+        prefix = f"{inet_ntop(family, addr)}/{prefix_len}"
+
+        entry_count, = unpack_from("!H", body, offset)
+        offset += 2
+        entry = self._rib_entry_addpath if addpath else self._rib_entry
+        entry_unpack = entry.unpack_from
+        entry_size = entry.size
+        decode_attrs = self._decode_as_path
+        for _ in range(entry_count):
+            if addpath:
+                peer_index, time, _, attr_len = entry_unpack(body, offset)
+            else:
+                peer_index, time, attr_len = entry_unpack(body, offset)
+            offset += entry_size
+            as_path = decode_attrs(body, offset, offset + attr_len)
+            offset += attr_len
+            # AS sets are dropped, just like the bgpscanner regex did
+            if as_path is None:
+                continue
+            if with_peers:
+                yield self.peers[peer_index], prefix, as_path, time
+            else:
+                yield prefix, as_path, as_path[-1] if as_path else None, time
+
+    def _decode_as_path(self, body: bytes, offset: int, end: int):
+        """Returns the AS path from the attributes, None if it has sets
+
+        If there is an AS4_PATH, it's merged into the AS_PATH as in
+        RFC 6793 section 4.2.3.
+        """
+
+        as_path = ()
+        as4_path = None
+        while offset < end:
+            flags = body[offset]
+            attr_type = body[offset + 1]
+            if flags & self.EXTENDED_LENGTH:
+                attr_len, = unpack_from("!H", body, offset + 2)
+                offset += 4
+            else:
+                attr_len = body[offset + 2]
+                offset += 3
+            if attr_type == self.AS_PATH:
+                as_path = self._decode_segments(body, offset, offset + attr_len)
+                if as_path is None:
+                    return None
+            elif attr_type == self.AS4_PATH:
+                as4_path = self._decode_segments(body,
+                                                 offset,
+                                                 offset + attr_len)
+                if as4_path is None:
+                    return None
+            offset += attr_len
+
+        return self._merge_as4_path(as_path, as4_path)
+
+    def _merge_as4_path(self, as_path: tuple, as4_path: tuple) -> tuple:
+        """Replaces AS_TRANS in the AS_PATH, RFC 6793 section 4.2.3"""
+
+        if as4_path and self.AS_TRANS in as_path:
+            if len(as4_path) <= len(as_path):
+                as_path = as_path[:len(as_path) - len(as4_path)] + as4_path
+        return as_path
+
+    def _decode_segments(self, body: bytes, offset: int, end: int,
+                         asn_size: int = 4):
+        """Returns the ASNs of the path segments, None if there are sets
+
+        TABLE_DUMP_V2 always encodes ASNs as 4 bytes, RFC 6396 4.3.4.
+        BGP4MP_MESSAGE (not AS4) encodes them as 2 bytes.
+        """
+
+        fmt = "I" if asn_size == 4 else "H"
+        path = ()
+        while offset < end:
+            seg_type = body[offset]
+            seg_len = body[offset + 1]
+            if seg_type != self.AS_SEQUENCE:
+                return None
+            path += unpack_from(f"!{seg_len}{fmt}", body, offset + 2)
+            offset += 2 + asn_size * seg_len
+        return path
+
+    def _decode_bgp4mp_peer(self, body: bytes, offset: int, asn_size: int):
+        """Returns ((peer_ip, peer_asn), offset of what follows)
+
+        Format: peer AS, local AS (2 or 4 each), interface index (2),
+        address family (2), peer ip, local ip (4 or 16 each).
+        """
+
+        fmt = "!II" if asn_size == 4 else "!HH"
+        peer_asn, _ = unpack_from(fmt, body, offset)
+        offset += 2 * asn_size + 2
+        afi, = unpack_from("!H", body, offset)
+        offset += 2
+        if afi == self.AFI_IPV6:
+            peer_ip = inet_ntop(AF_INET6, body[offset: offset + 16])
+            offset += 32
+        else:
+            peer_ip = inet_ntop(AF_INET, body[offset: offset + 4])
+            offset += 8
+        return (peer_ip, peer_asn), offset
+
+    def _decode_update(self, body: bytes, offset: int, asn_size: int):
+        """Returns (withdrawn, announced, as_path) of a BGP UPDATE
+
+        Format: withdrawn length (2), withdrawn IPV4 prefixes, path
+        attributes length (2), path attributes, announced IPV4
+        prefixes. IPV6 prefixes are in the MP_REACH_NLRI and
+        MP_UNREACH_NLRI attributes instead.
+        """
+
+        withdrawn_len, = unpack_from("!H", body, offset)
+        offset += 2
+        withdrawn = []
+        announced = []
+        if self.IPV4:
+            withdrawn = self._decode_nlri(body, offset,
+                                          offset + withdrawn_len,
+                                          AF_INET, 4)
+        offset += withdrawn_len
+        attrs_len, = unpack_from("!H", body, offset)
+        offset += 2
+        end = offset + attrs_len
+        as_path = ()
+        as4_path = ()
+        while offset < end:
+            flags = body[offset]
+            attr_type = body[offset + 1]
+            if flags & self.EXTENDED_LENGTH:
+                attr_len, = unpack_from("!H", body, offset + 2)
+                offset += 4
+            else:
+                attr_len = body[offset + 2]
+                offset += 3
+            attr_end = offset + attr_len
+            if attr_type == self.AS_PATH:
+                as_path = self._decode_segments(body, offset, attr_end,
+                                                asn_size)
+            elif attr_type == self.AS4_PATH:
+                as4_path = self._decode_segments(body, offset, attr_end)
+            elif attr_type in (self.MP_REACH_NLRI, self.MP_UNREACH_NLRI):
+                afi, safi = unpack_from("!HB", body, offset)
+                family = self._get_mp_family(afi, safi)
+                if family is not None:
+                    nlri_offset = offset + 3
+                    if attr_type == self.MP_REACH_NLRI:
+                        # Next hop length, next hop, reserved
+                        nlri_offset += 1 + body[nlri_offset] + 1
+                        announced += self._decode_nlri(body, nlri_offset,
+                                                       attr_end, *family)
+                    else:
+                        withdrawn += self._decode_nlri(body, nlri_offset,
+                                                       attr_end, *family)
+            offset = attr_end
+        if self.IPV4:
+            announced += self._decode_nlri(body, offset, len(body),
+                                           AF_INET, 4)
+        # Either path having a set means the path isn't usable
+        if as_path is None or as4_path is None:
+            return withdrawn, announced, None
+        return withdrawn, announced, self._merge_as4_path(as_path, as4_path)
+
+    def _get_mp_family(self, afi: int, safi: int):
+        """Returns (family, address length) if the AFI/SAFI is wanted"""
+
+        if safi != self.SAFI_UNICAST:
+            return None
+        if afi == self.AFI_IPV4 and self.IPV4:
+            return AF_INET, 4
+        if afi == self.AFI_IPV6 and self.IPV6:
+            return AF_INET6, 16
+        return None
+
+    def _decode_nlri(self, body: bytes, offset: int, end: int, family: int,
+                     addr_len: int) -> list:
+        """Returns the prefixes of NLRI, each a length then its bytes"""
+
+        prefixes = []
+        while offset < end:
+            prefix_len = body[offset]
+            prefix_bytes = (prefix_len + 7) // 8
+            addr = (body[offset + 1: offset + 1 + prefix_bytes]
+                    + bytes(addr_len - prefix_bytes))
+            prefixes.append(f"{inet_ntop(family, addr)}/{prefix_len}")
+            offset += 1 + prefix_bytes
+        return prefixes
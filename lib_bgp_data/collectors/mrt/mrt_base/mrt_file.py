@@ -16,74 +16,292 @@ __status__ = "Production"
 
 import os
 import logging
+from subprocess import Popen, PIPE, CalledProcessError
+from time import perf_counter
 
-from .tables import MRT_Announcements_Table
+from .mrt_decoder import MRT_Decoder
+from .rib_snapshot import RIB_Snapshot_Writer
+from .tables import MRT_Announcements_Table, AS_Paths_Table
 from ....utils import utils
 from ....utils.base_classes import File
 
 class MRT_File(File):
-    """Converts MRT files to CSVs and then inserts them into a database.
+    """Parses MRT files and streams them into a database.
 
     In depth explanation in README.
     """
 
     __slots__ = []
 
-    def parse_file(self, bgpscanner=True):
+    # The columns written without encode_paths. path_id is left NULL
+    columns = ["prefix", "as_path", "origin", "time"]
+
+    # pid: the staging table that process copies into, see
+    # _get_copy_kwargs. MRT_Parser clears it before each run
+    staging_tables = {}
+
+    def parse_file(self,
+                   bgpscanner=True,
+                   native=True,
+                   IPV4=True,
+                   IPV6=True,
+                   encode_paths=False,
+                   binary=False,
+                   staging=False,
+                   snapshot_dir=None):
         """Parses a downloaded file and inserts it into the database
 
-        if bgpscanner is set to True, bgpscanner is used to parser files
+        If native is set to True (the default), the MRT_Decoder reads
+        the file in process and bgpscanner/bgpdump are not used at all.
+        Files that aren't TABLE_DUMP_V2 RIBs (BGP4MP updates, TABLE_DUMP
+        v1) can't be decoded, so they fall back to the pipeline below,
+        and the native only options don't apply to them. Otherwise if
+        bgpscanner is set to True, bgpscanner is used to parser files
         which is faster, but ignores malformed announcements. While
         these malformed announcements are few and far between, bgpdump
-        does not ignore them and should be used for full data runs. For
-        testing however, bgpscanner is much faster and has almost all
-        data required. More in depth explanation at the top of the file
+        does not ignore them and should be used for full data runs.
+        For testing however, bgpscanner is much faster and has almost
+        all data required. More in depth explanation at the top of the
+        file
+
+        Either way the output is streamed straight into the database
+        with COPY. No csv is written, so the only memory used per file
+        is the COPY buffer rather than the entire csv in /dev/shm.
+
+        Prefixes of an IPV family that is set to False are dropped
+        here, so they are never inserted and later deleted.
+
+        If encode_paths (native only), as_path is left NULL and the
+        path_id is written instead, with each path written once to
+        the as_paths table. See _stream_encoded_to_db.
+
+        If binary (native only), decoded rows are inserted with binary
+        COPY, so postgres doesn't parse any prefixes or path arrays.
+
+        If staging, announcements are copied into this process's own
+        staging table rather than mrt_announcements, and no CHECKPOINT
+        is run. MRT_Parser attaches the staging tables as partitions
+        and checkpoints once at the end. See tables.py.
+
+        If snapshot_dir (native only), decoded rows are also written to
+        a columnar part named by the file's num, see rib_snapshot.py.
+
+        Returns the metrics of the file for Ingest_Telemetry: url,
+        bytes, rows, decompressed_bytes (None without native), and the
+        decode, copy, checkpoint, and total parse seconds.
 
         Note that when tested for speed, logging doesn't slow down parse_files
         Or it does, and I just turned it off wrong.
         """
 
-        # Sets CSV path
-        self.csv_name = f"{self.csv_dir}/{os.path.basename(self.path)}.csv"
-        # Parses the MRT file into a csv file
-        self._convert_dump_to_csv(bgpscanner)
-        # Inserts the csv file into the MRT_Announcements Table
-        utils.csv_to_db(MRT_Announcements_Table, self.csv_name)
+        start = perf_counter()
+        metrics = {"url": self.url,
+                   "bytes": self.size,
+                   "rows": 0,
+                   "decompressed_bytes": None,
+                   "decode_seconds": 0}
+        copy_kwargs = self._get_copy_kwargs(staging)
+        # Checkpointed here instead, so that it can be timed on its own
+        checkpoint = copy_kwargs.get("checkpoint", True)
+        copy_kwargs["checkpoint"] = False
+        if native:
+            decoder = MRT_Decoder(self.path, IPV4, IPV6)
+            # Decoding goes on from this record, in the same handle
+            first_type = decoder.get_first_type()
+            if first_type not in [None, MRT_Decoder.TABLE_DUMP_V2]:
+                tool = "bgpscanner" if bgpscanner else "bgpdump"
+                logging.warning(f"{self.url} has MRT type {first_type}, "
+                                f"not TABLE_DUMP_V2. Parsing with {tool}")
+                native = False
+                decoder.close()
+        if native:
+            rows = decoder
+            writer = None
+            if snapshot_dir:
+                writer = RIB_Snapshot_Writer(f"{snapshot_dir}/{self.num}")
+                rows = writer.tee(rows)
+            rows = self._measure(rows, metrics)
+        if native and encode_paths:
+            self._stream_encoded_to_db(rows, binary, copy_kwargs)
+        elif native and binary:
+            utils.binary_to_db(MRT_Announcements_Table,
+                               rows,
+                               columns=self.columns,
+                               **copy_kwargs)
+        elif native:
+            rows = (self._format_row(*row) for row in rows)
+            utils.stream_to_db(MRT_Announcements_Table,
+                               rows,
+                               columns=self.columns,
+                               **copy_kwargs)
+        else:
+            self._stream_dump_to_db(bgpscanner,
+                                    IPV4,
+                                    IPV6,
+                                    copy_kwargs,
+                                    metrics)
+        # Only written once the db has all of the rows too
+        if native and writer:
+            writer.close()
+        if native:
+            metrics["decompressed_bytes"] = decoder.bytes_read
+        # Rows are made while COPY reads them, so the rest was the COPY
+        metrics["copy_seconds"] = (perf_counter() - start
+                                   - metrics["decode_seconds"])
+        metrics["checkpoint_seconds"] = 0
+        if checkpoint:
+            checkpoint_start = perf_counter()
+            with MRT_Announcements_Table() as db:
+                db.cursor.execute("CHECKPOINT;")
+            metrics["checkpoint_seconds"] = perf_counter() - checkpoint_start
         # Deletes all old files
-        utils.delete_paths([self.path, self.csv_name])
+        utils.delete_paths(self.path)
         utils.incriment_bar(logging.root.level)
+        metrics["parse_seconds"] = perf_counter() - start
+        return metrics
 
 
 ########################
 ### Helper Functions ###
 ########################
 
-    def _convert_dump_to_csv(self, bgpscanner=True):
-        """Parses MRT file into a CSV
-
-        This function uses bgpscanner to first be able to read
-        the MRT file. This is because BGPScanner is the fastest tool to
-        use for this task. The drawback of bgpscanner is that it ignores
-        malformed announcements. There aren't a lot of these, and it's
-        much faster, but for a full data set the slower tool bgpdump
-        should be used. Then the sed commands parse the file and
-        format the data for a CSV. Then this is stored as a tab
-        delimited CSV file, and the original is deleted. For a more in
-        depth explanation see top of file. For parsing spefics, see each
-        function listed below.
+    def _get_copy_kwargs(self, staging: bool) -> dict:
+        """Returns the kwargs for copying announcements into the db
+
+        Without staging, this is the default of copying into
+        mrt_announcements and checkpointing. With it, the process's
+        staging table is created the first time it parses a file.
+        """
+
+        if not staging:
+            return {}
+        # One table per process, each file parsed by it appends
+        pid = os.getpid()
+        if pid not in MRT_File.staging_tables:
+            with MRT_Announcements_Table() as db:
+                MRT_File.staging_tables[pid] = db.create_staging_table(pid)
+        return {"table": MRT_File.staging_tables[pid], "checkpoint": False}
+
+    @staticmethod
+    def _measure(rows, metrics: dict):
+        """Yields rows, adding their count and the seconds to make them
+
+        Only the time spent in rows is counted, not the time the
+        consumer (COPY) spends between rows.
         """
 
+        next_row = iter(rows).__next__
+        decode_seconds = 0
+        count = 0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    row = next_row()
+                except StopIteration:
+                    return
+                finally:
+                    decode_seconds += perf_counter() - start
+                count += 1
+                yield row
+        finally:
+            metrics["rows"] += count
+            metrics["decode_seconds"] += decode_seconds
+
+    @staticmethod
+    def _format_row(prefix, as_path, origin, time) -> str:
+        """Formats a decoded announcement as a tab delimited csv line"""
+
+        path = ", ".join(map(str, as_path))
+        origin = "" if origin is None else origin
+        return f"{prefix}\t{{{path}}}\t{origin}\t{time}\n"
+
+    def _stream_encoded_to_db(self, decoder, binary=False, copy_kwargs=None):
+        """Streams announcements with path ids instead of paths
+
+        Paths are interned per file, so each distinct path is hashed
+        once. They're written to as_paths after the announcements.
+        Other files write the same paths, so MRT_Parser deletes the
+        duplicates once everything is parsed. copy_kwargs only apply
+        to the announcements.
+        """
+
+        copy_kwargs = dict(copy_kwargs or {})
+        # as_path: path_id
+        path_ids = {}
+        get_path_id = AS_Paths_Table.get_path_id
+
+        def rows():
+            for prefix, as_path, origin, time in decoder:
+                path_id = path_ids.get(as_path)
+                if path_id is None:
+                    path_id = path_ids[as_path] = get_path_id(as_path)
+                yield prefix, origin, time, path_id
+
+        columns = ["prefix", "origin", "time", "path_id"]
+        if binary:
+            utils.binary_to_db(MRT_Announcements_Table,
+                               rows(),
+                               columns=columns,
+                               **copy_kwargs)
+            utils.binary_to_db(AS_Paths_Table,
+                               ((v, k) for k, v in path_ids.items()),
+                               checkpoint=copy_kwargs.get("checkpoint", True))
+            return
+
+        lines = (f"{prefix}\t{'' if origin is None else origin}\t{time}"
+                 f"\t{path_id}\n"
+                 for prefix, origin, time, path_id in rows())
+        utils.stream_to_db(MRT_Announcements_Table,
+                           lines,
+                           columns=columns,
+                           **copy_kwargs)
+        path_rows = (f"{path_id}\t{{{', '.join(map(str, as_path))}}}\n"
+                     for as_path, path_id in path_ids.items())
+        utils.stream_to_db(AS_Paths_Table,
+                           path_rows,
+                           checkpoint=copy_kwargs.get("checkpoint", True))
+
+    def _stream_dump_to_db(self,
+                           bgpscanner=True,
+                           IPV4=True,
+                           IPV6=True,
+                           copy_kwargs=None,
+                           metrics=None):
+        """Streams the bgpscanner/bgpdump pipeline into the database
+
+        Rather than redirecting the pipeline into a csv, its stdout is
+        read by COPY through a pipe, which the OS keeps bounded. If
+        metrics, lines and the time spent waiting on them are counted.
+        """
+
+        copy_kwargs = dict(copy_kwargs or {})
         args = self._bgpscanner_args() if bgpscanner else self._bgpdump_args()
-        # writes to a csv
-        args += '> ' + self.csv_name
-        utils.run_cmds(args)
-        logging.debug(f"Wrote {self.csv_name}\n\tFrom {self.url}")
-        utils.delete_paths(self.path)
+        with Popen(args, shell=True, stdout=PIPE, text=True) as proc:
+            lines = proc.stdout
+            if not (IPV4 and IPV6):
+                lines = (x for x in lines if self._is_IPV6(x) == IPV6)
+            if metrics is not None:
+                lines = self._measure(lines, metrics)
+            utils.stream_to_db(MRT_Announcements_Table,
+                               lines,
+                               columns=self.columns,
+                               **copy_kwargs)
+        if proc.returncode != 0:
+            raise CalledProcessError(proc.returncode, args)
+
+    @staticmethod
+    def _is_IPV6(line: str) -> bool:
+        """Returns True if the prefix (first column) of line is IPV6"""
+
+        return ":" in line[:line.find("\t")]
 
     def _bgpscanner_args(self):
-        """Parses MRT file into a CSV using bgpscanner
+        """Returns the bgpscanner pipeline that formats the file as csv
 
-        For a more in depth explanation see _convert_dump_to_csv. For
+        bgpscanner is the fastest tool for reading MRT files, but it
+        ignores malformed announcements. The sed commands then format
+        its output as tab delimited lines, see _stream_dump_to_db. For
         explanation on specifics of the parsing, see below.
         """
 
@@ -168,9 +386,10 @@ class MRT_File(File):
         return bash_args
 
     def _bgpdump_args(self):
-        """Parses MRT file into a CSV using bgpdump
+        """Returns the bgpdump pipeline that formats the file as csv
 
-        For a more in depth explanation see _convert_dump_to_csv. For
+        bgpdump is slower than bgpscanner, but doesn't ignore malformed
+        announcements, so it should be used for full data sets. For
         explanation on specifics of the parsing, see below. Also note,
         you must use the updated bgpdump tool, not the apt repo.
         """
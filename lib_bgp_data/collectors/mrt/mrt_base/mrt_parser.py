@@ -16,19 +16,27 @@ __maintainer__ = "Justin Furuness"
 __email__ = "jfuruness@gmail.com"
 __status__ = "Production"
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 import datetime
+import heapq
 import logging
+from multiprocessing import cpu_count
 import os
+import shutil
+import time
 import warnings
 
-import requests
-
 from ....utils.base_classes import Parser
+from .ingest_telemetry import Ingest_Telemetry
 from .mrt_file import MRT_File
 from .mrt_installer import MRT_Installer
 from .mrt_sources import MRT_Sources
-from .tables import MRT_Announcements_Table
+from .mrt_url_discovery import MRT_URL_Discovery
+from .parse_cost_model import Parse_Cost_Model
+from .tables import MRT_Announcements_Table, AS_Paths_Table
 from ....utils import utils
+from ....utils.file_cache import File_Cache
 
 
 class MRT_Parser(Parser):
@@ -62,6 +70,16 @@ class MRT_Parser(Parser):
              IPV4=True,
              IPV6=False,
              bgpscanner=True,
+             native=True,
+             max_disk_bytes=None,
+             cache_dir=None,
+             cache_max_bytes=200 * 10**9,
+             encode_paths=False,
+             binary_copy=False,
+             staging_tables=False,
+             cost_model_path=None,
+             snapshot_dir=None,
+             report_path=None,
              sources=MRT_Sources.__members__.values()):
         """Downloads and parses files using multiprocessing.
 
@@ -76,10 +94,45 @@ class MRT_Parser(Parser):
             parse_threads defaults to None, and later to cpu_count - 1
             IPV4 defaults to True, so IPV4 results are included
             IPV6 defaults to False, so IP6 results are not included
+                Both are filtered as files are parsed, so excluded
+                prefixes are never inserted into the database
+            native defaults to True, so files are decoded in process
+                by MRT_Decoder rather than bgpscanner and sed
+            max_disk_bytes defaults to None, and later to half of the
+                free disk space. Downloads wait while this many bytes
+                of downloaded files have yet to be parsed
+            cache_dir defaults to None, so nothing is cached. If set,
+                downloads are kept there (up to cache_max_bytes) and
+                later runs over the same urls don't download them again
+            encode_paths defaults to False. If True (native only), each
+                distinct AS path is stored once in as_paths, and
+                mrt_announcements has a path_id instead of the as_path.
+                If two paths get the same path_id, Path_ID_Collision is
+                raised, and the run should be done again without it
+            binary_copy defaults to False. If True (native only), rows
+                are inserted with binary COPY instead of text
+            staging_tables defaults to False. If True, each parsing
+                process copies into its own staging table, with no
+                checkpoint per file. Once all files are parsed the
+                staging tables are attached as partitions of
+                mrt_announcements and there is one checkpoint
+            cost_model_path defaults to None, and later to the default
+                path of Parse_Cost_Model. Files that are expected to
+                take the longest to parse are parsed first, and the
+                parse times of this run are saved there for the next
+            snapshot_dir defaults to None. If set (native only), a
+                columnar copy of mrt_announcements is written there as
+                files are parsed. See RIB_Snapshot_Reader
+            report_path defaults to None, and later to
+                /tmp/lib_bgp_data_cache/mrt_ingest_report.json. The
+                download and parse metrics of every file, summed per
+                collector, are written there and to mrt_ingest_summary
         """
 
-        if not bgpscanner:
+        if not native and not bgpscanner:
             raise NotImplementedError("bgpdump seems to fail for some reason")
+        if (encode_paths or binary_copy or snapshot_dir) and not native:
+            raise NotImplementedError("Only supported with MRT_Decoder")
 
         # If start/end not default:
         logging.warning(("Caida api doesn't work as you'd expect."
@@ -90,11 +143,28 @@ class MRT_Parser(Parser):
         # Gets urls of all mrt files needed
         urls = self._get_mrt_urls(start, end, api_param_mods, sources)
         logging.debug(f"Total files {len(urls)}")
-        # Get downloaded instances of mrt files using multithreading
-        mrt_files = self._multiprocess_download(download_threads, urls)
-        # Parses files using multiprocessing in descending order by size
-        self._multiprocess_parse_dls(parse_threads, mrt_files, bgpscanner)
-        self._filter_and_clean_up_db(IPV4, IPV6)
+        # Downloads files and parses them as soon as they land
+        self._download_and_parse(download_threads,
+                                 parse_threads,
+                                 urls,
+                                 bgpscanner,
+                                 native,
+                                 max_disk_bytes,
+                                 cache_dir,
+                                 cache_max_bytes,
+                                 IPV4,
+                                 IPV6,
+                                 encode_paths,
+                                 binary_copy,
+                                 staging_tables,
+                                 cost_model_path,
+                                 snapshot_dir,
+                                 report_path)
+        if encode_paths:
+            with AS_Paths_Table() as db:
+                db.delete_duplicates()
+        # Already filtered by IPV family while parsing
+        self._clean_up_db()
 
 ########################
 ### Helper Functions ###
@@ -108,12 +178,17 @@ class MRT_Parser(Parser):
         """Gets caida and iso URLs, start and end should be epoch"""
 
         logging.info(f"Getting MRT urls for {[x.name for x in sources]}")
-        caida_urls = self._get_caida_mrt_urls(start,
-                                              end,
-                                              sources,
-                                              PARAMS_modification)
-        # Give Isolario URLs if parameter is not changed
-        return caida_urls + self._get_iso_mrt_urls(start, sources)
+        # One session, so connections are reused for every request
+        with MRT_URL_Discovery() as discovery:
+            caida_urls = self._get_caida_mrt_urls(start,
+                                                  end,
+                                                  sources,
+                                                  PARAMS_modification,
+                                                  discovery)
+            # Give Isolario URLs if parameter is not changed
+            return caida_urls + self._get_iso_mrt_urls(start,
+                                                       sources,
+                                                       discovery)
         # If you ever want RIPE without the caida api, look at the commit
         # Where the relationship_parser_tests where merged in
 
@@ -121,8 +196,12 @@ class MRT_Parser(Parser):
                             start: int,
                             end: int,
                             sources: list,
-                            PARAMS_modification={}) -> list:
-        """Gets urls to download MRT files. Start and end should be epoch."""
+                            PARAMS_modification={},
+                            discovery=None) -> list:
+        """Gets urls to download MRT files. Start and end should be epoch.
+
+        discovery is an MRT_URL_Discovery, a new one by default.
+        """
 
         # Parameters for the get request, look at caida for more in depth info
         # This must be included in every API query
@@ -144,20 +223,21 @@ class MRT_Parser(Parser):
             return []
         # Other api calls can be made with these modifications
         PARAMS.update(PARAMS_modification)
-        # API docs: https://bgpstream.caida.org/docs/api/broker#data
-        # URL to make the api call to
-        URL = 'https://bgpstream.caida.org/broker/data'
-        # Request for data and conversion to json
-        logging.debug(requests.get(url=URL, params=PARAMS).url)
-        data = requests.get(url=URL, params=PARAMS).json()
+        # Request for data, see MRT_URL_Discovery for the api call
+        discovery = discovery if discovery else MRT_URL_Discovery()
+        dump_files = discovery.get_dump_files([PARAMS])[0]
 
         # Returns the urls from the json
-        return [x.get('url') for x in data.get('data').get('dumpFiles')]
+        return [x.get('url') for x in dump_files]
 
-    def _get_iso_mrt_urls(self, start: int, sources: list) -> list:
+    def _get_iso_mrt_urls(self,
+                          start: int,
+                          sources: list,
+                          discovery=None) -> list:
         """Gets URLs to download MRT files from Isolario.io
 
-        Start should be in epoch"""
+        Start should be in epoch. discovery is an MRT_URL_Discovery,
+        a new one by default."""
 
         if MRT_Sources.ISOLARIO not in sources:
             logging.debug("Not getting isolario urls")
@@ -186,76 +266,232 @@ class MRT_Parser(Parser):
         # Make a list of all possible file URLs
         file_urls = [_url + _coll + _folder + _start_file for _coll in _collectors]
 
-        # Remove non-existent urls
-        filtered_urls = []
-        for f in file_urls:
-            # Tried doing a HEAD request here before, but that gave a code 302.
-            # 404 is more commonly understood so I decided to keep GET requests.
-            if requests.get(f, verify=False).status_code != 404:
-                filtered_urls.append(f)
-            else:
-                logging.warning(f"{f} doesn't exist. Will not attempt to download.")
-
-        return filtered_urls
-
-    def _multiprocess_download(self, dl_threads: int, urls: list) -> list:
-        """Downloads MRT files in parallel.
-
-        In depth explanation at the top of the file, dl=download.
+        # Remove non-existent urls, checked concurrently
+        discovery = discovery if discovery else MRT_URL_Discovery()
+        return discovery.filter_existing(file_urls, verify=False)
+
+    def _download_and_parse(self,
+                            dl_threads: int,
+                            p_threads: int,
+                            urls: list,
+                            bgpscanner: bool,
+                            native: bool = True,
+                            max_disk_bytes: int = None,
+                            cache_dir: str = None,
+                            cache_max_bytes: int = 200 * 10**9,
+                            IPV4: bool = True,
+                            IPV6: bool = True,
+                            encode_paths: bool = False,
+                            binary_copy: bool = False,
+                            staging_tables: bool = False,
+                            cost_model_path: str = None,
+                            snapshot_dir: str = None,
+                            report_path: str = None):
+        """Downloads and parses files at the same time.
+
+        Previously every file was downloaded, and only then were they
+        all parsed. So the network sat idle while parsing, the CPUs sat
+        idle while downloading, and the disk had to hold every RIB.
+
+        Now downloads run in a thread pool (they are I/O bound), and
+        as soon as a file lands it's queued for the parse pool. Out of
+        the queued files, the one with the longest expected parse time
+        (see Parse_Cost_Model) is always parsed first. Each file is
+        handed to the pool as a process frees up, and its parse time is
+        added to the model, which is saved at the end. New
+        downloads are held back while the bytes of files that have been
+        downloaded but not yet parsed are over max_disk_bytes. Files
+        that are still downloading count as the average size so far.
+
+        If cache_dir is set, downloads go through a File_Cache.
+        Certificates aren't verified, since Isolario's is expired.
+
+        If staging_tables is set, mrt_announcements is partitioned, and
+        the staging tables that the parse processes copy into are
+        attached once everything is parsed, see _staging.
+
+        If snapshot_dir is set, it's cleared, and then each file
+        writes its own columnar part there.
+
+        The download seconds and parse metrics of each file are kept
+        by an Ingest_Telemetry, see ingest_telemetry.py, and written
+        to report_path and mrt_ingest_summary at the end.
         """
 
-        # Creates an mrt file for each url
+        if snapshot_dir:
+            utils.delete_paths(snapshot_dir)
+            os.makedirs(snapshot_dir, mode=0o777)
+
         mrt_files = [MRT_File(self.path, self.csv_dir, url, i + 1)
                      for i, url in enumerate(urls)]
-
-        with utils.progress_bar("Downloading MRTs, ", len(mrt_files)):
-            # Creates a dl pool with 4xCPUs since it is I/O based
-            with utils.Pool(dl_threads, 4, "download") as dl_pool:
-
-                # Download files in parallel
-                # Again verify is False because Isolario
-                dl_pool.map(lambda f: utils.download_file(
-                        f.url, f.path, f.num, len(urls),
-                        f.num/5, progress_bar=True), mrt_files, verify=False)
-        return mrt_files
-
-    def _multiprocess_parse_dls(self,
-                                p_threads: int,
-                                mrt_files: list,
-                                bgpscanner: bool):
-        """Multiprocessingly(ooh cool verb, too bad it's not real)parse files.
-
-        In depth explanation at the top of the file.
-        dl=download, p=parse.
+        if max_disk_bytes is None:
+            max_disk_bytes = shutil.disk_usage(self.path).free // 2
+        dl_threads = dl_threads if dl_threads else cpu_count() * 4
+        if cache_dir:
+            download_file = File_Cache(cache_dir,
+                                       cache_max_bytes).download_file
+        else:
+            download_file = utils.download_file
+
+        def timed_download(*args) -> float:
+            """Downloads a file, returns the seconds it took"""
+
+            start = time.perf_counter()
+            # Isolario SSL certificate expired, so verify is False here
+            download_file(*args, verify=False)
+            return time.perf_counter() - start
+
+        # Popped from the end, so reversed to download in url order
+        to_download = list(reversed(mrt_files))
+        # future: mrt_file
+        downloading = {}
+        cost_model = self._get_cost_model(cost_model_path)
+        # heap of (-expected seconds, num, mrt_file, size) so that the
+        # longest is parsed first
+        ready = []
+        # future of the parse result: (mrt_file, size, start time)
+        parsing = {}
+        # Sizes of files that have landed, to estimate in flight downloads
+        sizes = []
+        telemetry = Ingest_Telemetry()
+        # mrt_file: download seconds
+        download_seconds = {}
+
+        with self._staging(staging_tables),\
+                utils.progress_bar("Parsing MRT Files,", len(mrt_files)):
+            with ThreadPoolExecutor(dl_threads) as dl_pool,\
+                    utils.Pool(p_threads, 1, "parsing") as p_pool,\
+                    ThreadPoolExecutor(p_pool.ncpus) as parse_waiters:
+                while to_download or downloading or ready or parsing:
+                    avg_size = sum(sizes) / len(sizes) if sizes else 0
+                    on_disk = (sum(x[3] for x in ready)
+                               + sum(x[1] for x in parsing.values())
+                               + avg_size * len(downloading))
+                    # Start downloads while there is room on the disk
+                    # Always allow one, in case a file is over budget
+                    while (to_download
+                           and len(downloading) < dl_threads
+                           and (on_disk < max_disk_bytes
+                                or not (downloading or ready or parsing))):
+                        f = to_download.pop()
+                        future = dl_pool.submit(timed_download,
+                                                f.url,
+                                                f.path,
+                                                f.num,
+                                                len(urls))
+                        downloading[future] = f
+                        on_disk += avg_size
+
+                    # Queue files that have finished downloading
+                    downloaded = [x for x in downloading if x.done()]
+                    for future in downloaded:
+                        f = downloading.pop(future)
+                        # Raises if the download failed
+                        download_seconds[f] = future.result()
+                        sizes.append(f.size)
+                        cost = cost_model.estimate(f.url, f.size)
+                        heapq.heappush(ready, (-cost, f.num, f, f.size))
+
+                    # Parse the longest files first
+                    while ready and len(parsing) < p_pool.ncpus:
+                        _, _, f, size = heapq.heappop(ready)
+                        result = p_pool.apipe(f.parse_file,
+                                              bgpscanner,
+                                              native,
+                                              IPV4,
+                                              IPV6,
+                                              encode_paths,
+                                              binary_copy,
+                                              staging_tables,
+                                              snapshot_dir)
+                        # A thread waits on the result, so that
+                        # downloads and parses can be waited on together
+                        future = parse_waiters.submit(result.get)
+                        parsing[future] = (f, size, time.perf_counter())
+
+                    # Free up disk budget from files that are parsed
+                    parsed = [x for x in parsing if x.done()]
+                    for future in parsed:
+                        f, size, start = parsing.pop(future)
+                        # Raises if the parse failed
+                        metrics = future.result()
+                        metrics["download_seconds"] = download_seconds.pop(f)
+                        telemetry.add(metrics)
+                        cost_model.update(f.url,
+                                          size,
+                                          time.perf_counter() - start)
+                    # Block until a download or a parse finishes, unless
+                    # one just did, since that can free up disk budget
+                    if not (downloaded or parsed) and (downloading
+                                                       or parsing):
+                        wait(list(downloading) + list(parsing),
+                             return_when=FIRST_COMPLETED)
+        cost_model.save()
+        self._report_telemetry(telemetry, report_path)
+
+    @contextmanager
+    def _staging(self, staging_tables: bool):
+        """Partitions mrt_announcements, attaches staging tables after
+
+        If the parse fails, the staging tables are dropped and the
+        unpartitioned table is recreated, see MRT_Announcements_Table.
+        Does nothing if staging_tables is False.
         """
 
-        with utils.progress_bar("Parsing MRT Files,", len(mrt_files)):
-            with utils.Pool(p_threads, 1, "parsing") as p_pool:
-                # Runs the parsing of files in parallel, largest first
-                p_pool.map(lambda f: f.parse_file(bgpscanner),
-                           sorted(mrt_files, reverse=True))
-
-    def _filter_and_clean_up_db(self,
-                                IPV4: bool,
-                                IPV6: bool,
-                                delete_duplicates=False):
-        """This function filters mrt data by IPV family and cleans up db
-
-        First the database is connected. Then IPV4 and/or IPV6 data is
-        removed. Aftwards the data is vaccuumed and analyzed to get
-        statistics for the table for future queries, and a checkpoint is
-        called so as not to lose RAM.
+        if not staging_tables:
+            yield
+            return
+        with MRT_Announcements_Table() as db:
+            db.create_partitioned_table()
+        # Pool processes are new, but a pid can be reused
+        MRT_File.staging_tables.clear()
+        try:
+            yield
+        except BaseException:
+            with MRT_Announcements_Table() as db:
+                db.restore_table()
+            raise
+        with MRT_Announcements_Table() as db:
+            tables = db.attach_staging_tables()
+            logging.debug(f"Attached {len(tables)} staging tables")
+
+    def _report_telemetry(self, telemetry, report_path: str = None):
+        """Logs, saves, and writes to the db the summary of a run"""
+
+        for summary in telemetry.summarize():
+            logging.info(f"{summary['collector']}: {summary['files']} files,"
+                         f" {summary['rows']} rows,"
+                         f" {summary['rows_per_second']:.0f} rows/s")
+        telemetry.write_json(report_path if report_path else
+                             "/tmp/lib_bgp_data_cache/mrt_ingest_report.json")
+        telemetry.to_db()
+
+    def _get_cost_model(self, cost_model_path: str = None):
+        """Returns the Parse_Cost_Model at the path, or the default"""
+
+        if cost_model_path:
+            return Parse_Cost_Model(cost_model_path)
+        return Parse_Cost_Model()
+
+    def _clean_up_db(self, vacuum_all=False):
+        """Vacuums and analyzes the table, and calls a checkpoint
+
+        The data is vaccuumed and analyzed to get statistics for the
+        table for future queries, and a checkpoint is called so as not
+        to lose RAM. With staging tables, this is the only checkpoint.
+        Rows are filtered as they are parsed, so there are no dead
+        tuples and only the mrt table needs to be vacuumed, unless
+        vacuum_all is set.
         """
 
         with MRT_Announcements_Table() as _ann_table:
-            # First we filter by IPV4 and IPV6:
-            _ann_table.filter_by_IPV_family(IPV4, IPV6)
             logging.info("vaccuming and checkpoint")
             # A checkpoint is run here so that RAM isn't lost
             _ann_table.cursor.execute("CHECKPOINT;")
             # VACUUM ANALYZE to clean up data and create statistics on table
             # This is needed for better index creation and queries later on
-            _ann_table.cursor.execute("VACUUM ANALYZE;")
+            table = "" if vacuum_all else f" {_ann_table.name}"
+            _ann_table.cursor.execute(f"VACUUM ANALYZE{table};")
 
     def parse_files(self, **kwargs):
         warnings.warn(("MRT_Parser.parse_files is depreciated. "
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class MRT_URL_Discovery
+
+The purpose of this class is to find the urls of MRT files quickly.
+Before, every Caida broker query was made twice (once just to log the
+url), and every Isolario url was checked for a 404 one at a time. A
+detailed run over several days makes hundreds of these requests, each
+on a new connection, and each waiting for the last to finish.
+
+Design choices:
+    -All requests go through one requests.Session, so connections are
+     pooled and kept alive rather than opened per request
+    -Broker queries and existence checks run in a thread pool, since
+     they only wait on the network
+    -Identical queries (and urls) are only requested once per call
+    -Broker responses are cached by their parameters, which include the
+     interval, project, and type. The cache is in memory, and also on
+     disk in cache_dir if it is set, since responses for intervals in
+     the past don't change. Empty responses aren't kept on disk,
+     since the files may just not be posted yet
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+import json
+import logging
+import os
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class MRT_URL_Discovery:
+    """Finds MRT urls with concurrent, cached, pooled requests.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["threads", "cache_dir", "broker_url", "session", "_cache",
+                 "_lock"]
+
+    def __init__(self,
+                 threads: int = 16,
+                 cache_dir: str = None,
+                 # API docs: https://bgpstream.caida.org/docs/api/broker#data
+                 broker_url: str = "https://bgpstream.caida.org/broker/data"):
+        """Creates the session, sized so that no thread waits on it"""
+
+        self.threads = threads
+        self.broker_url = broker_url
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, mode=0o777, exist_ok=True)
+        self.session = requests.Session()
+        retries = Retry(total=3,
+                        backoff_factor=1,
+                        status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=threads,
+                              pool_maxsize=threads,
+                              max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # cache key: list of dump files
+        self._cache = {}
+        self._lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.session.close()
+
+    def get_dump_files(self, params_list: list) -> list:
+        """Returns the broker's dumpFiles for each dict of params
+
+        Results are in the same order as params_list. Each params dict
+        is one broker query, such as one interval of one project.
+        """
+
+        keys = [self._cache_key(x) for x in params_list]
+        # Deduplicate, so that identical queries are only made once
+        unique = dict(zip(keys, params_list))
+        with ThreadPoolExecutor(self.threads) as pool:
+            dump_files = dict(zip(unique, pool.map(self._get_dump_files,
+                                                   unique,
+                                                   unique.values())))
+        return [dump_files[x] for x in keys]
+
+    def filter_existing(self, urls: list, verify=True) -> list:
+        """Returns the urls that don't 404, in the same order"""
+
+        unique = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(self.threads) as pool:
+            exists = dict(zip(unique, pool.map(lambda x: self._exists(
+                x, verify), unique)))
+        for url in unique:
+            if not exists[url]:
+                logging.warning(f"{url} doesn't exist. "
+                                "Will not attempt to download.")
+        return [x for x in urls if exists[x]]
+
+########################
+### Helper Functions ###
+########################
+
+    def _get_dump_files(self, key: str, params: dict) -> list:
+        """Returns the dumpFiles of one broker query, cached"""
+
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        path = self._cache_path(key)
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                dump_files = json.load(f)
+        else:
+            response = self.session.get(self.broker_url, params=params)
+            logging.debug(response.url)
+            response.raise_for_status()
+            dump_files = response.json().get("data").get("dumpFiles")
+            response.close()
+            # Empty responses may just be files that aren't posted yet
+            if path and dump_files:
+                # Written then renamed so that a crash leaves no half file
+                with open(f"{path}.part", "w") as f:
+                    json.dump(dump_files, f)
+                os.replace(f"{path}.part", path)
+        with self._lock:
+            self._cache[key] = dump_files
+        return dump_files
+
+    def _exists(self, url: str, verify: bool) -> bool:
+        """Returns False if the url is a 404
+
+        A HEAD request gave a 302 on Isolario, so this is a GET. It's
+        streamed and closed, so the file itself isn't downloaded.
+        """
+
+        with self.session.get(url, verify=verify, stream=True) as response:
+            return response.status_code != 404
+
+    def _cache_key(self, params: dict) -> str:
+        """Returns a key made from every param of a query
+
+        The params include the interval, project, and type.
+        """
+
+        return json.dumps(params, sort_keys=True, default=str)
+
+    def _cache_path(self, key: str) -> str:
+        """Returns the path of the on disk cache of a key, if any"""
+
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir,
+                            f"{sha256(key.encode()).hexdigest()}.json")
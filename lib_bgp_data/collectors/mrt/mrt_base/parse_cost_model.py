@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Parse_Cost_Model
+
+The purpose of this class is to estimate how long an MRT file takes to
+parse, so that the files that take the longest are parsed first. Files
+used to be parsed largest first, but size alone is a poor estimate. A
+gz file decompresses much faster than a bz2 file of the same size, and
+an updates file has more (and shorter) records than a RIB.
+
+Parsing the longest files first (longest processing time first, or
+LPT) matters most at the end of a run. If one huge route-views2 RIB is
+started last, one core is busy with it long after the rest are idle.
+
+Design choices:
+    -Files are keyed by their collector, kind (rib, bview, updates),
+     and compression, all taken from the url
+    -Each key keeps a decayed total of bytes and seconds, so recent
+     runs count more. The estimate is the file size times the
+     seconds per byte of its key
+    -Keys that have never been seen fall back to the same kind and
+     compression on any collector, then to all files. With no history
+     at all, this is the same as largest first
+    -The model is a json file, saved after each run, so that later
+     runs learn from earlier ones
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import json
+import logging
+import os
+import re
+from urllib.parse import urlparse
+
+
+class Parse_Cost_Model:
+    """Persisted per collector estimate of parse seconds per byte.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["path", "decay", "costs"]
+
+    # Folders named by month, such as 2020.01 or 2020_01
+    _date_re = re.compile(r"^\d{4}[._]\d{2}$")
+
+    def __init__(self,
+                 path: str = "/tmp/lib_bgp_data_cache/mrt_parse_costs.json",
+                 decay: float = .9):
+        """Loads the model if it was saved by an earlier run"""
+
+        self.path = path
+        self.decay = decay
+        # key: [bytes, seconds]
+        self.costs = {}
+        try:
+            with open(self.path, "r") as f:
+                self.costs = json.load(f)
+        except (FileNotFoundError, ValueError):
+            logging.debug(f"No parse cost model at {self.path}")
+
+    def estimate(self, url: str, size: int) -> float:
+        """Returns the estimated seconds to parse a file"""
+
+        return size * self._get_rate(url)
+
+    def update(self, url: str, size: int, seconds: float):
+        """Adds the parse time of a file to its key"""
+
+        key = self.get_key(url)
+        _bytes, _seconds = self.costs.get(key, [0, 0])
+        self.costs[key] = [_bytes * self.decay + size,
+                           _seconds * self.decay + seconds]
+
+    def save(self):
+        """Writes the model, then renames it so a crash leaves no half file"""
+
+        os.makedirs(os.path.dirname(self.path), mode=0o777, exist_ok=True)
+        with open(f"{self.path}.part", "w") as f:
+            json.dump(self.costs, f, indent=4, sort_keys=True)
+        os.replace(f"{self.path}.part", self.path)
+
+    @classmethod
+    def get_key(cls, url: str) -> str:
+        """Returns collector|kind|compression for a url
+
+        Ex: http://archive.routeviews.org/route-views2/bgpdata/2020.01/
+        RIBS/rib.20200101.0000.bz2 is
+        archive.routeviews.org/route-views2/bgpdata/RIBS|rib|bz2
+        """
+
+        parsed = urlparse(url)
+        *folders, name = parsed.path.split("/")
+        folders = [x for x in folders if x and not cls._date_re.match(x)]
+        collector = "/".join([parsed.netloc] + folders)
+        kind = name.split(".")[0]
+        compression = name.rsplit(".", 1)[-1] if "." in name else ""
+        return f"{collector}|{kind}|{compression}"
+
+########################
+### Helper Functions ###
+########################
+
+    def _get_rate(self, url: str) -> float:
+        """Returns the seconds per byte of a url's key, or a fallback"""
+
+        key = self.get_key(url)
+        _, kind, compression = key.split("|")
+        fallbacks = [[key],
+                     [x for x in self.costs
+                      if x.split("|")[1:] == [kind, compression]],
+                     list(self.costs)]
+        for keys in fallbacks:
+            _bytes = sum(self.costs[x][0] for x in keys if x in self.costs)
+            seconds = sum(self.costs[x][1] for x in keys if x in self.costs)
+            if _bytes > 0 and seconds > 0:
+                return seconds / _bytes
+        # Nothing known, so every file has the same rate (largest first)
+        return 1
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains classes RIB_Snapshot_Writer and RIB_Snapshot_Reader
+
+The purpose of these classes is to keep a columnar copy of the parsed
+announcements on disk, next to the copy in mrt_announcements. Read
+heavy analytics can then scan it straight from the page cache, rather
+than paying for postgres to send every tuple and for a RealDictCursor
+to build a dict out of every row.
+
+Format, one directory per MRT file (a part) under the snapshot dir:
+    -meta.json: the row count, path value count, and each column's dtype
+    -addr_hi.bin, addr_lo.bin: the prefix address as two uint64s. IPV4
+     addresses are in addr_lo, with addr_hi 0
+    -prefix_len.bin: uint8
+    -ipv6.bin: bool
+    -origin.bin: int64, -1 if there is no origin
+    -time.bin: int64
+    -path_offsets.bin: int64, rows + 1 of them. The path of row i is
+     path_values[path_offsets[i]: path_offsets[i + 1]]
+    -path_values.bin: uint32 ASNs
+All columns are little endian with no header, so that they can be
+appended to as rows are decoded, and memory mapped as they are.
+
+Design choices:
+    -Parts are written by each parse process, so there is no
+     coordination between processes, just like the db load
+    -The reader memory maps every column with numpy. Nothing is copied
+     or parsed until it's used, and every process that reads the same
+     snapshot shares the same pages of the page cache
+    -Arrow and Parquet are not dependencies of this package, so the
+     format is plain numpy arrays, which are just as zero copy
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from ipaddress import IPv4Address, IPv6Address
+import json
+import os
+from socket import inet_pton, AF_INET, AF_INET6
+
+import numpy as np
+
+from ....utils import utils
+
+
+# name: dtype of every column
+_COLUMNS = {"addr_hi": "<u8",
+            "addr_lo": "<u8",
+            "prefix_len": "u1",
+            "ipv6": "?",
+            "origin": "<i8",
+            "time": "<i8",
+            "path_offsets": "<i8",
+            "path_values": "<u4"}
+
+
+class RIB_Snapshot_Writer:
+    """Appends announcements to one columnar part.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["path", "rows_per_chunk", "count", "value_count", "_files",
+                 "_chunk"]
+
+    def __init__(self, path: str, rows_per_chunk: int = 2**16):
+        """Creates the part directory, deleting an old one"""
+
+        self.path = path
+        self.rows_per_chunk = rows_per_chunk
+        self.count = 0
+        self.value_count = 0
+        utils.delete_paths(path)
+        os.makedirs(path, mode=0o777)
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb")
+                       for name in _COLUMNS}
+        # First offset of the first path
+        self._files["path_offsets"].write(np.zeros(1, "<i8").tobytes())
+        self._chunk = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def tee(self, rows):
+        """Yields rows unchanged, writing each one as it passes
+
+        Rows are (prefix, as_path, origin, time), like MRT_Decoder's.
+        """
+
+        chunk = self._chunk
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.rows_per_chunk:
+                self._write_chunk()
+                chunk = self._chunk
+            yield row
+
+    def write(self, rows):
+        """Writes every row"""
+
+        for _ in self.tee(rows):
+            pass
+
+    def close(self):
+        """Writes what's left, then meta.json once everything is there"""
+
+        if self._files is None:
+            return
+        self._write_chunk()
+        for f in self._files.values():
+            f.close()
+        self._files = None
+        meta = {"count": self.count,
+                "value_count": self.value_count,
+                "columns": _COLUMNS}
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+########################
+### Helper Functions ###
+########################
+
+    def _write_chunk(self):
+        """Converts buffered rows into columns and appends them"""
+
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        his, los, lens, v6s = [], [], [], []
+        for prefix, _, _, _ in chunk:
+            addr, prefix_len = prefix.split("/")
+            if ":" in addr:
+                value = int.from_bytes(inet_pton(AF_INET6, addr), "big")
+                his.append(value >> 64)
+                los.append(value & 0xFFFFFFFFFFFFFFFF)
+                v6s.append(True)
+            else:
+                his.append(0)
+                los.append(int.from_bytes(inet_pton(AF_INET, addr), "big"))
+                v6s.append(False)
+            lens.append(int(prefix_len))
+        values = [asn for _, as_path, _, _ in chunk for asn in as_path]
+        offsets = np.cumsum([len(x[1]) for x in chunk], dtype="<i8")
+        columns = {"addr_hi": his,
+                   "addr_lo": los,
+                   "prefix_len": lens,
+                   "ipv6": v6s,
+                   "origin": [-1 if x[2] is None else x[2] for x in chunk],
+                   "time": [x[3] for x in chunk],
+                   "path_offsets": offsets + self.value_count,
+                   "path_values": values}
+        for name, values in columns.items():
+            array = np.asarray(values, dtype=_COLUMNS[name])
+            self._files[name].write(array.tobytes())
+        self.count += len(chunk)
+        self.value_count += int(offsets[-1])
+
+
+class RIB_Snapshot_Reader:
+    """Memory maps every part of a snapshot for zero copy scans.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["path", "parts"]
+
+    def __init__(self, path: str):
+        """Maps every finished part (those with a meta.json)"""
+
+        self.path = path
+        self.parts = []
+        for name in sorted(os.listdir(path)):
+            meta_path = os.path.join(path, name, "meta.json")
+            if os.path.exists(meta_path):
+                self.parts.append(self._map_part(os.path.join(path, name),
+                                                 meta_path))
+
+    def __len__(self) -> int:
+        return sum(len(x["time"]) for x in self.parts)
+
+    def rows(self):
+        """Yields (prefix, as_path, origin, time) for every row
+
+        This builds python objects, so it's not zero copy. Scans that
+        can be done with numpy should use parts instead.
+        """
+
+        for part in self.parts:
+            offsets = part["path_offsets"]
+            values = part["path_values"]
+            columns = zip(part["addr_hi"].tolist(),
+                          part["addr_lo"].tolist(),
+                          part["prefix_len"].tolist(),
+                          part["ipv6"].tolist(),
+                          part["origin"].tolist(),
+                          part["time"].tolist())
+            for i, (hi, lo, prefix_len, ipv6, origin, time) in\
+                    enumerate(columns):
+                if ipv6:
+                    addr = IPv6Address((hi << 64) | lo)
+                else:
+                    addr = IPv4Address(lo)
+                as_path = tuple(values[offsets[i]: offsets[i + 1]].tolist())
+                yield (f"{addr}/{prefix_len}",
+                       as_path,
+                       None if origin == -1 else origin,
+                       time)
+
+########################
+### Helper Functions ###
+########################
+
+    def _map_part(self, path: str, meta_path: str) -> dict:
+        """Returns {column name: read only memory mapped array}"""
+
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        lengths = {"path_offsets": meta["count"] + 1,
+                   "path_values": meta["value_count"]}
+        part = {}
+        for name, dtype in meta["columns"].items():
+            length = lengths.get(name, meta["count"])
+            # numpy can't map an empty file
+            if length == 0:
+                part[name] = np.zeros(0, dtype)
+            else:
+                part[name] = np.memmap(os.path.join(path, f"{name}.bin"),
+                                       dtype=dtype,
+                                       mode="r",
+                                       shape=(length,))
+        return part
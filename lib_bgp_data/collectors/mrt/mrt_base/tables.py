@@ -14,6 +14,33 @@ used when combining with the roas table, which does a parallel seq_scan,
 thus any indexes are not used since they are not efficient. Each table
 follows the table name followed by a _Table since it inherits from the
 database class.
+
+AS_Paths_Table holds each distinct AS path once, keyed by path_id. When
+MRT files are parsed with encode_paths, mrt_announcements stores the
+path_id and leaves as_path NULL, since the number of distinct paths is
+much smaller than the number of announcements. The path_id is a hash of
+the path, so each parsing process can assign ids without coordinating.
+A 64 bit hash can still collide: with hundreds of millions of distinct
+paths the odds are no longer negligible. So delete_duplicates checks
+that each path_id is left with exactly one path, and raises
+Path_ID_Collision with the colliding paths otherwise. Announcements
+only hold the path_id, so the paths can't be told apart after the fact.
+The recovery is to run MRT_Parser again with encode_paths=False, which
+stores each as_path inline.
+
+MRT_Announcements_Table can also be partitioned by worker. Instead of
+every parsing process copying into the one table (and contending on
+it), each process copies into its own staging table. Once everything
+is parsed, the staging tables are attached as partitions, which only
+touches the catalog. Each staging table has a CHECK constraint that
+matches its partition, so attaching doesn't scan any rows. If the run
+fails first, restore_table drops them and recreates the plain table.
+
+RIB_Snapshots_Table holds the state of every monitor's RIB at chosen
+instants, or what changed between them, see rib_state_engine.py.
+
+MRT_Ingest_Summary_Table holds the throughput of the last run of
+MRT_Parser per collector, see ingest_telemetry.py.
 """
 
 __author__ = "Justin Furuness"
@@ -23,9 +50,33 @@ __maintainer__ = "Justin Furuness"
 __email__ = "jfuruness@gmail.com"
 __status__ = "Production"
 
+from hashlib import blake2b
+from struct import pack
+
 from ....utils.database import Generic_Table
 
 
+class Path_ID_Collision(Exception):
+    """Two different AS paths hashed to the same path_id
+
+    In depth explanation at the top of the file."""
+
+    pass
+
+
+# Partitioned tables hold no rows, only their partitions do, and
+# postgres refuses to make them unlogged. The staging tables that
+# become the partitions are unlogged.
+_PARTITIONED_SQL = """CREATE TABLE {name} (
+                          prefix INET,
+                          as_path bigint ARRAY,
+                          origin BIGINT,
+                          time BIGINT,
+                          path_id BIGINT,
+                          worker INTEGER
+                          ) PARTITION BY LIST (worker);"""
+
+
 class MRT_Announcements_Table(Generic_Table):
     """Class with database functionality.
 
@@ -35,7 +86,7 @@ class MRT_Announcements_Table(Generic_Table):
 
     name = "mrt_announcements"
 
-    columns = ["prefix", "as_path", "origin", "time"]
+    columns = ["prefix", "as_path", "origin", "time", "path_id"]
 
     def _create_tables(self):
         """Creates tables if they do not exist.
@@ -47,6 +98,216 @@ class MRT_Announcements_Table(Generic_Table):
                  prefix INET,
                  as_path bigint ARRAY,
                  origin BIGINT,
+                 time BIGINT,
+                 path_id BIGINT
+                 );"""
+        self.execute(sql)
+
+    def create_partitioned_table(self):
+        """Recreates the table partitioned by worker, see top of file
+
+        Leftover staging tables from a crashed run are dropped too.
+        """
+
+        self.clear_table()
+        self._drop_staging_tables()
+        self.execute(_PARTITIONED_SQL.format(name=self.name))
+
+    def restore_table(self):
+        """Drops the staging tables and recreates the unpartitioned table
+
+        For when a run fails before the staging tables are attached,
+        so that mrt_announcements isn't left an empty partitioned table
+        with orphaned staging tables next to it.
+        """
+
+        self._drop_staging_tables()
+        self.clear_table()
+        self._create_tables()
+
+    def create_staging_table(self, worker: int) -> str:
+        """Creates the staging table for a worker and returns its name
+
+        The worker column defaults to the worker, so rows copied in
+        don't need it. Safe to call more than once.
+        """
+
+        table = f"{self.name}_{worker}"
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {table} (
+                  LIKE {self.name},
+                  CHECK (worker IS NOT NULL AND worker = {worker})
+                  );"""
+        self.execute(sql)
+        self.execute(f"""ALTER TABLE {table}
+                         ALTER COLUMN worker SET DEFAULT {worker};""")
+        return table
+
+    def attach_staging_tables(self) -> list:
+        """Attaches every staging table as a partition
+
+        Returns the names of the attached tables.
+        """
+
+        tables = self._get_staging_tables()
+        for table in tables:
+            worker = table[len(self.name) + 1:]
+            self.execute(f"""ALTER TABLE {self.name}
+                             ATTACH PARTITION {table}
+                             FOR VALUES IN ({worker});""")
+        return tables
+
+    def _drop_staging_tables(self):
+        """Drops the staging tables that are not yet partitions"""
+
+        for table in self._get_staging_tables():
+            self.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def _get_staging_tables(self) -> list:
+        """Returns the staging tables that are not yet partitions"""
+
+        sql = """SELECT relname FROM pg_class
+                 WHERE relkind = 'r'
+                    AND NOT relispartition
+                    AND relname ~ %s;"""
+        return sorted(x["relname"]
+                      for x in self.execute(sql, [f"^{self.name}_[0-9]+$"]))
+
+
+class AS_Paths_Table(Generic_Table):
+    """Class with database functionality.
+
+    In depth explanation at the top of the file."""
+
+    __slots__ = []
+
+    name = "as_paths"
+
+    columns = ["path_id", "as_path"]
+
+    def _create_tables(self):
+        """Creates tables if they do not exist.
+
+        Called during initialization of the database class.
+        """
+
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name} (
+                 path_id BIGINT,
+                 as_path BIGINT ARRAY
+                 );"""
+        self.execute(sql)
+
+    def create_index(self):
+        """Creates an index on path_id, for expanding paths"""
+
+        sql = f"""CREATE INDEX IF NOT EXISTS {self.name}_path_id_index
+                  ON {self.name}(path_id);"""
+        self.execute(sql)
+
+    def delete_duplicates(self):
+        """Deletes paths inserted by more than one file, then indexes
+
+        Raises Path_ID_Collision, leaving the table as is, if two
+        different paths have the same path_id, since joining on path_id
+        would then duplicate announcements. Rerun MRT_Parser with
+        encode_paths=False to recover, see the top of the file.
+        """
+
+        self.execute(f"DROP TABLE IF EXISTS {self.name}_temp")
+        sql = f"""CREATE UNLOGGED TABLE {self.name}_temp AS (
+                  SELECT DISTINCT path_id, as_path
+                  FROM {self.name});"""
+        self.execute(sql)
+        sql = f"""SELECT COUNT(*) - COUNT(DISTINCT path_id) AS collisions
+                  FROM {self.name}_temp;"""
+        collisions = self.execute(sql)[0]["collisions"]
+        if collisions > 0:
+            # As text, since arrays of different lengths can't be
+            # aggregated
+            sql = f"""SELECT path_id,
+                        array_agg(as_path::TEXT ORDER BY as_path) AS as_paths
+                      FROM {self.name}_temp
+                      GROUP BY path_id HAVING COUNT(*) > 1
+                      ORDER BY path_id LIMIT 3;"""
+            examples = "; ".join(f"path_id {x['path_id']} has "
+                                 + " and ".join(x["as_paths"])
+                                 for x in self.execute(sql))
+            self.execute(f"DROP TABLE {self.name}_temp")
+            raise Path_ID_Collision(f"{collisions} path_id collisions in "
+                                    f"{self.name} ({examples}). Rerun "
+                                    "MRT_Parser with encode_paths=False")
+        self.execute(f"DROP TABLE {self.name}")
+        self.execute(f"ALTER TABLE {self.name}_temp RENAME TO {self.name}")
+        self.create_index()
+
+    @staticmethod
+    def get_path_id(as_path: tuple) -> int:
+        """Returns a signed 64 bit hash of the path, used as path_id"""
+
+        digest = blake2b(pack(f"!{len(as_path)}I", *as_path),
+                         digest_size=8).digest()
+        return int.from_bytes(digest, "big", signed=True)
+
+
+class RIB_Snapshots_Table(Generic_Table):
+    """Class with database functionality.
+
+    In depth explanation at the top of the file."""
+
+    __slots__ = []
+
+    name = "rib_snapshots"
+
+    columns = ["instant", "monitor_asn", "peer_ip", "prefix", "as_path",
+               "origin", "time"]
+
+    def _create_tables(self):
+        """Creates tables if they do not exist.
+
+        Called during initialization of the database class.
+        """
+
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name} (
+                 instant BIGINT,
+                 monitor_asn BIGINT,
+                 peer_ip INET,
+                 prefix CIDR,
+                 as_path BIGINT ARRAY,
+                 origin BIGINT,
                  time BIGINT
                  );"""
         self.execute(sql)
+
+
+class MRT_Ingest_Summary_Table(Generic_Table):
+    """Class with database functionality.
+
+    In depth explanation at the top of the file."""
+
+    __slots__ = []
+
+    name = "mrt_ingest_summary"
+
+    columns = ["collector", "files", "bytes", "decompressed_bytes", "rows",
+               "download_seconds", "decode_seconds", "copy_seconds",
+               "checkpoint_seconds", "parse_seconds", "rows_per_second"]
+
+    def _create_tables(self):
+        """Creates tables if they do not exist.
+
+        Called during initialization of the database class.
+        """
+
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name} (
+                 collector VARCHAR(255),
+                 files INTEGER,
+                 bytes BIGINT,
+                 decompressed_bytes BIGINT,
+                 rows BIGINT,
+                 download_seconds DOUBLE PRECISION,
+                 decode_seconds DOUBLE PRECISION,
+                 copy_seconds DOUBLE PRECISION,
+                 checkpoint_seconds DOUBLE PRECISION,
+                 parse_seconds DOUBLE PRECISION,
+                 rows_per_second DOUBLE PRECISION
+                 );"""
+        self.execute(sql)
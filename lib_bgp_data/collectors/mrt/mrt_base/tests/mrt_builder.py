@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains class MRT_Builder, which writes small MRT files.
+
+Downloading real RIBs is slow, so unit tests for the MRT_Decoder build
+their own TABLE_DUMP_V2 files with known contents instead.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import bz2
+import gzip
+from ipaddress import ip_network
+from struct import pack
+
+
+class MRT_Builder:
+    """Builds MRT files out of announcements for testing"""
+
+    def __init__(self, peers=(("10.0.0.1", 1), ("10.0.0.2", 2))):
+        """Starts a file with a PEER_INDEX_TABLE of peers
+
+        If peers is None there is no PEER_INDEX_TABLE, as in update files.
+        """
+
+        self.records = [self.peer_index_table(peers)] if peers else []
+        self.seq = 0
+
+    def add_rib(self, prefix: str, entries: list, addpath=False):
+        """Adds a RIB record. entries is a list of (time, attrs bytes)"""
+
+        net = ip_network(prefix)
+        subtype = 2 if net.version == 4 else 4
+        if addpath:
+            subtype += 6
+        prefix_bytes = net.network_address.packed[:(net.prefixlen + 7) // 8]
+        body = pack("!IB", self.seq, net.prefixlen) + prefix_bytes
+        body += pack("!H", len(entries))
+        for peer_index, (time, attrs) in enumerate(entries):
+            body += pack("!HI", peer_index, time)
+            if addpath:
+                body += pack("!I", 1)
+            body += pack("!H", len(attrs)) + attrs
+        self.seq += 1
+        self.records.append(self.record(13, subtype, body))
+
+    def add_update(self, peer, withdrawn=(), announced=(), attrs=b"",
+                   time=1, as4=True, extended_time=False):
+        """Adds a BGP4MP UPDATE from peer, which is (peer_ip, peer_asn)
+
+        withdrawn and announced are IPV4 prefixes. IPV6 prefixes go in
+        attrs, see mp_reach and mp_unreach.
+        """
+
+        withdrawn = self.nlri(withdrawn)
+        update = (pack("!H", len(withdrawn)) + withdrawn
+                  + pack("!H", len(attrs)) + attrs + self.nlri(announced))
+        # Marker, length, type UPDATE
+        message = b"\xff" * 16 + pack("!HB", 19 + len(update), 2) + update
+        body = self._bgp4mp_peer(peer, as4) + message
+        self._add_bgp4mp(4 if as4 else 1, body, time, extended_time)
+
+    def add_state_change(self, peer, old_state: int, new_state: int,
+                         time=1):
+        """Adds a BGP4MP_STATE_CHANGE_AS4, 6 is Established"""
+
+        body = self._bgp4mp_peer(peer, True)
+        self._add_bgp4mp(5, body + pack("!HH", old_state, new_state), time)
+
+    def write(self, path: str, compression=None):
+        """Writes the file, compression can be None, bz2, or gz"""
+
+        _open = {None: open, "bz2": bz2.open, "gz": gzip.open}[compression]
+        with _open(path, "wb") as f:
+            f.write(b"".join(self.records))
+
+    @staticmethod
+    def record(_type: int, subtype: int, body: bytes, time=1) -> bytes:
+        """Returns an MRT record with the common header"""
+
+        return pack("!IHHI", time, _type, subtype, len(body)) + body
+
+    @staticmethod
+    def peer_index_table(peers) -> bytes:
+        """Returns a PEER_INDEX_TABLE record with IPV4 4 byte AS peers"""
+
+        body = pack("!IH", 0, 0) + pack("!H", len(peers))
+        for ip, asn in peers:
+            body += pack("!BI", 2, 0) + ip_network(ip).network_address.packed
+            body += pack("!I", asn)
+        return MRT_Builder.record(13, 1, body)
+
+    @staticmethod
+    def as_path(*segments, attr_type=2, extended=False,
+                two_byte=False) -> bytes:
+        """Returns an AS_PATH attribute, segments are (seg_type, asns)
+
+        Seg type 1 is an AS_SET and 2 is an AS_SEQUENCE. ASNs are 4
+        bytes unless two_byte, as in BGP4MP_MESSAGE.
+        """
+
+        fmt = "H" if two_byte else "I"
+        value = b""
+        for seg_type, asns in segments:
+            value += pack(f"!BB{len(asns)}{fmt}", seg_type, len(asns), *asns)
+        if extended:
+            return pack("!BBH", 0x50, attr_type, len(value)) + value
+        return pack("!BBB", 0x40, attr_type, len(value)) + value
+
+    @staticmethod
+    def nlri(prefixes) -> bytes:
+        """Returns prefixes encoded as a length then the needed bytes"""
+
+        value = b""
+        for prefix in prefixes:
+            net = ip_network(prefix)
+            value += pack("!B", net.prefixlen)
+            value += net.network_address.packed[:(net.prefixlen + 7) // 8]
+        return value
+
+    @staticmethod
+    def mp_reach(prefixes) -> bytes:
+        """Returns an MP_REACH_NLRI attribute of IPV6 unicast prefixes"""
+
+        next_hop = ip_network("2001:db8::1").network_address.packed
+        value = (pack("!HBB", 2, 1, len(next_hop)) + next_hop + b"\x00"
+                 + MRT_Builder.nlri(prefixes))
+        return pack("!BBH", 0x90, 14, len(value)) + value
+
+    @staticmethod
+    def mp_unreach(prefixes) -> bytes:
+        """Returns an MP_UNREACH_NLRI attribute of IPV6 unicast prefixes"""
+
+        value = pack("!HB", 2, 1) + MRT_Builder.nlri(prefixes)
+        return pack("!BBH", 0x90, 15, len(value)) + value
+
+    def _bgp4mp_peer(self, peer, as4: bool) -> bytes:
+        """Returns the peer and local AS/ip fields, always IPV4 peers"""
+
+        peer_ip, peer_asn = peer
+        fmt = "!IIHH" if as4 else "!HHHH"
+        return (pack(fmt, peer_asn, 65000, 0, 1)
+                + ip_network(peer_ip).network_address.packed
+                + bytes(4))
+
+    def _add_bgp4mp(self, subtype: int, body: bytes, time: int,
+                    extended_time=False):
+        """Adds a BGP4MP record, or BGP4MP_ET with microseconds"""
+
+        if extended_time:
+            self.records.append(self.record(17, subtype,
+                                            pack("!I", 0) + body, time))
+        else:
+            self.records.append(self.record(16, subtype, body, time))
+
+    @staticmethod
+    def origin_attr() -> bytes:
+        """Returns an ORIGIN attribute, used to make sure it's skipped"""
+
+        return pack("!BBBB", 0x40, 1, 1, 0)
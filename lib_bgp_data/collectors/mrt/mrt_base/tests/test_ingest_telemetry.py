@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the ingest_telemetry.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import json
+
+import pytest
+
+from ..ingest_telemetry import Ingest_Telemetry
+from ..mrt_file import MRT_File
+from ..tables import MRT_Ingest_Summary_Table
+
+
+@pytest.mark.mrt_parser
+class Test_Ingest_Telemetry:
+    """Tests the Ingest_Telemetry class"""
+
+    rrc00 = "http://data.ris.ripe.net/rrc00/2020.01/bview.20200101.0000.gz"
+    rrc01 = "http://data.ris.ripe.net/rrc01/2020.01/bview.20200101.0000.gz"
+
+    def _metrics(self, url, rows, parse_seconds, decompressed_bytes=100):
+        """Returns the metrics of a file like MRT_File.parse_file"""
+
+        return {"url": url,
+                "bytes": 10,
+                "rows": rows,
+                "decompressed_bytes": decompressed_bytes,
+                "download_seconds": 1,
+                "decode_seconds": parse_seconds / 2,
+                "copy_seconds": parse_seconds / 2,
+                "checkpoint_seconds": 0,
+                "parse_seconds": parse_seconds}
+
+    @pytest.fixture
+    def telemetry(self):
+        """Two rrc00 files and one rrc01 file"""
+
+        telemetry = Ingest_Telemetry()
+        telemetry.add(self._metrics(self.rrc00, 100, 1))
+        telemetry.add(self._metrics(self.rrc00, 300, 3))
+        telemetry.add(self._metrics(self.rrc01, 50, 10, None))
+        return telemetry
+
+    def test_summarize(self, telemetry):
+        """Metrics are summed per collector, slowest collector first"""
+
+        rrc01, rrc00 = telemetry.summarize()
+        assert rrc00["collector"] == "data.ris.ripe.net/rrc00"
+        assert rrc00["files"] == 2
+        assert rrc00["rows"] == 400
+        assert rrc00["bytes"] == 20
+        assert rrc00["decompressed_bytes"] == 200
+        assert rrc00["download_seconds"] == 2
+        assert rrc00["rows_per_second"] == pytest.approx(100)
+        # Not decoded natively, so the size is unknown
+        assert rrc01["decompressed_bytes"] is None
+        assert rrc01["rows_per_second"] == pytest.approx(5)
+
+    def test_write_json(self, telemetry, tmp_path):
+        """The report has the summary and every file"""
+
+        path = str(tmp_path / "dir" / "report.json")
+        telemetry.write_json(path)
+        with open(path, "r") as f:
+            report = json.load(f)
+        assert len(report["files"]) == 3
+        assert [x["collector"] for x in report["collectors"]] ==\
+            ["data.ris.ripe.net/rrc01", "data.ris.ripe.net/rrc00"]
+
+    def test_measure(self):
+        """Rows pass through unchanged, and are counted once used"""
+
+        metrics = {"rows": 0, "decode_seconds": 0}
+        rows = MRT_File._measure(iter(range(5)), metrics)
+        assert list(rows) == list(range(5))
+        assert metrics["rows"] == 5
+        assert metrics["decode_seconds"] >= 0
+
+    def test_to_db(self, telemetry):
+        """One row per collector must be written"""
+
+        telemetry.to_db()
+        with MRT_Ingest_Summary_Table() as db:
+            assert db.get_count() == 2
+            sql = f"""SELECT * FROM {db.name}
+                    WHERE collector = 'data.ris.ripe.net/rrc00'"""
+            assert db.execute(sql)[0]["rows"] == 400
+            db.clear_table()
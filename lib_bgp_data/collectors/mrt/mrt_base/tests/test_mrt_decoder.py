@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the mrt_decoder.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import logging
+
+import pytest
+
+from .mrt_builder import MRT_Builder
+from . import test_mrt_file
+from ..mrt_decoder import MRT_Decoder
+from ..mrt_file import MRT_File
+from .....utils import utils
+
+
+@pytest.mark.mrt_parser
+class Test_MRT_Decoder:
+    """Tests all functions within the MRT_Decoder class."""
+
+    @pytest.mark.parametrize("compression", [None, "bz2", "gz"])
+    def test_decode(self, tmp_path, compression):
+        """Tests that raw, bz2, and gz files decode the same way"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        builder.add_rib("1.2.0.0/16",
+                        [(100, MRT_Builder.origin_attr()
+                          + MRT_Builder.as_path((2, [1, 3, 5]))),
+                         (200, MRT_Builder.as_path((2, [2, 5])))])
+        builder.write(path, compression)
+
+        decoder = MRT_Decoder(path)
+        assert list(decoder) == [("1.2.0.0/16", (1, 3, 5), 5, 100),
+                                 ("1.2.0.0/16", (2, 5), 5, 200)]
+        assert decoder.peers == [("10.0.0.1", 1), ("10.0.0.2", 2)]
+
+    def test_bytes_read(self, tmp_path):
+        """bytes_read must be the decompressed size of the whole file"""
+
+        builder = MRT_Builder()
+        builder.add_rib("1.2.0.0/16", [(1, MRT_Builder.as_path((2, [1, 5])))])
+        builder.write(str(tmp_path / "raw"))
+        builder.write(str(tmp_path / "rib"), "bz2")
+
+        decoder = MRT_Decoder(str(tmp_path / "rib"))
+        list(decoder)
+        assert decoder.bytes_read == (tmp_path / "raw").stat().st_size
+
+    def test_ipv6_and_addpath(self, tmp_path):
+        """Tests IPV6 prefixes and the RFC 8050 addpath subtypes"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        attrs = MRT_Builder.as_path((2, [7, 8]), extended=True)
+        builder.add_rib("2001:db8::/32", [(1, attrs)])
+        builder.add_rib("1.2.3.0/24", [(2, attrs)], addpath=True)
+        builder.add_rib("2001:db8:1::/48", [(3, attrs)], addpath=True)
+        builder.write(path)
+
+        assert list(MRT_Decoder(path)) == [("2001:db8::/32", (7, 8), 8, 1),
+                                           ("1.2.3.0/24", (7, 8), 8, 2),
+                                           ("2001:db8:1::/48", (7, 8), 8, 3)]
+
+    @pytest.mark.parametrize("IPV4, IPV6", [(True, True),
+                                            (True, False),
+                                            (False, True),
+                                            (False, False)])
+    def test_IPV_filter(self, tmp_path, IPV4, IPV6):
+        """Unwanted families must be dropped at parse time"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        attrs = MRT_Builder.as_path((2, [7, 8]))
+        builder.add_rib("1.2.3.0/24", [(1, attrs)])
+        builder.add_rib("2001:db8::/32", [(2, attrs)], addpath=True)
+        builder.write(path)
+
+        expected = []
+        if IPV4:
+            expected.append(("1.2.3.0/24", (7, 8), 8, 1))
+        if IPV6:
+            expected.append(("2001:db8::/32", (7, 8), 8, 2))
+        assert list(MRT_Decoder(path, IPV4, IPV6)) == expected
+        # The pipeline output is filtered on the prefix column instead
+        lines = [MRT_File._format_row(*x) for x in MRT_Decoder(path)]
+        assert [MRT_File._is_IPV6(x) for x in lines] == [False, True]
+
+    def test_as_sets_dropped(self, tmp_path):
+        """AS sets are dropped, same as the bgpscanner regex did"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        builder.add_rib("1.2.3.0/24",
+                        [(1, MRT_Builder.as_path((2, [1, 2]), (1, [3, 4]))),
+                         (2, MRT_Builder.as_path((2, [1, 2])))])
+        builder.write(path)
+
+        assert list(MRT_Decoder(path)) == [("1.2.3.0/24", (1, 2), 2, 2)]
+
+    def test_empty_and_as4_path(self, tmp_path):
+        """Empty paths have no origin. AS4_PATH replaces AS_TRANS."""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        as4 = MRT_Builder.as_path((2, [400000]), attr_type=17)
+        builder.add_rib("1.2.3.0/24",
+                        [(1, b""),
+                         (2, MRT_Builder.as_path((2, [1, 23456])) + as4)])
+        builder.write(path)
+
+        assert list(MRT_Decoder(path)) == [("1.2.3.0/24", (), None, 1),
+                                           ("1.2.3.0/24", (1, 400000),
+                                            400000, 2)]
+
+    def test_truncated_file(self, tmp_path):
+        """A partially downloaded file decodes up to the last record"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        builder.add_rib("1.2.3.0/24", [(1, MRT_Builder.as_path((2, [1])))])
+        builder.add_rib("1.2.4.0/24", [(1, MRT_Builder.as_path((2, [1])))])
+        builder.write(path)
+        with open(path, "rb+") as f:
+            f.truncate(len(f.read()) - 3)
+
+        assert list(MRT_Decoder(path)) == [("1.2.3.0/24", (1,), 1, 1)]
+
+    def test_format_row(self):
+        """Rows must be formatted the same as the old sed output"""
+
+        assert MRT_File._format_row("1.2.3.0/24", (1, 2), 2, 5) == \
+            "1.2.3.0/24\t{1, 2}\t2\t5\n"
+        assert MRT_File._format_row("1.2.3.0/24", (), None, 5) == \
+            "1.2.3.0/24\t{}\t\t5\n"
+
+    def test_rib_entries(self, tmp_path):
+        """RIB entries must come with the peer they were learned from"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder(peers=(("10.0.0.1", 1),
+                                     ("10.0.0.2", 2),
+                                     ("10.0.0.3", 3)))
+        # The second entry has a set, so it's dropped
+        builder.add_rib("1.2.0.0/16",
+                        [(100, MRT_Builder.as_path((2, [1, 5]))),
+                         (200, MRT_Builder.as_path((1, [2, 5]))),
+                         (300, MRT_Builder.as_path((2, [3, 5])))])
+        builder.write(path)
+        assert list(MRT_Decoder(path).rib_entries()) ==\
+            [(("10.0.0.1", 1), "1.2.0.0/16", (1, 5), 100),
+             (("10.0.0.3", 3), "1.2.0.0/16", (3, 5), 300)]
+
+    @pytest.mark.parametrize("as4, extended_time", [(True, False),
+                                                    (False, True)])
+    def test_updates(self, tmp_path, as4, extended_time):
+        """Announcements, withdrawals, and IPV6 in MP attributes"""
+
+        path = str(tmp_path / "updates")
+        peer = ("10.0.0.9", 9)
+        attrs = MRT_Builder.as_path((2, [9, 4]), two_byte=not as4)
+        builder = MRT_Builder()
+        builder.add_update(peer, announced=["1.2.0.0/16", "1.3.0.0/24"],
+                           attrs=attrs, time=10, as4=as4,
+                           extended_time=extended_time)
+        builder.add_update(peer, withdrawn=["1.2.0.0/16"], time=11,
+                           as4=as4, extended_time=extended_time)
+        builder.add_update(peer,
+                           attrs=MRT_Builder.mp_reach(["2001:db8::/32"])
+                           + attrs,
+                           time=12, as4=as4, extended_time=extended_time)
+        builder.add_update(peer,
+                           attrs=MRT_Builder.mp_unreach(["2001:db8::/32"]),
+                           time=13, as4=as4, extended_time=extended_time)
+        builder.add_state_change(peer, 6, 1, time=14)
+        # Not out of Established, so nothing is yielded
+        builder.add_state_change(peer, 1, 6, time=15)
+        builder.write(path, "bz2")
+
+        assert list(MRT_Decoder(path).updates()) == [
+            (10, peer, [], ["1.2.0.0/16", "1.3.0.0/24"], (9, 4)),
+            (11, peer, ["1.2.0.0/16"], [], ()),
+            (12, peer, [], ["2001:db8::/32"], (9, 4)),
+            (13, peer, ["2001:db8::/32"], [], ()),
+            (14, peer, None, None, None)]
+        # Families that are not wanted are not decoded
+        assert [x[0] for x in MRT_Decoder(path, IPV6=False).updates()] ==\
+            [10, 11, 14]
+
+    def test_update_with_as_set(self, tmp_path):
+        """A path with a set must come back as None"""
+
+        path = str(tmp_path / "updates")
+        builder = MRT_Builder()
+        builder.add_update(("10.0.0.9", 9),
+                           announced=["1.2.0.0/16"],
+                           attrs=MRT_Builder.as_path((2, [9]), (1, [4, 5])))
+        builder.write(path)
+        assert list(MRT_Decoder(path).updates()) ==\
+            [(1, ("10.0.0.9", 9), [], ["1.2.0.0/16"], None)]
+
+    def test_skipped_types(self, tmp_path, caplog):
+        """Records that aren't TABLE_DUMP_V2 are counted and logged"""
+
+        path = str(tmp_path / "updates")
+        builder = MRT_Builder(peers=None)
+        for _ in range(2):
+            builder.add_update(("10.0.0.9", 9),
+                               announced=["1.2.0.0/16"],
+                               attrs=MRT_Builder.as_path((2, [9])))
+        builder.write(path)
+        decoder = MRT_Decoder(path)
+        with caplog.at_level(logging.WARNING):
+            assert list(decoder) == []
+        assert decoder.skipped == {MRT_Decoder.BGP4MP: 2}
+        assert "No RIB entries" in caplog.text
+
+    def test_get_first_type(self, tmp_path):
+        """RIBs start with TABLE_DUMP_V2, update files with BGP4MP"""
+
+        builder = MRT_Builder()
+        builder.write(str(tmp_path / "rib"), "gz")
+        assert MRT_Decoder(str(tmp_path / "rib")).get_first_type() ==\
+            MRT_Decoder.TABLE_DUMP_V2
+        builder = MRT_Builder(peers=None)
+        builder.add_update(("10.0.0.9", 9), withdrawn=["1.2.0.0/16"])
+        builder.write(str(tmp_path / "updates"))
+        assert MRT_Decoder(str(tmp_path / "updates")).get_first_type() ==\
+            MRT_Decoder.BGP4MP
+        MRT_Builder(peers=None).write(str(tmp_path / "empty"))
+        assert MRT_Decoder(str(tmp_path / "empty")).get_first_type() is None
+
+    def test_first_type_then_decode(self, tmp_path, monkeypatch):
+        """Decoding goes on from the peeked record, in the same handle"""
+
+        builder = MRT_Builder()
+        builder.add_rib("1.2.0.0/16",
+                        [(100, MRT_Builder.as_path((2, [1, 3])))])
+        builder.write(str(tmp_path / "rib"), "bz2")
+        expected = list(MRT_Decoder(str(tmp_path / "rib")))
+        opened = []
+        open_decompressed = utils.open_decompressed
+
+        def counted(*args, **kwargs):
+            opened.append(args)
+            return open_decompressed(*args, **kwargs)
+
+        monkeypatch.setattr(utils, "open_decompressed", counted)
+        decoder = MRT_Decoder(str(tmp_path / "rib"))
+        assert decoder.get_first_type() == MRT_Decoder.TABLE_DUMP_V2
+        assert list(decoder) == expected
+        assert len(opened) == 1
+        # Another pass opens the file again
+        assert list(decoder) == expected
+        assert len(opened) == 2
+
+    @pytest.mark.slow
+    def test_native_vs_bgpscanner(self):
+        """The decoder must output the same rows as the bgpscanner pipeline
+
+        Both parse the same downloaded RIB.
+        """
+
+        mrt_file = test_mrt_file.Test_MRT_File()._mrt_file_factory()
+        csv_path = f"{mrt_file.path}.csv"
+        native = sorted(MRT_File._format_row(*row)
+                        for row in MRT_Decoder(mrt_file.path))
+        test_mrt_file.dump_to_csv(mrt_file, csv_path, bgpscanner=True)
+        with open(csv_path, "r") as f:
+            bgpscanner = sorted(f.readlines())
+        assert native == bgpscanner
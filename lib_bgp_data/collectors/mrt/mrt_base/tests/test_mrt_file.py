@@ -6,11 +6,14 @@
 For specifics on each test, see the docstrings under each function.
 """
 
-
+import logging
+import os
+from struct import pack
 from subprocess import check_call
 
 import pytest
 from .expected_output import Expected_Output
+from .mrt_builder import MRT_Builder
 from ..mrt_file import MRT_File
 from ..mrt_parser import MRT_Parser
 from ..tables import MRT_Announcements_Table
@@ -25,6 +28,18 @@ __email__ = "jfuruness@gmail.com"
 __status__ = "Production"
 
 
+def dump_to_csv(mrt_file: MRT_File, csv_path: str, bgpscanner=True):
+    """Writes the output of the bgpscanner or bgpdump pipeline to csv_path
+
+    MRT_File streams this output straight into the database, so tests
+    that compare it line by line write it out here.
+    """
+
+    args = (mrt_file._bgpscanner_args() if bgpscanner
+            else mrt_file._bgpdump_args())
+    check_call(args + "> " + csv_path, shell=True)
+
+
 @pytest.mark.mrt_parser
 class Test_MRT_File:
     """This will test methods of the MRT_File class."""
@@ -88,8 +103,7 @@ class Test_MRT_File:
         # Create an MRT File object to use to get output
         test_file = self._mrt_file_factory()
         # Create a text file of the CSV after modifying BGPScanner output
-        test_file.csv_name = "scanner.txt"
-        test_file._convert_dump_to_csv(bgpscanner=True)
+        dump_to_csv(test_file, "scanner.txt", bgpscanner=True)
         # Get the number of lines in this file
         lines = utils.get_lines_in_file("scanner.txt")
         # Delete the file once the lines have been counted
@@ -127,8 +141,7 @@ class Test_MRT_File:
         # Create an MRT File object to use to get output
         test_file = self._mrt_file_factory()
         # Create a text file of the CSV after modifying BGPDump output
-        test_file.csv_name = "dump.txt"
-        test_file._convert_dump_to_csv(bgpscanner=False)
+        dump_to_csv(test_file, "dump.txt", bgpscanner=False)
         # Get the number of lines in this file
         lines = utils.get_lines_in_file("dump.txt")
         # Delete the file once the lines have been counted
@@ -150,6 +163,52 @@ class Test_MRT_File:
             # Check for sets by looking for the set notation
             assert "{" not in str(db.execute(sql))
 
+    def test_bgp4mp_file(self, tmp_path, caplog):
+        """Update files can't be decoded natively, so use bgpscanner"""
+
+        mrt_file = MRT_File(str(tmp_path), str(tmp_path), "file:///1.bz2")
+        builder = MRT_Builder(peers=None)
+        next_hop = pack("!BBB4s", 0x40, 3, 4, bytes([10, 0, 0, 9]))
+        builder.add_update(("10.0.0.9", 9),
+                           announced=["1.2.0.0/16"],
+                           attrs=(MRT_Builder.origin_attr()
+                                  + MRT_Builder.as_path((2, [9, 4]))
+                                  + next_hop))
+        builder.write(mrt_file.path, "bz2")
+        with MRT_Announcements_Table(clear=True) as db:
+            with caplog.at_level(logging.WARNING):
+                metrics = mrt_file.parse_file()
+            assert "not TABLE_DUMP_V2" in caplog.text
+            assert metrics["rows"] == 1
+            sql = f"SELECT prefix, as_path, origin FROM {db.name}"
+            assert db.execute(sql) == [{"prefix": "1.2.0.0/16",
+                                        "as_path": [9, 4],
+                                        "origin": 4}]
+
+    def test_staging_table_once(self, tmp_path, monkeypatch):
+        """Only the first file a process parses creates its table"""
+
+        created = []
+        create = MRT_Announcements_Table.create_staging_table
+
+        def counted_create(self, worker):
+            created.append(worker)
+            return create(self, worker)
+
+        monkeypatch.setattr(MRT_Announcements_Table,
+                            "create_staging_table",
+                            counted_create)
+        monkeypatch.setattr(MRT_File, "staging_tables", {})
+        mrt_file = MRT_File(str(tmp_path), str(tmp_path), "file:///1.bz2")
+        with MRT_Announcements_Table() as db:
+            db.create_partitioned_table()
+            try:
+                kwargs = mrt_file._get_copy_kwargs(True)
+                assert mrt_file._get_copy_kwargs(True) == kwargs
+                assert created == [os.getpid()]
+            finally:
+                db.restore_table()
+
 ########################
 ### Helper Functions ###
 ########################
@@ -158,7 +217,7 @@ class Test_MRT_File:
         """Gets entries from MRT Announcements"""
 
         with MRT_Announcements_Table(clear=True) as db:
-            mrt_file.parse_file(bgpscanner)
+            mrt_file.parse_file(bgpscanner, native=False)
             return db.get_all()
 
     def _mrt_file_factory(self,
@@ -22,10 +22,12 @@ import os
 import filecmp
 from subprocess import check_call
 from .collectors import Collectors
+from .mrt_builder import MRT_Builder
 from ..mrt_file import MRT_File
 from ..mrt_parser import MRT_Parser
 from ..mrt_sources import MRT_Sources
-from ..tables import MRT_Announcements_Table
+from ..rib_snapshot import RIB_Snapshot_Reader
+from ..tables import MRT_Announcements_Table, AS_Paths_Table
 from .....utils import utils
 from .....utils.database import Database
 
@@ -155,44 +157,14 @@ class Test_MRT_Parser:
         assert len(urls) == collectors
         return urls
 
-    def test_multiprocess_download(self, url_arg=None):
-        """Test multiprocess downloading of files
+    def test_parse_real_urls(self, tmp_path, scanner=True):
+        """Test downloading and parsing real files
 
         NOTE: Run this with just a few quick URLs
             -in other words not from isolario
-        Test that changing number of threads doesn't break it.
-        Test that all files are downloaded correctly.
-        Test that end result is same as no multiprocessing
-        """
-        # Create the parser
-        parser = MRT_Parser()
-        # Get URLs
-        urls = url_arg if url_arg is not None else(
-               self.test_get_mrt_urls([MRT_Sources.ROUTE_VIEWS],
-                                      3,
-                                      Collectors.collectors_3.value))
-        # Get MRT files
-        mrt_files = parser._multiprocess_download(3, urls)
-        # Test all files were downloaded correctly
-        assert len(mrt_files) == len(urls)
-        # Test using more threads doesn't break things
-        parser._multiprocess_download(5, urls)
-        # Test no multiprocessing, check end result
-        no_multi = parser._multiprocess_download(1, urls)
-        # Sanity check
-        assert len(no_multi) == len(mrt_files)
-        return mrt_files
-
-    def test_multiprocess_parse_dls(self, scanner=True):
-        """Test multiprocess parsing of files
-
-        NOTE: Run this with just a few quick URLs
-            -in other words not from isolario
-        Test that changing number of threads doesn't break it.
         Test that all files are parsed correctly. Do this by determining
         the total output of all files, and make sure that the database has
         that number of announcements in it.
-        Test that the end result would be the same without multiprocessing.
         """
         # Create the parser
         parser = MRT_Parser()
@@ -200,14 +172,16 @@ class Test_MRT_Parser:
         urls = self.test_get_mrt_urls([MRT_Sources.ROUTE_VIEWS],
                                       3,
                                       Collectors.collectors_3.value)
-        # Get a few MRT files
-        mrt_files = self.test_multiprocess_download(urls)
+        # Download a copy of the files to count their lines
+        mrt_files = [MRT_File(str(tmp_path), str(tmp_path), url, i + 1)
+                     for i, url in enumerate(urls)]
+        for f in mrt_files:
+            utils.download_file(f.url, f.path)
         # Get expected amount of lines from the files
-        expected_lines = self._get_total_number_of_lines(mrt_files)
-        print(str(expected_lines))
+        expected_lines = self._get_total_number_of_lines(mrt_files, scanner)
+        # Parse files
+        parser._download_and_parse(3, 3, urls, scanner, native=False)
         with Database() as db:
-            # Parse files
-            parser._multiprocess_parse_dls(3, mrt_files, scanner)
             # Make sure all files were inserted
             db_lines = db.execute("SELECT COUNT(*) FROM mrt_announcements")
             lines = db_lines[0]['count']
@@ -215,8 +189,101 @@ class Test_MRT_Parser:
             # Ok, return result
             return lines
 
+    @pytest.mark.parametrize("max_disk_bytes", [1, None])
+    def test_download_and_parse(self, tmp_path, max_disk_bytes):
+        """Tests downloading and parsing at the same time
+
+        Uses local files so that it's fast. A budget of 1 byte means
+        only one file can be on disk at a time, which must still work.
+        """
+
+        parser = MRT_Parser()
+        urls = self._rib_urls(tmp_path)
+        parser._download_and_parse(2, 2, urls, True, True, max_disk_bytes)
+        with Database() as db:
+            count = db.execute("SELECT COUNT(*) FROM mrt_announcements")
+            assert count[0]["count"] == 1 + 2 + 3 + 4
+
+    def test_staging_tables(self, tmp_path):
+        """Staging tables must all be attached, with nothing left over"""
+
+        parser = MRT_Parser()
+        urls = self._rib_urls(tmp_path)
+        try:
+            parser._download_and_parse(2, 2, urls, True, True,
+                                       staging_tables=True)
+            with MRT_Announcements_Table() as db:
+                assert db.get_count() == 1 + 2 + 3 + 4
+                assert db._get_staging_tables() == []
+        finally:
+            # Otherwise the parent is left partitioned
+            with MRT_Announcements_Table() as db:
+                db.clear_table()
+                db._create_tables()
+
+    def test_staging_tables_failed(self, tmp_path):
+        """A failed run must leave the plain table, no staging tables"""
+
+        parser = MRT_Parser()
+        bad = tmp_path / "bad.bz2"
+        bad.write_bytes(b"not an mrt file")
+        urls = self._rib_urls(tmp_path) + [f"file://{bad}"]
+        with pytest.raises(Exception):
+            parser._download_and_parse(2, 2, urls, True, True,
+                                       staging_tables=True)
+        with MRT_Announcements_Table() as db:
+            assert db._get_staging_tables() == []
+            sql = "SELECT relkind FROM pg_class WHERE relname = %s"
+            assert db.execute(sql, [db.name]) == [{"relkind": "r"}]
+
+    def test_snapshot_dir(self, tmp_path):
+        """The snapshot must have the same rows as mrt_announcements"""
+
+        parser = MRT_Parser()
+        builder = MRT_Builder()
+        builder.add_rib("1.2.0.0/24", [(1, MRT_Builder.as_path((2, [1, 2])))])
+        builder.add_rib("1.2.1.0/24", [(2, MRT_Builder.as_path((2, [3, 2])))])
+        urls = self._write_urls(tmp_path, [builder] * 2)
+        snapshot_dir = str(tmp_path / "snapshot")
+        parser._download_and_parse(2, 2, urls, True, True,
+                                   snapshot_dir=snapshot_dir)
+        with Database() as db:
+            sql = "SELECT prefix, as_path, origin, time FROM mrt_announcements"
+            db_rows = sorted((x["prefix"], tuple(x["as_path"]), x["origin"],
+                              x["time"]) for x in db.execute(sql))
+        assert sorted(RIB_Snapshot_Reader(snapshot_dir).rows()) == db_rows
+
+    def test_encode_paths(self, tmp_path):
+        """Encoded paths must expand back to the original paths
+
+        Two files with the same paths are parsed, so that the same
+        path is interned by more than one process.
+        """
+
+        parser = MRT_Parser()
+        builder = MRT_Builder()
+        builder.add_rib("1.2.0.0/24", [(1, MRT_Builder.as_path((2, [1, 2]))),
+                                       (1, MRT_Builder.as_path((2, [3, 2])))])
+        builder.add_rib("1.2.1.0/24", [(1, MRT_Builder.as_path((2, [1, 2])))])
+        urls = self._write_urls(tmp_path, [builder] * 2)
+        with MRT_Announcements_Table(clear=True), AS_Paths_Table(clear=True):
+            pass
+        parser._download_and_parse(2, 2, urls, True, True, encode_paths=True)
+        with AS_Paths_Table() as db:
+            db.delete_duplicates()
+            assert db.get_count() == 2
+        with Database() as db:
+            sql = """SELECT m.prefix, m.as_path AS raw, p.as_path
+                     FROM mrt_announcements m
+                     LEFT JOIN as_paths p ON p.path_id = m.path_id"""
+            rows = sorted((x["prefix"], x["as_path"], x["raw"])
+                          for x in db.execute(sql))
+        assert rows == [("1.2.0.0/24", [1, 2], None)] * 2\
+            + [("1.2.0.0/24", [3, 2], None)] * 2\
+            + [("1.2.1.0/24", [1, 2], None)] * 2
+
     @pytest.mark.slow
-    def test_bgpscanner_vs_bgpdump_parse_dls(self):
+    def test_bgpscanner_vs_bgpdump_parse_dls(self, tmp_path):
         """Tests bgpscanner vs bgpdump
 
         A while back we changed our tool to bgpscanner. This tool had
@@ -231,26 +298,12 @@ class Test_MRT_Parser:
         Also, don't wait while the test is running. Be working on other
         tasks, as this will take hours and hours.
         """
-        scanner = self.test_multiprocess_parse_dls(True)
-        dump = self.test_multiprocess_parse_dls(False)
+        (tmp_path / "scanner").mkdir()
+        (tmp_path / "dump").mkdir()
+        scanner = self.test_parse_real_urls(tmp_path / "scanner", True)
+        dump = self.test_parse_real_urls(tmp_path / "dump", False)
         assert scanner == dump
 
-    def test_filter_and_clean_up_db(self):
-        """Tests that this function runs without error.
-
-        No need to duplicate tests in tables.py. Make it fast.
-        """
-        # Make our parser
-        parser = MRT_Parser()
-        # Do what is necessary to create a table to filter and clean.
-        urls = self.test_get_mrt_urls([MRT_Sources.ROUTE_VIEWS],
-                                      3,
-                                      Collectors.collectors_3.value)
-        files = parser._multiprocess_download(5, urls)
-        parser._multiprocess_parse_dls(5, files, True)
-        # Hope that we don't run into an error here.
-        parser._filter_and_clean_up_db(True, True)
-
     def test_parse_files(self):
         """Test that the parse files function
 
@@ -271,6 +324,28 @@ class Test_MRT_Parser:
 ### Helper Functions ###
 ########################
 
+    def _write_urls(self, tmp_path, builders) -> list:
+        """Writes each MRT_Builder to a bz2 file, returns their urls"""
+
+        urls = []
+        for i, builder in enumerate(builders):
+            path = tmp_path / f"{i}.bz2"
+            builder.write(str(path), "bz2")
+            urls.append(f"file://{path}")
+        return urls
+
+    def _rib_urls(self, tmp_path, files=4) -> list:
+        """Returns urls of RIBs where file i has i + 1 prefixes"""
+
+        builders = []
+        for i in range(files):
+            builder = MRT_Builder()
+            for j in range(i + 1):
+                builder.add_rib(f"1.2.{j}.0/24",
+                                [(1, MRT_Builder.as_path((2, [1, 2])))])
+            builders.append(builder)
+        return self._write_urls(tmp_path, builders)
+
     # From old test
     def _get_total_number_of_lines(self, mrt_files, bgpscanner=True):
         """Gets total number of entries with no as sets.
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the mrt_url_discovery.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from threading import Thread
+
+import pytest
+
+from ..mrt_url_discovery import MRT_URL_Discovery
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves fake broker responses, and 404s for missing files"""
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({"data": {"dumpFiles": [{"url": self.path}]}})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.mrt_parser
+class Test_MRT_URL_Discovery:
+    """Tests the MRT_URL_Discovery class against a local server"""
+
+    @pytest.fixture
+    def server(self):
+        """Yields a local server with a list of the requested paths"""
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        server.paths = []
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def _discovery(self, server, **kwargs):
+        """Returns an MRT_URL_Discovery that queries the local server"""
+
+        url = f"http://127.0.0.1:{server.server_port}/broker"
+        return MRT_URL_Discovery(broker_url=url, **kwargs)
+
+    def test_get_dump_files(self, server):
+        """Identical queries are made once, results keep their order"""
+
+        params = [{"intervals": [f"{i},{i + 1}"], "type": "ribs"}
+                  for i in [0, 1, 0, 2, 1]]
+        with self._discovery(server) as discovery:
+            results = discovery.get_dump_files(params)
+            assert len(server.paths) == 3
+            assert [x[0]["url"] for x in results] ==\
+                [results[i][0]["url"] for i in [0, 1, 0, 3, 1]]
+            # Cached in memory
+            discovery.get_dump_files(params)
+            assert len(server.paths) == 3
+
+    def test_disk_cache(self, server, tmp_path):
+        """A new instance with the same cache_dir makes no requests"""
+
+        params = [{"intervals": ["0,1"], "projects[]": ["ris"]}]
+        with self._discovery(server, cache_dir=str(tmp_path)) as discovery:
+            expected = discovery.get_dump_files(params)
+        with self._discovery(server, cache_dir=str(tmp_path)) as discovery:
+            assert discovery.get_dump_files(params) == expected
+        assert len(server.paths) == 1
+
+    def test_filter_existing(self, server):
+        """404 urls are removed, each url is only checked once"""
+
+        base = f"http://127.0.0.1:{server.server_port}"
+        urls = [f"{base}/a", f"{base}/missing", f"{base}/b", f"{base}/a"]
+        with self._discovery(server) as discovery:
+            assert discovery.filter_existing(urls) ==\
+                [f"{base}/a", f"{base}/b", f"{base}/a"]
+        assert sorted(server.paths) == ["/a", "/b", "/missing"]
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the parse_cost_model.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import pytest
+
+from ..parse_cost_model import Parse_Cost_Model
+
+
+@pytest.mark.mrt_parser
+class Test_Parse_Cost_Model:
+    """Tests the Parse_Cost_Model class"""
+
+    rv2 = ("http://archive.routeviews.org/route-views2/bgpdata/2020.01/"
+           "RIBS/rib.20200101.0000.bz2")
+    rrc = "http://data.ris.ripe.net/rrc00/2020.01/bview.20200101.0000.gz"
+
+    def test_get_key(self):
+        """Month folders are dropped, so keys carry over between runs"""
+
+        assert Parse_Cost_Model.get_key(self.rv2) ==\
+            "archive.routeviews.org/route-views2/bgpdata/RIBS|rib|bz2"
+        assert Parse_Cost_Model.get_key(self.rrc) ==\
+            "data.ris.ripe.net/rrc00|bview|gz"
+
+    def test_no_history(self, tmp_path):
+        """With nothing learned, the largest file is the longest"""
+
+        model = Parse_Cost_Model(str(tmp_path / "costs.json"))
+        assert model.estimate(self.rv2, 10) > model.estimate(self.rrc, 5)
+
+    def test_learned_order(self, tmp_path):
+        """A slow collector goes first even if its file is smaller"""
+
+        model = Parse_Cost_Model(str(tmp_path / "costs.json"))
+        model.update(self.rv2, 100, 10)
+        model.update(self.rrc, 100, 1)
+        assert model.estimate(self.rv2, 50) > model.estimate(self.rrc, 100)
+        # Unseen collector of a known kind uses that kind's rate
+        other = self.rv2.replace("route-views2", "route-views3")
+        assert model.estimate(other, 100) == pytest.approx(10)
+
+    def test_save_and_load(self, tmp_path):
+        """A later run must start from what earlier runs learned"""
+
+        path = str(tmp_path / "dir" / "costs.json")
+        model = Parse_Cost_Model(path)
+        model.update(self.rv2, 100, 10)
+        model.save()
+        assert Parse_Cost_Model(path).estimate(self.rv2, 200) ==\
+            pytest.approx(20)
+
+    def test_decay(self, tmp_path):
+        """Recent parse times count more than older ones"""
+
+        model = Parse_Cost_Model(str(tmp_path / "costs.json"), decay=.5)
+        model.update(self.rv2, 100, 100)
+        model.update(self.rv2, 100, 10)
+        # (100 * .5 + 10) / (100 * .5 + 100)
+        assert model.estimate(self.rv2, 1) == pytest.approx(60 / 150)
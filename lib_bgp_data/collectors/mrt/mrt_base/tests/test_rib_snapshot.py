@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the rib_snapshot.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+import pytest
+
+from .mrt_builder import MRT_Builder
+from ..mrt_decoder import MRT_Decoder
+from ..rib_snapshot import RIB_Snapshot_Writer, RIB_Snapshot_Reader
+
+
+@pytest.mark.mrt_parser
+class Test_RIB_Snapshot:
+    """Tests writing and memory mapping columnar snapshots"""
+
+    rows = [("1.2.0.0/16", (1, 2, 3), 3, 5),
+            ("2001:db8::/32", (), None, 6),
+            ("255.255.255.255/32", (4294967295,), 4294967295, 7),
+            ("ffff::/16", (4,), 4, 8)]
+
+    def test_round_trip(self, tmp_path):
+        """Rows must come back exactly, across chunks and parts"""
+
+        for part in ["1", "2"]:
+            with RIB_Snapshot_Writer(str(tmp_path / part),
+                                     rows_per_chunk=3) as writer:
+                assert list(writer.tee(iter(self.rows))) == self.rows
+        reader = RIB_Snapshot_Reader(str(tmp_path))
+        assert len(reader) == 2 * len(self.rows)
+        assert list(reader.rows()) == self.rows * 2
+
+    def test_memory_mapped(self, tmp_path):
+        """Columns are read only maps that numpy can scan directly"""
+
+        with RIB_Snapshot_Writer(str(tmp_path / "1")) as writer:
+            writer.write(self.rows)
+        part = RIB_Snapshot_Reader(str(tmp_path)).parts[0]
+        assert isinstance(part["time"], np.memmap)
+        assert not part["time"].flags.writeable
+        assert part["ipv6"].sum() == 2
+        assert np.diff(part["path_offsets"]).tolist() == [3, 0, 1, 1]
+
+    def test_unfinished_parts_skipped(self, tmp_path):
+        """Parts without meta.json (still being written) are ignored"""
+
+        writer = RIB_Snapshot_Writer(str(tmp_path / "1"))
+        writer.write(self.rows)
+        with RIB_Snapshot_Writer(str(tmp_path / "2")) as empty:
+            empty.write([])
+        reader = RIB_Snapshot_Reader(str(tmp_path))
+        assert len(reader.parts) == 1 and len(reader) == 0
+        writer.close()
+        assert len(RIB_Snapshot_Reader(str(tmp_path))) == len(self.rows)
+
+    def test_decoder_rows(self, tmp_path):
+        """A snapshot of a decoded file matches the decoder"""
+
+        path = str(tmp_path / "rib")
+        builder = MRT_Builder()
+        builder.add_rib("1.2.0.0/16", [(1, MRT_Builder.as_path((2, [1, 5]))),
+                                       (2, MRT_Builder.as_path((2, [2, 5])))])
+        builder.add_rib("2001:db8::/32", [(3, MRT_Builder.as_path())])
+        builder.write(path)
+        with RIB_Snapshot_Writer(str(tmp_path / "snapshot" / "1")) as writer:
+            writer.write(MRT_Decoder(path))
+        reader = RIB_Snapshot_Reader(str(tmp_path / "snapshot"))
+        assert list(reader.rows()) == list(MRT_Decoder(path))
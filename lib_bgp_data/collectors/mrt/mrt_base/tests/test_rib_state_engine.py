@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the rib_state_engine.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import pytest
+
+from .mrt_builder import MRT_Builder
+from ..rib_state_engine import RIB_State_Engine
+from ..tables import RIB_Snapshots_Table
+
+
+@pytest.mark.mrt_parser
+class Test_RIB_State_Engine:
+    """Tests the RIB_State_Engine class with built MRT files"""
+
+    peer_1 = ("10.0.0.1", 1)
+    peer_2 = ("10.0.0.2", 2)
+
+    @pytest.fixture
+    def paths(self, tmp_path):
+        """Writes a RIB and two update files, returns their paths
+
+        The RIB has 1.2.0.0/16 from both peers. Then:
+            t=10 peer 1 announces 1.3.0.0/16
+            t=20 peer 2 withdraws 1.2.0.0/16
+            t=25 peer 1 changes the path of 1.2.0.0/16
+            t=30 peer 1's session goes down
+        The updates are split over two files, out of order.
+        """
+
+        rib = MRT_Builder()
+        rib.add_rib("1.2.0.0/16", [(1, MRT_Builder.as_path((2, [1, 5]))),
+                                   (2, MRT_Builder.as_path((2, [2, 5])))])
+        rib.write(str(tmp_path / "rib"))
+        first = MRT_Builder()
+        first.add_update(self.peer_1, announced=["1.3.0.0/16"],
+                         attrs=MRT_Builder.as_path((2, [1, 6])), time=10)
+        first.add_update(self.peer_1, announced=["1.2.0.0/16"],
+                         attrs=MRT_Builder.as_path((2, [1, 7, 5])), time=25)
+        first.write(str(tmp_path / "first"), "gz")
+        second = MRT_Builder()
+        second.add_update(self.peer_2, withdrawn=["1.2.0.0/16"], time=20)
+        second.add_state_change(self.peer_1, 6, 1, time=30)
+        second.write(str(tmp_path / "second"), "bz2")
+        return [str(tmp_path / x) for x in ["rib", "second", "first"]]
+
+    def _replay(self, paths, instants, diffs):
+        """Returns {instant: sorted rows} from a fresh engine"""
+
+        engine = RIB_State_Engine()
+        engine.load_rib(paths[0])
+        return {instant: sorted(rows, key=str)
+                for instant, rows in engine.replay(paths[1:],
+                                                   instants,
+                                                   diffs)}
+
+    def test_snapshots(self, paths):
+        """Each snapshot has every update at or before its instant"""
+
+        rows = self._replay(paths, [5, 20, 40], False)
+        assert rows[5] == [(5, 1, "10.0.0.1", "1.2.0.0/16", (1, 5), 5, 1),
+                           (5, 2, "10.0.0.2", "1.2.0.0/16", (2, 5), 5, 2)]
+        assert rows[20] == [(20, 1, "10.0.0.1", "1.2.0.0/16", (1, 5), 5, 1),
+                            (20, 1, "10.0.0.1", "1.3.0.0/16", (1, 6), 6, 10)]
+        assert rows[40] == []
+
+    def test_diffs(self, paths):
+        """Diffs only have what changed, withdrawn routes have no path"""
+
+        rows = self._replay(paths, [15, 26, 100], True)
+        assert rows[15] == [(15, 1, "10.0.0.1", "1.3.0.0/16", (1, 6), 6, 10)]
+        assert rows[26] == [
+            (26, 1, "10.0.0.1", "1.2.0.0/16", (1, 7, 5), 5, 25),
+            (26, 2, "10.0.0.2", "1.2.0.0/16", None, None, None)]
+        assert rows[100] == [
+            (100, 1, "10.0.0.1", "1.2.0.0/16", None, None, None),
+            (100, 1, "10.0.0.1", "1.3.0.0/16", None, None, None)]
+
+    def test_paths_interned(self, tmp_path):
+        """Equal paths from different updates must be one object"""
+
+        builder = MRT_Builder()
+        for prefix in ["1.2.0.0/16", "1.3.0.0/16"]:
+            builder.add_update(self.peer_1, announced=[prefix],
+                               attrs=MRT_Builder.as_path((2, [1, 5])))
+        builder.write(str(tmp_path / "updates"))
+        engine = RIB_State_Engine()
+        list(engine.replay([str(tmp_path / "updates")], [1]))
+        rib = engine.ribs[self.peer_1]
+        assert rib["1.2.0.0/16"][0] is rib["1.3.0.0/16"][0]
+
+    def test_to_db(self, paths):
+        """Rows must be written to the rib snapshots table"""
+
+        RIB_State_Engine().to_db(paths[:1], paths[1:], [5, 20, 40])
+        with RIB_Snapshots_Table() as db:
+            assert db.get_count() == 4
+            sql = f"SELECT * FROM {db.name} WHERE instant = 20"
+            assert sorted(x["prefix"] for x in db.execute(sql)) ==\
+                ["1.2.0.0/16", "1.3.0.0/16"]
+            db.clear_table()
@@ -6,10 +6,13 @@
 For specifics on each test, see the docstrings under each function.
 """
 
+import re
+
 from psycopg2.errors import UndefinedTable
 import pytest
 
-from ..tables import MRT_Announcements_Table
+from ..tables import MRT_Announcements_Table, AS_Paths_Table
+from ..tables import Path_ID_Collision
 from .....utils.database import Generic_Table_Test
 
 __author__ = "Justin Furuness", "Matt Jaccino"
@@ -81,6 +84,40 @@ class Test_MRT_Announcements_Table(Generic_Table_Test):
             # Gets ride of test table
             db.clear_table()
 
+    def test_attach_staging_tables(self):
+        """Rows copied into staging tables must show up once attached"""
+
+        with MRT_Announcements_Table() as db:
+            db.create_partitioned_table()
+            for worker in [7, 8]:
+                table = db.create_staging_table(worker)
+                # Running it twice must be harmless
+                assert db.create_staging_table(worker) == table
+                db.execute(f"""INSERT INTO {table}(prefix, origin)
+                               VALUES ('1.2.3.0/24', {worker})""")
+            assert db.get_count() == 0
+            assert db.attach_staging_tables() == [f"{db.name}_7",
+                                                  f"{db.name}_8"]
+            rows = db.execute(f"SELECT origin, worker FROM {db.name}")
+            assert sorted((x["origin"], x["worker"]) for x in rows) ==\
+                [(7, 7), (8, 8)]
+            assert db.attach_staging_tables() == []
+            # Drops the partitions as well
+            db.clear_table()
+            assert db._get_staging_tables() == []
+            db._create_tables()
+
+    def test_restore_table(self):
+        """Staging tables are dropped and the table is unpartitioned"""
+
+        with MRT_Announcements_Table() as db:
+            db.create_partitioned_table()
+            db.create_staging_table(7)
+            db.restore_table()
+            assert db._get_staging_tables() == []
+            sql = "SELECT relkind FROM pg_class WHERE relname = %s"
+            assert db.execute(sql, [db.name]) == [{"relkind": "r"}]
+
     def _insert_fake_data(self, db):
         """Inserts one IPV4 and one IPV6 prefix into the MRT table"""
 
@@ -90,3 +127,47 @@ class Test_MRT_Announcements_Table(Generic_Table_Test):
                     VALUES ('2001:db8::/32')"""]
         for sql in _sqls:
             db.execute(sql)
+
+
+@pytest.mark.mrt_parser
+class Test_AS_Paths_Table(Generic_Table_Test):
+    """Tests all functions within the as paths class.
+
+    Inherits from the test_generic_table class, which will test
+    for table creation and dropping the table.
+    """
+
+    # Needed for inheritance
+    table_class = AS_Paths_Table
+
+    def test_get_path_id(self):
+        """Path ids must be stable, distinct, and fit in a BIGINT"""
+
+        paths = [(), (1,), (1, 2), (2, 1), (1, 2, 3), (4294967295,)]
+        ids = [AS_Paths_Table.get_path_id(x) for x in paths]
+        assert len(set(ids)) == len(paths)
+        assert ids == [AS_Paths_Table.get_path_id(x) for x in paths]
+        assert all(-2**63 <= x < 2**63 for x in ids)
+
+    def test_delete_duplicates(self):
+        """Paths written by several files must be left once"""
+
+        with AS_Paths_Table(clear=True) as db:
+            for _ in range(3):
+                db.execute(f"""INSERT INTO {db.name}(path_id, as_path)
+                               VALUES (1, '{{1, 2}}'), (2, '{{3}}')""")
+            db.delete_duplicates()
+            assert db.get_count() == 2
+            db.clear_table()
+
+    def test_delete_duplicates_collision(self):
+        """Different paths with the same path_id must raise"""
+
+        with AS_Paths_Table(clear=True) as db:
+            db.execute(f"""INSERT INTO {db.name}(path_id, as_path)
+                           VALUES (1, '{{1, 2}}'), (1, '{{3}}')""")
+            with pytest.raises(Path_ID_Collision,
+                               match=re.escape("path_id 1 has {1,2} and {3}")):
+                db.delete_duplicates()
+            assert db.get_count() == 2
+            db.clear_table()
@@ -20,13 +20,14 @@ import datetime
 import logging
 import os
 import warnings
-import requests
 from .detailed_mrt_file import Detailed_MRT_File
 from .mrt_installer import MRT_Installer
 from .mrt_sources import MRT_Sources
 from .mrt_types import MRT_Types
 from .mrt_parser import MRT_Parser
 from .detailed_tables import MRT_Detailed_Table
+from ..mrt_base.mrt_url_discovery import MRT_URL_Discovery
+from ..mrt_base.rib_state_engine import RIB_State_Engine
 from ..base_classes import Parser
 from ..utils import utils
 
@@ -61,7 +62,9 @@ class MRT_Detailed(MRT_Parser):
              bgpscanner=True,
              sources=MRT_Sources.__members__.values(),
              mrt_types=MRT_Types,
-             detailed=True):
+             detailed=True,
+             instants=None,
+             diffs=False):
              # TODO: Make typ enum, make param list of enums to get
              # Time fields in new table: interval_start, interval_end
              # might need to make new updates mrt_file in order to parse update info and get 
@@ -82,6 +85,11 @@ class MRT_Detailed(MRT_Parser):
         When detailed is set to true, all results will be stored in
         MRT_Detailed_Table, however if detailed is set to false results
         will be stored in the original MRT_Announcements_Table
+        If instants (epoch times) are given, files are not loaded one
+        by one. Instead the first RIBs are loaded in memory, the updates
+        are applied in time order, and the state at each instant (or
+        only what changed, if diffs) goes in RIB_Snapshots_Table. See
+        RIB_State_Engine.
         For further information, see the documentation in MRT_Parser
         and the README.
         """
@@ -102,6 +110,9 @@ class MRT_Detailed(MRT_Parser):
             logging.debug(f"Total files {len(urls)}")
             mrt_files = self._multiprocess_download(download_threads,
                                                     urls)
+            if instants:
+                self._replay_updates(mrt_files, instants, diffs, IPV4, IPV6)
+                return
             self._multiprocess_parse_dls(parse_threads,
                                          mrt_files,
                                          bgpscanner)
@@ -162,28 +173,33 @@ class MRT_Detailed(MRT_Parser):
         from Caida. However, as mentioned above, it does not use
         MRT_Sources, but rather MRT_Types to get source, type, and
         rate.
+        Every query (one per source, type, and subinterval) is made
+        once, and all of them are made concurrently. See
+        MRT_URL_Discovery.
         """
-        PARAMS = {'human': True}
-        URL = 'https://bgpstream.caida.org/broker/data'
-        urls = []
+        # One set of params and its subinterval per query
+        PARAMS_list = []
+        times = []
         # Now we run through MRT_Types.
         for source in mrt_types:
-            # Name of project, either routeviews or ris usually.
-            PARAMS["projects[]"] = [str(source.value[0])]
             for typ in source.value[1]:
-                # Type of the dump, either ribs or updates usually.
-                PARAMS['type'] = typ
-                times = self._get_subintervals(start,
-                                               end,
-                                               source.value[1][typ])
-                for time in times:
-                    # Iterate through the list of subintervals, get our
-                    # data.
-                    PARAMS['intervals'] = [f"{time[0]}, {time[1]}"]
+                for time in self._get_subintervals(start,
+                                                   end,
+                                                   source.value[1][typ]):
+                    # Name of project, either routeviews or ris usually.
+                    # Type of the dump, either ribs or updates usually.
+                    PARAMS = {'human': True,
+                              'projects[]': [str(source.value[0])],
+                              'type': typ,
+                              'intervals': [f"{time[0]}, {time[1]}"]}
                     PARAMS.update(PARAMS_modification)
-                    logging.debug(requests.get(url=URL, params=PARAMS).url)
-                    data = requests.get(url=URL, params=PARAMS).json()
-                    urls = urls + ([[x.get('url'), time[0], time[1]] for x in data.get('data').get('dumpFiles')])
+                    PARAMS_list.append(PARAMS)
+                    times.append(time)
+        urls = []
+        with MRT_URL_Discovery() as discovery:
+            for time, dump_files in zip(times,
+                                        discovery.get_dump_files(PARAMS_list)):
+                urls += [[x.get('url'), time[0], time[1]] for x in dump_files]
         return urls
 
     def _multiprocess_download(self, 
@@ -208,6 +224,29 @@ class MRT_Detailed(MRT_Parser):
                             f.num/5, progress_bar=True), mrt_files)
         return mrt_files
 
+    def _replay_updates(self,
+                        mrt_files: list,
+                        instants: list,
+                        diffs: bool = False,
+                        IPV4: bool = True,
+                        IPV6: bool = True):
+        """Writes the RIB state at each instant with RIB_State_Engine
+
+        The RIBs of the first subinterval (one per collector) are the
+        base, and every updates file from then on is applied to it.
+        """
+
+        ribs = [f for f in mrt_files if "updates" not in f.url]
+        base_start = min(f.start for f in ribs)
+        rib_paths = [f.path for f in ribs if f.start == base_start]
+        update_paths = [f.path for f in mrt_files
+                        if "updates" in f.url and f.start >= base_start]
+        RIB_State_Engine(IPV4, IPV6).to_db(rib_paths,
+                                           update_paths,
+                                           instants,
+                                           diffs)
+        utils.delete_paths([f.path for f in mrt_files])
+
     def _multiprocess_parse_dls(self,
                                 p_threads: int,
                                 mrt_files: list,
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Block_Packer
+
+The purpose of this class is to split prefixes into blocks for the
+extrapolator, which runs one block at a time. A block's run time goes
+with the number of announcements in it, so the run is as fast as the
+heaviest block allows. Blocks should have loads that are as even as
+possible, with no more than max_block_size prefixes in any of them.
+
+Blocks used to be made by first fit over a list of bins kept sorted
+with bisect.insort. Every prefix scanned the bins from the lightest
+until one had room, and then the bin was popped and reinserted. That
+is O(prefixes * blocks), and it's slow at millions of prefixes.
+
+Design choices:
+    -Longest processing time first (LPT): prefixes are sorted by
+     announcement count, heaviest first, and each one goes into the
+     block with the least load so far
+    -The blocks are a min heap keyed on (load, block_id), so each
+     prefix is one heapreplace. Full blocks are popped and never come
+     back, so there's no scanning for one with room. Keys are packed
+     into one int, since this loop is most of the time
+    -block_count defaults to the same number of blocks as before. A
+     larger block_count can be set to make blocks smaller and loads
+     more even. It must be able to hold every prefix
+    -Weights are sorted with numpy, and ties are broken by input order
+     and then block_id, so the blocks are the same from run to run
+    -Prefixes can be added to blocks that are already filled, by
+     starting from their loads, see Incremental_Metadata
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import heapq
+
+import numpy as np
+
+
+class Block_Packer:
+    """Packs weighted prefixes into blocks, heaviest into lightest.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["max_block_size", "block_count"]
+
+    def __init__(self, max_block_size: int = 400, block_count: int = None):
+        """Saves the constraints. block_count defaults in get_block_count"""
+
+        assert max_block_size > 0, "Blocks must hold at least one prefix"
+        self.max_block_size = max_block_size
+        self.block_count = block_count
+
+    def pack(self, weights, loads=None, sizes=None) -> np.ndarray:
+        """Returns the block_id of each weight, in the same order
+
+        Raises ValueError if block_count blocks can't hold them all.
+
+        loads and sizes are the weight and number of prefixes already
+        in each block, for adding prefixes to existing blocks. Then
+        there are as many blocks as loads, plus as many new ones as
+        are needed to fit the weights.
+        """
+
+        weights = np.asarray(weights, dtype=np.int64)
+        if loads is None:
+            block_count = self.get_block_count(len(weights))
+            loads = [0] * block_count
+            sizes = [0] * block_count
+        else:
+            loads, sizes = list(loads), list(sizes)
+            free = sum(max(self.max_block_size - x, 0) for x in sizes)
+            new_blocks = -(-max(len(weights) - free, 0)
+                           // self.max_block_size)
+            loads += [0] * new_blocks
+            sizes += [0] * new_blocks
+            block_count = len(loads)
+        # Heap keys are load << shift | block_id, since ints compare
+        # much faster than (load, block_id) tuples, and sort the same
+        shift = max(block_count - 1, 1).bit_length()
+        mask = (1 << shift) - 1
+        heap = [(load << shift) | block_id
+                for block_id, (load, size) in enumerate(zip(loads, sizes))
+                if size < self.max_block_size]
+        heapq.heapify(heap)
+        max_block_size = self.max_block_size
+        heapreplace = heapq.heapreplace
+        heappop = heapq.heappop
+        # Heaviest first, stable so that ties keep input order
+        order = np.argsort(-weights, kind="stable")
+        if len(weights) and int(weights.max()) >= 2**(62 - shift):
+            # Would overflow int64, so shift python ints instead
+            shifted = [x << shift for x in weights[order].tolist()]
+        else:
+            shifted = (weights[order] << shift).tolist()
+        # block_id of each weight, in order of weight
+        assigned = []
+        add = assigned.append
+        for weight in shifted:
+            key = heap[0]
+            block_id = key & mask
+            add(block_id)
+            sizes[block_id] += 1
+            if sizes[block_id] == max_block_size:
+                heappop(heap)
+            else:
+                heapreplace(heap, key + weight)
+        block_ids = np.empty(len(weights), dtype=np.int64)
+        block_ids[order] = assigned
+        return block_ids
+
+    def get_rows(self, prefix_counts: list) -> list:
+        """Returns [block_id, prefix] rows from [prefix, count] pairs"""
+
+        if not prefix_counts:
+            return []
+        prefixes, counts = zip(*prefix_counts)
+        return [[block_id, prefix] for block_id, prefix
+                in zip(self.pack(counts).tolist(), prefixes)]
+
+    def get_block_count(self, prefix_count: int) -> int:
+        """Returns block_count, or the default for the prefixes
+
+        The default of prefixes // max_block_size + 1 is the same as
+        the old first fit packer, so the extrapolator runs the same
+        number of blocks.
+        """
+
+        if self.block_count is None:
+            return prefix_count // self.max_block_size + 1
+        if self.block_count * self.max_block_size < prefix_count:
+            raise ValueError(f"{self.block_count} blocks of at most "
+                             f"{self.max_block_size} prefixes can't hold "
+                             f"{prefix_count} prefixes")
+        return self.block_count
+
+    @staticmethod
+    def get_loads(weights, block_ids) -> np.ndarray:
+        """Returns the total weight of each block"""
+
+        return np.bincount(block_ids, weights=weights).astype(np.int64)
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Incremental_Metadata
+
+The purpose of this class is to refresh the tables of
+MRT_Metadata_Parser without rebuilding them. A full run drops and
+refills every table and all of their indexes, even though from one
+day to the next only a small part of the distinct prefix origins are
+new or gone, and the ROAs barely change.
+
+Each stage records the inputs it consumed in mrt_metadata_inputs (see
+Metadata_Inputs_Table): the tables, or partitions, of
+mrt_announcements for the prefix origins, roas for the ROA validity,
+and mrt_announcements and as_paths for mrt_w_metadata. A stage whose
+inputs are the same as last time is skipped. Otherwise:
+
+    1. The distinct prefix origins are counted again. Prefix origins
+       that were seen before keep their prefix_id, origin_id and
+       prefix_origin_id, and new ones get the next unused ids
+    2. Prefix groups are found again with a Prefix_Trie. A group keeps
+       its id as long as its superprefix is the same
+    3. Only the new prefix origins are classified, unless the ROAs
+       changed, in which case all of them are
+    4. Prefixes stay in their block. New prefixes are packed into the
+       lightest blocks with room, or into new blocks if there is none
+    5. Each table is diffed against what it should now hold, and only
+       the rows that changed are deleted and inserted
+    6. If the announcements are the same as the ones mrt_w_metadata
+       was made from, only the announcements of prefix origins whose
+       metadata changed are updated. Otherwise it's rebuilt, since
+       every announcement is new
+
+Design choices:
+    -Every table is still read, which is a sequential scan of a few
+     million narrow rows. It's the deletes, inserts and index updates
+     that are proportional to the change, and these are what made a
+     full run slow
+    -Ids are no longer dense once prefix origins are removed, and
+     blocks drift away from the most even loads. A full run
+     (incremental=False) renumbers and repacks everything
+    -Rows are deleted by ctid, which is read along with the rows, so no
+     keys have to be copied into the database to be joined on. Nothing
+     else writes to these tables during a run
+    -The diffing is in python, like the rest of the metadata, so that
+     both runs give the same rows from the same inputs
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import logging
+
+import psycopg2.extensions
+
+from ..mrt_base.tables import MRT_Announcements_Table, AS_Paths_Table
+from ...roas.rov_classifier import ROV_Classifier
+from ...roas.tables import ROAs_Table
+from .block_packer import Block_Packer
+from .prefix_trie import Prefix_Trie
+from .tables import _copy_rows
+from .tables import Distinct_Prefix_Origins_W_IDs_Table
+from .tables import Prefix_Groups_Table
+from .tables import Prefix_IDs_Table
+from .tables import Blocks_Table
+from .tables import ROA_Validity_Table
+from .tables import Prefix_Origin_Blocks_Metadata_Table
+from .tables import Prefix_Origin_Metadata_Table
+from .tables import Metadata_Inputs_Table
+from .tables import MRT_W_Metadata_Table
+
+
+class Incremental_Metadata:
+    """Updates the metadata tables with only what changed.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["max_block_size", "binary"]
+
+    # stage: the tables it reads
+    stage_inputs = {"prefix_origins": [MRT_Announcements_Table.name],
+                    "roa_validity": [ROAs_Table.name],
+                    "mrt_w_metadata": [MRT_Announcements_Table.name,
+                                       AS_Paths_Table.name]}
+
+    # Most ctids in one DELETE
+    _delete_chunk_size = 100000
+
+    def __init__(self, max_block_size: int = 400, binary: bool = False):
+        """Saves the block size for new blocks, and the COPY format"""
+
+        self.max_block_size = max_block_size
+        self.binary = binary
+
+    @classmethod
+    def record_inputs(cls, stages=None):
+        """Records the current inputs of stages, by default all of them"""
+
+        with Metadata_Inputs_Table() as db:
+            for stage in stages or cls.stage_inputs:
+                db.set_inputs(stage,
+                              db.get_table_inputs(*cls.stage_inputs[stage]))
+
+    @staticmethod
+    def clear_inputs():
+        """Forgets all inputs, so a failed full run isn't built on"""
+
+        with Metadata_Inputs_Table(clear=True):
+            pass
+
+    def can_run(self) -> bool:
+        """Returns True if a full run recorded the inputs of every stage"""
+
+        with Metadata_Inputs_Table() as db:
+            return all(db.get_inputs(x) for x in self.stage_inputs)
+
+    def run(self) -> bool:
+        """Updates every table in place, see the top of the module
+
+        Returns False if mrt_w_metadata must be rebuilt, since the
+        announcements are not the ones it was made from.
+        """
+
+        changed = self.update_prefix_origins()
+        with Metadata_Inputs_Table() as db:
+            old_inputs = db.get_inputs("mrt_w_metadata")
+            inputs = db.get_table_inputs(*self.stage_inputs["mrt_w_metadata"])
+        if old_inputs != inputs:
+            return False
+        self._update_mrt_w_metadata(changed)
+        self.record_inputs(["mrt_w_metadata"])
+        return True
+
+    def update_prefix_origins(self) -> dict:
+        """Updates every table up to prefix_origin_metadata
+
+        Returns {(prefix, origin): row} of the rows that were inserted
+        into prefix_origin_metadata.
+        """
+
+        with Metadata_Inputs_Table() as db:
+            new_announcements = (
+                db.get_inputs("prefix_origins")
+                != db.get_table_inputs(*self.stage_inputs["prefix_origins"]))
+            new_roas = (
+                db.get_inputs("roa_validity")
+                != db.get_table_inputs(*self.stage_inputs["roa_validity"]))
+        if not new_announcements and not new_roas:
+            logging.info("Announcements and ROAs are unchanged")
+            return {}
+
+        w_ids = self._get_rows(Distinct_Prefix_Origins_W_IDs_Table, [0, 1])
+        if new_announcements:
+            with Distinct_Prefix_Origins_W_IDs_Table() as db:
+                counts = {(prefix, origin): count
+                          for prefix, origin, count in db.get_counts()}
+        else:
+            counts = {key: row[6] for key, (_, row) in w_ids.items()}
+        ids = self.extend_ids(counts,
+                              {key: row[2:5] for key, (_, row)
+                               in w_ids.items()})
+
+        prefix_groups = self._get_rows(Prefix_Groups_Table, [0])
+        groups = self.get_groups(
+            {prefix for prefix, _ in counts},
+            {row[2]: row[1] for _, row in prefix_groups.values()
+             if row[3] == 0})
+        self._sync(Distinct_Prefix_Origins_W_IDs_Table,
+                   w_ids,
+                   {key: (*key, *ids[key], groups[key[0]][0], count)
+                    for key, count in counts.items()})
+        self._sync(Prefix_Groups_Table,
+                   prefix_groups,
+                   {(prefix,): (prefix, *group)
+                    for prefix, group in groups.items()})
+
+        # prefix: [prefix_id, ann_count]
+        prefixes = {}
+        for key, count in counts.items():
+            prefixes.setdefault(key[0], [ids[key][0], 0])[1] += count
+        self._sync(Prefix_IDs_Table,
+                   self._get_rows(Prefix_IDs_Table, [0]),
+                   {(prefix,): (prefix, count, prefix_id)
+                    for prefix, (prefix_id, count) in prefixes.items()})
+
+        roa_validity = self._get_rows(ROA_Validity_Table, [0, 1])
+        validity = self.get_validity(counts,
+                                     ({} if new_roas else
+                                      {key: row[2] for key, (_, row)
+                                       in roa_validity.items()}))
+        self._sync(ROA_Validity_Table,
+                   roa_validity,
+                   {key: (*key, value) for key, value in validity.items()})
+
+        old_blocks = self._get_rows(Blocks_Table, [1])
+        blocks = self.extend_blocks(
+            {prefix: count for prefix, (_, count) in prefixes.items()},
+            {key[0]: row[0] for key, (_, row) in old_blocks.items()},
+            Block_Packer(self.max_block_size))
+        self._sync(Blocks_Table,
+                   old_blocks,
+                   {(prefix,): (block_id, prefix)
+                    for prefix, block_id in blocks.items()})
+
+        block_prefix_ids = self.get_block_prefix_ids(blocks)
+        rows = {key: (*key, *ids[key], blocks[key[0]], validity[key])
+                for key in counts}
+        self._sync(Prefix_Origin_Blocks_Metadata_Table,
+                   self._get_rows(Prefix_Origin_Blocks_Metadata_Table, [0, 1]),
+                   rows)
+        rows = {key: (*row, block_prefix_ids[key[0]])
+                for key, row in rows.items()}
+        inserted = self._sync(Prefix_Origin_Metadata_Table,
+                              self._get_rows(Prefix_Origin_Metadata_Table,
+                                             [0, 1]),
+                              rows)
+        self.record_inputs(["prefix_origins", "roa_validity"])
+        return inserted
+
+    @staticmethod
+    def extend_ids(counts, old_ids: dict) -> dict:
+        """Returns {(prefix, origin): (prefix_id, origin_id, p_o_id)}
+
+        Prefix origins in old_ids keep their ids. A new prefix origin
+        gets its prefix's or origin's id if either was seen before, and
+        the next unused ids otherwise.
+        """
+
+        # prefix: prefix_id, origin: origin_id
+        prefix_ids = {}
+        origin_ids = {}
+        next_ids = [0, 0, 0]
+        ids = {}
+        for key, old in old_ids.items():
+            if key in counts:
+                prefix_ids[key[0]] = old[0]
+                origin_ids[key[1]] = old[1]
+                ids[key] = tuple(old)
+            # Removed ids aren't reused, so no id means two things
+            next_ids = [max(x, y + 1) for x, y in zip(next_ids, old)]
+        for key in counts:
+            if key in ids:
+                continue
+            prefix, origin = key
+            if prefix not in prefix_ids:
+                prefix_ids[prefix] = next_ids[0]
+                next_ids[0] += 1
+            if origin not in origin_ids:
+                origin_ids[origin] = next_ids[1]
+                next_ids[1] += 1
+            ids[key] = (prefix_ids[prefix], origin_ids[origin], next_ids[2])
+            next_ids[2] += 1
+        return ids
+
+    @staticmethod
+    def get_groups(prefixes, old_group_ids: dict) -> dict:
+        """Returns {prefix: (prefix_group_id, superprefix, depth)}
+
+        old_group_ids is {superprefix: prefix_group_id}. A group keeps
+        its id if its superprefix had one, and gets the next unused id
+        otherwise.
+        """
+
+        next_id = max(old_group_ids.values(), default=-1) + 1
+        # prefix_group_id from the walk: kept or new prefix_group_id
+        group_ids = {}
+        groups = {}
+        for prefix, walk_id, superprefix, depth in Prefix_Trie(
+                prefixes).walk():
+            if walk_id not in group_ids:
+                group_id = old_group_ids.get(superprefix)
+                if group_id is None:
+                    group_id = next_id
+                    next_id += 1
+                group_ids[walk_id] = group_id
+            groups[prefix] = (group_ids[walk_id], superprefix, depth)
+        return groups
+
+    @staticmethod
+    def get_validity(keys, old_validity: dict) -> dict:
+        """Returns {(prefix, origin): roa_validity}
+
+        Only the prefix origins not in old_validity are classified, so
+        the ROAs are only loaded if any of them are new.
+        """
+
+        validity = {key: old_validity[key] for key in keys
+                    if key in old_validity}
+        new = [key for key in keys if key not in validity]
+        if new:
+            logging.info(f"Classifying {len(new)} prefix origins")
+            classify = ROV_Classifier.from_db().classify
+            for prefix, origin in new:
+                validity[(prefix, origin)] = classify(prefix, origin)
+        return validity
+
+    @staticmethod
+    def extend_blocks(prefix_counts: dict, old_blocks: dict,
+                      packer: Block_Packer) -> dict:
+        """Returns {prefix: block_id}
+
+        Prefixes in old_blocks stay in their block, and the rest are
+        packed into the lightest blocks with room, see Block_Packer.
+        """
+
+        blocks = {prefix: block_id for prefix, block_id in old_blocks.items()
+                  if prefix in prefix_counts}
+        block_count = max(old_blocks.values(), default=-1) + 1
+        loads = [0] * block_count
+        sizes = [0] * block_count
+        for prefix, block_id in blocks.items():
+            loads[block_id] += prefix_counts[prefix]
+            sizes[block_id] += 1
+        new = [prefix for prefix in prefix_counts if prefix not in blocks]
+        if new:
+            block_ids = packer.pack([prefix_counts[x] for x in new],
+                                    loads,
+                                    sizes)
+            blocks.update(zip(new, block_ids.tolist()))
+        return blocks
+
+    @staticmethod
+    def get_block_prefix_ids(blocks: dict) -> dict:
+        """Returns {prefix: block_prefix_id} from {prefix: block_id}
+
+        The same as DENSE_RANK() OVER (PARTITION BY block_id ORDER BY
+        prefix) - 1, which is how a full run numbers them.
+        """
+
+        # block_id: prefixes
+        prefixes = {}
+        for prefix, block_id in blocks.items():
+            prefixes.setdefault(block_id, []).append(prefix)
+        block_prefix_ids = {}
+        for block in prefixes.values():
+            block.sort(key=Prefix_Trie.get_key)
+            block_prefix_ids.update((x, i) for i, x in enumerate(block))
+        return block_prefix_ids
+
+    @staticmethod
+    def diff(old: dict, new: dict) -> tuple:
+        """Returns (keys to delete, keys to insert) to make old into new
+
+        A row that changed is deleted and inserted again.
+        """
+
+        deletes = [key for key, row in old.items() if new.get(key) != row]
+        inserts = [key for key, row in new.items() if old.get(key) != row]
+        return deletes, inserts
+
+########################
+### Helper Functions ###
+########################
+
+    def _get_rows(self, Table, key_columns: list) -> dict:
+        """Returns {key: (ctid, row)} of every row in Table
+
+        The key is the row's values at the indexes in key_columns.
+        """
+
+        with Table() as db:
+            sql = f"SELECT ctid, {', '.join(Table.columns)} FROM {db.name};"
+            # Tuples, since a dict per row is much slower
+            with db.conn.cursor(
+                    cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute(sql)
+                return {tuple(row[i + 1] for i in key_columns):
+                        (row[0], row[1:]) for row in cursor}
+
+    def _sync(self, Table, old: dict, new: dict) -> dict:
+        """Makes Table hold the rows of new, returns the inserted rows
+
+        old is {key: (ctid, row)} from _get_rows, new is {key: row}.
+        Inserted rows are returned as {key: row}.
+        """
+
+        deletes, inserts = self.diff({key: row for key, (_, row)
+                                      in old.items()}, new)
+        inserts = {key: new[key] for key in inserts}
+        logging.info(f"{Table.name}: deleting {len(deletes)} rows, "
+                     f"inserting {len(inserts)}")
+        ctids = [old[key][0] for key in deletes]
+        with Table() as db:
+            for i in range(0, len(ctids), self._delete_chunk_size):
+                sql = f"DELETE FROM {db.name} WHERE ctid = ANY(%s::TID[]);"
+                db.execute(sql, [ctids[i: i + self._delete_chunk_size]])
+        if inserts:
+            _copy_rows(Table, inserts.values(), self.binary)
+        return inserts
+
+    def _update_mrt_w_metadata(self, rows: dict):
+        """Updates the announcements of the prefix origin metadata rows
+
+        The announcements are the same, so no prefix origin was added
+        or removed, only their metadata changed.
+        """
+
+        logging.info(f"Updating {len(rows)} prefix origins in "
+                     f"{MRT_W_Metadata_Table.name}")
+        if not rows:
+            return
+        with MRT_W_Metadata_Table() as db:
+            table = f"{db.name}_changed"
+            db.execute(f"DROP TABLE IF EXISTS {table}")
+            db.execute(f"""CREATE UNLOGGED TABLE {table} AS
+                        SELECT * FROM {Prefix_Origin_Metadata_Table.name}
+                        LIMIT 0;""")
+            _copy_rows(Prefix_Origin_Metadata_Table,
+                       rows.values(),
+                       self.binary,
+                       table=table)
+            columns = [x for x in Prefix_Origin_Metadata_Table.columns
+                       if x not in ["prefix", "origin"]]
+            db.execute(f"""UPDATE {db.name} m
+                        SET {', '.join(f'{x} = c.{x}' for x in columns)}
+                        FROM {table} c
+                        WHERE m.prefix = c.prefix AND m.origin = c.origin;""")
+            db.execute(f"DROP TABLE {table}")
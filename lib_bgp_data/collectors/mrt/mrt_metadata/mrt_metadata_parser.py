@@ -16,7 +16,6 @@ __maintainer__ = "Justin Furuness"
 __email__ = "jfuruness@gmail.com"
 __status__ = "Production"
 
-import bisect
 import datetime
 import logging
 import os
@@ -30,19 +29,19 @@ from ...roas.tables import ROAs_Table
 from ..mrt_base.mrt_file import MRT_File
 from ..mrt_base.mrt_installer import MRT_Installer
 from ..mrt_base.mrt_sources import MRT_Sources
-from ..mrt_base.tables import MRT_Announcements_Table
-from .tables import Distinct_Prefix_Origins_Table
-from .tables import Prefix_IDs_Table
-from .tables import Origin_IDs_Table
-from .tables import Prefix_Origin_IDs_Table
+from ..mrt_base.tables import MRT_Announcements_Table, AS_Paths_Table
+from .block_packer import Block_Packer
+from .incremental_metadata import Incremental_Metadata
 from .tables import Distinct_Prefix_Origins_W_IDs_Table
+from .tables import Prefix_Groups_Table
+from .tables import Prefix_IDs_Table
 from .tables import Blocks_Table
-from .tables import ROA_Known_Validity_Table
 from .tables import ROA_Validity_Table
 from .tables import Prefix_Origin_Blocks_Metadata_Table
 from .tables import Prefix_Origin_Metadata_Table
 from .tables import MRT_W_Metadata_Table
 from ....utils import utils
+from ....utils.database import SQL_Pipeline
 
 
 class MRT_Metadata_Parser(Parser):
@@ -53,7 +52,12 @@ class MRT_Metadata_Parser(Parser):
 
     __slots__ = []
 
-    def _run(self, *args, max_block_size=400):
+    def _run(self,
+             *args,
+             max_block_size=400,
+             binary_copy=False,
+             block_count=None,
+             incremental=False):
         """Adds metadata to MRT files and prepares for EXR insertion
 
         1. Adds ROA state
@@ -67,29 +71,35 @@ class MRT_Metadata_Parser(Parser):
                                  instead of a hashmap (inside extrapolator))
         6. JK, add as many indexes as you can think of. Used in Forecast,
             verification, Full path, etc, so just add them all.
+
+        binary_copy inserts the prefix origin ids, ROA validity, and the
+        blocks with binary COPY, instead of text and a csv
+
+        block_count is the number of blocks to pack prefixes into, by
+        default prefixes // max_block_size + 1. More blocks make
+        smaller blocks with more even loads
+
+        If incremental, and a full run was done before, only the prefix
+        origins that were added or removed since are processed, and the
+        tables are updated in place, see Incremental_Metadata. New
+        blocks are then at most max_block_size, and block_count is
+        only used by full runs
         """
 
         self._validate()
-        self._add_prefix_origin_index()
-        logging.info(f"Creating {Distinct_Prefix_Origins_Table.name}")
-        self._get_p_o_table_w_indexes(Distinct_Prefix_Origins_Table)
-        # If you were a real cool cat, you would have done a compressed
-        # trie, finding common ancestors, to get prefix groupings
-        # def way faster than all this. Also more difficult.
-        for Table in [Origin_IDs_Table,
-                      Prefix_IDs_Table,
-                      Prefix_Origin_IDs_Table,
-                      Distinct_Prefix_Origins_W_IDs_Table]:
-            logging.info(f"Creating {Table.__name__}")
-            self._get_p_o_table_w_indexes(Table)
-        self._create_block_table(max_block_size)
-        self._add_roas_index()
-        for Table in [ROA_Known_Validity_Table,
-                      ROA_Validity_Table,
-                      Prefix_Origin_Blocks_Metadata_Table,
-                      Prefix_Origin_Metadata_Table]:
-            self._get_p_o_table_w_indexes(Table)
-        self._add_metadata()
+        incremental_metadata = Incremental_Metadata(max_block_size,
+                                                    binary_copy)
+        if incremental and incremental_metadata.can_run():
+            logging.info("Updating the metadata incrementally")
+            self._add_prefix_origin_index()
+            if not incremental_metadata.run():
+                self._add_metadata()
+                Incremental_Metadata.record_inputs(["mrt_w_metadata"])
+            return
+        # So that a failed run is never updated incrementally
+        Incremental_Metadata.clear_inputs()
+        self._get_pipeline(max_block_size, binary_copy, block_count).run()
+        Incremental_Metadata.record_inputs()
 
     def _validate(self):
         """Asserts that tables are filled"""
@@ -100,116 +110,168 @@ class MRT_Metadata_Parser(Parser):
                 sql = f"SELECT * FROM {db.name} LIMIT 2"
                 assert len(db.execute(sql)) > 0, err
 
+    def _get_pipeline(self,
+                      max_block_size,
+                      binary_copy=False,
+                      block_count=None) -> SQL_Pipeline:
+        """Returns the steps of a full run, see SQL_Pipeline
+
+        Each table waits for the tables it's made from, and the joins
+        wait for the indexes on the tables they join. The indexes on a
+        table, and the tables made from the same table (prefix_ids and
+        roa_validity), are built at the same time.
+        """
+
+        pipeline = SQL_Pipeline("mrt_metadata")
+        mrt = MRT_Announcements_Table.name
+        mrt_indexes = self._add_index_steps(
+            pipeline, mrt, self._get_prefix_origin_index_sqls())
+
+        # Prefix groups are found with a compressed trie here as well
+        w_ids = Distinct_Prefix_Origins_W_IDs_Table
+        pipeline.add(w_ids.name,
+                     func=lambda db: self._fill_table(w_ids,
+                                                      binary=binary_copy),
+                     inputs=[mrt],
+                     outputs=[w_ids.name, Prefix_Groups_Table.name])
+        w_ids_indexes = self._add_index_steps(
+            pipeline, w_ids.name, self._get_p_o_index_sqls(w_ids))
+
+        pipeline.add(Prefix_IDs_Table.name,
+                     func=lambda db: self._fill_table(Prefix_IDs_Table),
+                     inputs=[w_ids.name],
+                     outputs=[Prefix_IDs_Table.name])
+        pipeline.add(Blocks_Table.name,
+                     func=lambda db: self._create_block_table(max_block_size,
+                                                              binary_copy,
+                                                              block_count),
+                     inputs=[Prefix_IDs_Table.name],
+                     outputs=[Blocks_Table.name])
+        block_indexes = self._add_index_steps(
+            pipeline, Blocks_Table.name, self._get_block_index_sqls())
+
+        # Classified in process, see ROV_Classifier
+        pipeline.add(ROA_Validity_Table.name,
+                     func=lambda db: self._fill_table(ROA_Validity_Table,
+                                                      binary=binary_copy),
+                     inputs=[w_ids.name, ROAs_Table.name],
+                     outputs=[ROA_Validity_Table.name])
+        roa_indexes = self._add_index_steps(
+            pipeline,
+            ROA_Validity_Table.name,
+            self._get_p_o_index_sqls(ROA_Validity_Table))
+
+        inputs = [w_ids.name, Blocks_Table.name, ROA_Validity_Table.name,
+                  *w_ids_indexes, *block_indexes, *roa_indexes]
+        for Table in [Prefix_Origin_Blocks_Metadata_Table,
+                      Prefix_Origin_Metadata_Table]:
+            pipeline.add(Table.name,
+                         func=lambda db, Table=Table: self._fill_table(Table),
+                         inputs=inputs,
+                         outputs=[Table.name])
+            inputs = [Table.name, *self._add_index_steps(
+                pipeline, Table.name, self._get_p_o_index_sqls(Table))]
+
+        pipeline.add(MRT_W_Metadata_Table.name,
+                     func=lambda db: self._add_metadata(),
+                     inputs=[mrt, AS_Paths_Table.name, *mrt_indexes, *inputs],
+                     outputs=[MRT_W_Metadata_Table.name,
+                              f"{MRT_W_Metadata_Table.name}_expanded"])
+        return pipeline
+
     def _add_prefix_origin_index(self):
         """Adds index to prefix and origin for combining with ROAs table"""
 
         with MRT_Announcements_Table() as db:
-            sql = f"""CREATE INDEX IF NOT EXISTS {db.name}_po_index ON
-                  {db.name} USING GIST(prefix inet_ops, origin)"""
-            self._create_index(sql, db)
-            sql = f"""CREATE INDEX IF NOT EXISTS {db.name}_po_btree_i ON
-                    {db.name}(prefix inet_ops, origin);"""
-            self._create_index(sql, db)
+            for sql in self._get_prefix_origin_index_sqls().values():
+                self._create_index(sql, db)
 
-    def _get_p_o_table_w_indexes(self, Table):
-        """Prefix origin table with indexes"""
+    def _get_prefix_origin_index_sqls(self) -> dict:
+        """Returns {index name: sql} of the mrt_announcements indexes"""
 
-        with Table(clear=True) as db:
-            db.fill_table()
-            index_sqls = [
-                  f"""CREATE INDEX IF NOT EXISTS {db.name}_dpo_index
-                  ON {db.name} USING GIST(prefix inet_ops, origin)""",
-
-                  f"""CREATE INDEX IF NOT EXISTS {db.name}_dist_p_index
-                  ON {db.name} USING GIST(prefix inet_ops)""",
-
-                  f"""CREATE INDEX IF NOT EXISTS {db.name}_dist_o_index
-                  ON {db.name}(origin)""",
-
-                  f"""CREATE INDEX IF NOT EXISTS {db.name}_g_index
-                      ON {db.name}(prefix_group_id);""",
-                  f"""CREATE INDEX IF NOT EXISTS {db.name}_pbtree_index
-                      ON {db.name}(prefix)""",
-                  f"""CREATE INDEX IF NOT EXISTS {db.name}_po_btree_index
-                     ON {db.name}(prefix, origin);"""
-            ]
-            for sql in index_sqls:
-                try:
-                    self._create_index(sql, db)
-                except psycopg2.errors.UndefinedColumn:
-                    pass
-
-    def _create_block_table(self, max_block_size):
-        """Creates iteration blocks as balanced as possible
+        name = MRT_Announcements_Table.name
+        return {f"{name}_po_index":
+                f"""CREATE INDEX IF NOT EXISTS {name}_po_index ON
+                  {name} USING GIST(prefix inet_ops, origin)""",
+                f"{name}_po_btree_i":
+                f"""CREATE INDEX IF NOT EXISTS {name}_po_btree_i ON
+                    {name}(prefix inet_ops, origin);"""}
 
-        Based on prefix, total # ann for that prefix
-        Needed to write a custom algo for this
-        but it's fine, since binpacking is already np hard
-        Figures out first correct number of bins, since prefixes
-        are most important
-        Then figures out which bin to place in
-        Largest ann_count first into smallest bin_weight
+    def _get_p_o_index_sqls(self, Table) -> dict:
+        """Returns {index name: sql} of a prefix origin table's indexes
+
+        The prefix_group_id index is only made if Table has the column
         """
 
-        class Bin:
-            def __init__(self, bin_id):
-                self.bin_id = bin_id
-                self.prefixes = []
-                self.total_weight = 0
+        name = Table.name
+        index_sqls = {
+            f"{name}_dpo_index": f"""CREATE INDEX IF NOT EXISTS {name}_dpo_index
+                  ON {name} USING GIST(prefix inet_ops, origin)""",
+
+            f"{name}_dist_p_index": f"""CREATE INDEX IF NOT EXISTS
+                  {name}_dist_p_index ON {name} USING GIST(prefix inet_ops)""",
+
+            f"{name}_dist_o_index": f"""CREATE INDEX IF NOT EXISTS
+                  {name}_dist_o_index ON {name}(origin)""",
+
+            f"{name}_g_index": f"""CREATE INDEX IF NOT EXISTS {name}_g_index
+                      ON {name}(prefix_group_id);""",
+            f"{name}_pbtree_index": f"""CREATE INDEX IF NOT EXISTS
+                      {name}_pbtree_index ON {name}(prefix)""",
+            f"{name}_po_btree_index": f"""CREATE INDEX IF NOT EXISTS
+                     {name}_po_btree_index ON {name}(prefix, origin);"""
+        }
+        if "prefix_group_id" not in Table.columns:
+            del index_sqls[f"{name}_g_index"]
+        return index_sqls
+
+    def _get_block_index_sqls(self) -> dict:
+        """Returns {index name: sql} of the blocks indexes"""
+
+        return {f"{Blocks_Table.name}_{_id}":
+                f"""CREATE INDEX IF NOT EXISTS
+                        {Blocks_Table.name}_{_id}
+                            ON {Blocks_Table.name}({_id})
+                      ;"""
+                for _id in ["block_id", "prefix"]}
+
+    def _add_index_steps(self, pipeline, table: str, index_sqls: dict) -> list:
+        """Adds a step per index on table, returns the index names"""
+
+        for index, sql in index_sqls.items():
+            pipeline.add(index, sql=sql, inputs=[table], outputs=[index])
+        return list(index_sqls)
+
+    def _fill_table(self, Table, **fill_kwargs):
+        """Recreates and fills Table, fill_kwargs go to its fill_table"""
 
-            def add_prefix(self, prefix, ann_count):
-                if len(self.prefixes) + 1 <= max_block_size:
-                    self.prefixes.append(prefix)
-                    self.total_weight += ann_count
-                    return True
-                else:
-                    return False
+        logging.info(f"Creating {Table.name}")
+        with Table(clear=True) as db:
+            db.fill_table(**fill_kwargs)
 
-            def __lt__(self, other):
-                if isinstance(other, self.__class__):
-                    return self.total_weight < other.total_weight
+    def _create_block_table(self,
+                            max_block_size,
+                            binary_copy=False,
+                            block_count=None):
+        """Creates iteration blocks as balanced as possible
 
-            @property
-            def rows(self):
-                return [[self.bin_id, x] for x in self.prefixes]
+        Based on prefix, total # ann for that prefix. Prefixes are
+        packed heaviest first into the lightest block with room, see
+        Block_Packer. block_count defaults to
+        prefixes // max_block_size + 1.
+        """
 
         logging.info("Getting prefix blocks")
         with Prefix_IDs_Table() as db:
             group_counts = [[x["prefix"], x["ann_count"]]
                             for x in db.get_all()]
-            group_counts = sorted(group_counts, key=lambda x: x[1], reverse=True)
-            bin_count = (len(group_counts) // max_block_size) + 1
-            bins = list(sorted([Bin(i) for i in range(bin_count)]))
-            # tbh, is this the same as just doing it in order?
-            # Should check this...
-            for i, (prefix, ann_count) in enumerate(group_counts):
-                for b_index, b in enumerate(bins):
-                    if b.add_prefix(prefix, ann_count):
-                        current_index = b_index
-                        break
-                # Inserts item in sorted list correctly
-                # MUCH faster than sort
-                # https://stackoverflow.com/a/38346428/8903959
-                bisect.insort_left(bins, bins.pop(b_index))
-            block_table_rows = []
-            for current_bin in bins:
-                block_table_rows.extend(current_bin.rows)
-            csv_path = os.path.join(self.csv_dir, "block_table.csv")
-            utils.rows_to_db(block_table_rows, csv_path, Blocks_Table)
-            for _id in ["block_id", "prefix"]:
-                sql = f"""CREATE INDEX IF NOT EXISTS
-                        {Blocks_Table.name}_{_id}
-                            ON {Blocks_Table.name}({_id})
-                      ;"""
-                self._create_index(sql, db)
-
-    def _add_roas_index(self):
-        """Creates an index on the roas table"""
-
-        with ROAs_Table() as db: 
-            sql = f"""CREATE INDEX IF NOT EXISTS roas_index
-                  ON {db.name} USING GIST(prefix inet_ops, asn);"""
-            self._create_index(sql, db)
+        block_table_rows = Block_Packer(max_block_size,
+                                        block_count).get_rows(group_counts)
+        csv_path = os.path.join(self.csv_dir, "block_table.csv")
+        utils.rows_to_db(block_table_rows,
+                         csv_path,
+                         Blocks_Table,
+                         binary=binary_copy)
 
     def _add_metadata(self):
         """Joins prefix origin metadata with MRT Anns"""
@@ -222,6 +284,8 @@ class MRT_Metadata_Parser(Parser):
             self._create_index(sql, db)
             # NOTE: you probably need other indexes on this table
             # Depending on what application is being run
+            # If paths were encoded, the extrapolator reads this instead
+            db.create_expanded_view()
 
     def _create_index(self, sql, db):
         logging.info(f"Creating index on {db.name}")
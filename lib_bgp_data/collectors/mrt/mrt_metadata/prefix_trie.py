@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Prefix_Trie
+
+The purpose of this class is to group prefixes by the top level prefix
+that covers them. Every prefix that is not covered by any other prefix
+(a superprefix) starts a group, and every prefix under it is in its
+group. The depth of a prefix is how many prefixes cover it.
+
+This used to be done with self joins on << and >> (Superprefixes,
+Superprefix_Groups, Unknown_Prefixes, then Prefix_Groups), which need
+GIST indexes and get slower much faster than the number of prefixes.
+
+Instead prefixes are put in a path compressed binary trie, and it's
+walked once depth first. In a path compressed trie every node is a
+prefix or a branch, so the walk visits each prefix once and keeps its
+covering prefixes on a stack.
+
+Design choices:
+    -The trie is never built out of nodes. Sorting prefixes by
+     (family, address, length) is the order of a depth first walk of
+     the compressed trie, so the walk is a sort and then a stack. This
+     takes far less memory than a python object per node
+    -A prefix covers the next one iff the next address is before the
+     end of its range, since two prefixes either nest or don't overlap
+    -Group ids are given in walk order, so the same prefixes always
+     get the same ids, and groups are contiguous ranges of addresses
+    -Host bits of a prefix are ignored, just like the cidr type
+    -Prefixes that are already sorted, such as rows streamed with
+     ORDER BY on a cidr column, can be walked with walk_sorted without
+     being held in memory
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from socket import inet_pton, AF_INET, AF_INET6
+
+
+class Prefix_Trie:
+    """Groups prefixes under their top level covering prefix.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["_prefixes"]
+
+    def __init__(self, prefixes=()):
+        """Adds prefixes, duplicates are only kept once"""
+
+        # (ipv6, network, prefix length, prefix)
+        self._prefixes = set()
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def __len__(self):
+        return len(self._prefixes)
+
+    def add(self, prefix: str):
+        """Adds a prefix, such as 1.2.0.0/16"""
+
+        self._prefixes.add((*self.get_key(prefix), str(prefix)))
+
+    @staticmethod
+    def get_key(prefix: str) -> tuple:
+        """Returns (ipv6, network, prefix length) of a prefix
+
+        Sorting by this is the same as ORDER BY on a cidr column.
+        """
+
+        addr, prefix_len = str(prefix).split("/")
+        prefix_len = int(prefix_len)
+        ipv6 = ":" in addr
+        if ipv6:
+            bits = 128
+            addr = int.from_bytes(inet_pton(AF_INET6, addr), "big")
+        else:
+            bits = 32
+            addr = int.from_bytes(inet_pton(AF_INET, addr), "big")
+        # Drops host bits, so equal networks are equal
+        network = addr >> (bits - prefix_len) << (bits - prefix_len)
+        return ipv6, network, prefix_len
+
+    def walk(self):
+        """Yields (prefix, prefix_group_id, superprefix, depth)
+
+        superprefix is the top level prefix of the group, which is
+        the prefix itself (at depth 0) if nothing covers it.
+        """
+
+        for prefix, _, *group in self._walk((*x, None)
+                                            for x in sorted(self._prefixes)):
+            yield (prefix, *group)
+
+    @classmethod
+    def walk_sorted(cls, items):
+        """Same as walk, for (prefix, item) already in cidr order
+
+        Yields (prefix, item, prefix_group_id, superprefix, depth).
+        Prefixes must be distinct, and are checked to be in order.
+        """
+
+        def keyed():
+            last = None
+            for prefix, item in items:
+                key = cls.get_key(prefix)
+                assert last is None or key > last, f"{prefix} out of order"
+                last = key
+                yield (*key, str(prefix), item)
+
+        return cls._walk(keyed())
+
+    def get_groups(self) -> dict:
+        """Returns {prefix: (prefix_group_id, superprefix, depth)}"""
+
+        return {prefix: (group_id, superprefix, depth)
+                for prefix, group_id, superprefix, depth in self.walk()}
+
+########################
+### Helper Functions ###
+########################
+
+    @staticmethod
+    def _walk(keyed):
+        """Walks sorted (ipv6, network, prefix length, prefix, item)
+
+        Yields (prefix, item, prefix_group_id, superprefix, depth).
+        """
+
+        group_id = -1
+        # (ipv6, end of range, prefix) of covering prefixes, outermost first
+        stack = []
+        for ipv6, network, prefix_len, prefix, item in keyed:
+            # Drop the prefixes on the stack that don't cover this one
+            while stack and (stack[-1][0] != ipv6 or stack[-1][1] <= network):
+                stack.pop()
+            if not stack:
+                group_id += 1
+            yield (prefix,
+                   item,
+                   group_id,
+                   stack[0][2] if stack else prefix,
+                   len(stack))
+            stack.append((ipv6,
+                          network + (1 << ((128 if ipv6 else 32)
+                                           - prefix_len)),
+                          prefix))
@@ -23,138 +23,200 @@ __maintainer__ = "Justin Furuness"
 __email__ = "jfuruness@gmail.com"
 __status__ = "Production"
 
-from ..mrt_base.tables import MRT_Announcements_Table
+from itertools import groupby
+from operator import itemgetter
 
-from ....utils.base_classes import ROA_Validity
+import psycopg2.extensions
+
+from ..mrt_base.tables import MRT_Announcements_Table, AS_Paths_Table
+
+from .prefix_trie import Prefix_Trie
+from ...roas.rov_classifier import ROV_Classifier
 from ....utils.database import Generic_Table
+from ....utils.database.sql_pipeline import get_fingerprints
+from ....utils import utils
+
+
+def _copy_rows(Table, rows, binary=False, clear_table=False, table=None):
+    """Copies python rows into a table, with binary COPY if binary
+
+    table defaults to Table's name, see utils.stream_to_db
+    """
+
+    if binary:
+        utils.binary_to_db(Table,
+                           rows,
+                           clear_table,
+                           columns=Table.columns,
+                           table=table,
+                           checkpoint=False)
+    else:
+        lines = ("\t".join("" if x is None else str(x) for x in row) + "\n"
+                 for row in rows)
+        utils.stream_to_db(Table,
+                           lines,
+                           clear_table,
+                           columns=Table.columns,
+                           table=table,
+                           checkpoint=False)
 
 
-class Distinct_Prefix_Origins_Table(Generic_Table):
+class Distinct_Prefix_Origins_W_IDs_Table(Generic_Table):
     """Class with database functionality
 
     in depth explanation at the top of the file"""
 
     __slots__ = []
 
-    name = "distinct_prefix_origins"
+    name = "distinct_prefix_origins_w_ids"
 
-    columns = ["prefix", "origin"]
+    columns = ["prefix",
+               "origin",
+               "prefix_id",
+               "origin_id",
+               "prefix_origin_id",
+               "prefix_group_id",
+               "ann_count"]
 
-    def fill_table(self):
-        """Fills table with data"""
+    def _create_tables(self):
+        """Creates tables if they do not exist"""
 
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS (
-                SELECT DISTINCT prefix, origin
-                    FROM {MRT_Announcements_Table.name}
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}(
+                prefix CIDR,
+                origin BIGINT,
+                prefix_id BIGINT,
+                origin_id BIGINT,
+                prefix_origin_id BIGINT,
+                prefix_group_id BIGINT,
+                ann_count BIGINT
                 );"""
         self.execute(sql)
 
-class Prefix_IDs_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
+    def fill_table(self, binary=False):
+        """Fills table with every distinct prefix origin and its ids
+
+        mrt_announcements is scanned once for the distinct prefix
+        origins and their counts. All three ids are then assigned in
+        one pass (see assign_ids) and the rows are copied in. This
+        used to be a table per id, each made from a DISTINCT over the
+        same rows with its own indexes, then all joined back together.
+
+        The rows are streamed in prefix order, so prefix groups are
+        found as they go by (see Prefix_Trie.walk_sorted), and only a
+        row per prefix is kept, which is then copied into prefix_groups.
+
+        If binary, rows are inserted with binary COPY.
+        """
+
+        # prefix: (prefix_group_id, superprefix, depth)
+        groups = {}
+
+        def rows():
+            prefix_rows = groupby(self.get_counts(), key=itemgetter(0))
+            for prefix, same_prefix, *group in Prefix_Trie.walk_sorted(
+                    prefix_rows):
+                # Set before the rows of the prefix are read by assign_ids
+                groups[prefix] = tuple(group)
+                yield from same_prefix
+
+        _copy_rows(self.__class__, self.assign_ids(rows(), groups), binary)
+        _copy_rows(Prefix_Groups_Table,
+                   ((prefix, *group) for prefix, group in groups.items()),
+                   binary,
+                   clear_table=True)
+
+    def get_counts(self):
+        """Yields (prefix, origin, count) of each distinct prefix origin
+
+        Rows are in prefix order, and streamed through a server side
+        cursor (see Database.stream), so they're never all in memory.
+        Prefixes are cast to cidr, so that they read back the same as
+        they are stored here (inet drops the length of a /32).
+        """
+
+        sql = f"""SELECT prefix::CIDR AS prefix, origin, COUNT(*) AS ann_count
+                FROM {MRT_Announcements_Table.name}
+                    GROUP BY prefix::CIDR, origin
+                    ORDER BY prefix::CIDR, origin;"""
+        # Tuples, since a dict per row is much slower
+        with self.stream(sql,
+                         cursor_factory=psycopg2.extensions.cursor) as rows:
+            yield from rows
+
+    @staticmethod
+    def assign_ids(rows, groups=None):
+        """Yields rows in the order of columns from (prefix, origin, count)
+
+        Each prefix and origin gets the next id the first time it's
+        seen, and every row is a distinct prefix origin, so its index
+        is its prefix_origin_id. Ids are dense and start at 0, like
+        the ROW_NUMBER() - 1 that was used before. prefix_group_id is
+        from groups, see Prefix_Trie.get_groups, or 0 without groups.
+        """
+
+        # prefix: prefix_id, origin: origin_id
+        prefix_ids = {}
+        origin_ids = {}
+        for prefix_origin_id, (prefix, origin, ann_count) in enumerate(rows):
+            yield (prefix,
+                   origin,
+                   prefix_ids.setdefault(prefix, len(prefix_ids)),
+                   origin_ids.setdefault(origin, len(origin_ids)),
+                   prefix_origin_id,
+                   groups[prefix][0] if groups else 0,
+                   ann_count)
 
-    name = "prefix_ids"
 
-    columns = ["prefix", "ann_count", "prefix_id"]
-
-    def fill_table(self):
-        """Fills table with data"""
-
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                    SELECT prefix,
-                           ann_count,
-                           ROW_NUMBER() OVER () -1 AS prefix_id
-                    FROM (
-                         SELECT mrt.prefix,
-                                COUNT(*) AS ann_count
-                        FROM {MRT_Announcements_Table.name} mrt
-                            GROUP BY mrt.prefix) a
-                );""" 
-        self.execute(sql)
-
-class Origin_IDs_Table(Generic_Table):
+class Prefix_Groups_Table(Generic_Table):
     """Class with database functionality
 
     in depth explanation at the top of the file"""
 
     __slots__ = []
 
-    name = "origin_ids"
-
-    columns = ["origin", "origin_id"]
-
-    def fill_table(self):
-        """Fills table with data"""
-
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                        SELECT origin, ROW_NUMBER() OVER () -1 AS origin_id
-                            FROM (
-                             SELECT DISTINCT origin
-                            FROM {Distinct_Prefix_Origins_Table.name} dpo
-                        ) a
-                );""" 
-        self.execute(sql)
-
-class Prefix_Origin_IDs_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
+    name = "prefix_groups"
 
-    name = "prefix_origin_ids"
+    columns = ["prefix", "prefix_group_id", "superprefix", "depth"]
 
-    columns = ["prefix", "origin", "prefix_origin_id"]
+    def _create_tables(self):
+        """Creates tables if they do not exist
 
-    def fill_table(self):
-        """Fills table with data"""
+        Filled by Distinct_Prefix_Origins_W_IDs_Table.fill_table
+        """
 
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                        --table id distinct already, no distinct nessecary
-                         SELECT dpo.origin, dpo.prefix,
-                                         ROW_NUMBER() OVER () -1
-                                            AS prefix_origin_id
-                        FROM {Distinct_Prefix_Origins_Table.name} dpo
-                );""" 
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}(
+                prefix CIDR,
+                prefix_group_id BIGINT,
+                superprefix CIDR,
+                depth SMALLINT
+                );"""
         self.execute(sql)
 
-
-class Distinct_Prefix_Origins_W_IDs_Table(Generic_Table):
+class Prefix_IDs_Table(Generic_Table):
     """Class with database functionality
 
     in depth explanation at the top of the file"""
 
     __slots__ = []
 
-    name = "distinct_prefix_origins_w_ids"
+    name = "prefix_ids"
 
-    columns = ["prefix",
-               "origin",
-               "prefix_id",
-               "origin_id",
-               "prefix_origin_id"]
+    columns = ["prefix", "ann_count", "prefix_id"]
 
     def fill_table(self):
-        """Fills table with data"""
+        """Fills table with data
 
-        # NOTE: I know you can use with statements for superprefix tables/
-        # group ids, but this makes the query too slow without indexes
-        sql = f"""
-                CREATE UNLOGGED TABLE {self.name} AS (
-                SELECT dpo.prefix,
-                       dpo.origin,
-                       p_ids.prefix_id,
-                       o_ids.origin_id,
-                       dpo.prefix_origin_id,
-                       0 AS prefix_group_id --prefix_group_ids.prefix_group_id
-                FROM {Prefix_Origin_IDs_Table.name} dpo
-                INNER JOIN {Prefix_IDs_Table.name} p_ids
-                    ON p_ids.prefix = dpo.prefix
-                INNER JOIN {Origin_IDs_Table.name} o_ids
-                    ON o_ids.origin = dpo.origin
+        Prefix ids and counts are already in
+        distinct_prefix_origins_w_ids, so mrt_announcements isn't
+        scanned again.
+        """
+
+        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
+                    SELECT prefix,
+                           SUM(ann_count)::BIGINT AS ann_count,
+                           prefix_id
+                    FROM {Distinct_Prefix_Origins_W_IDs_Table.name}
+                        GROUP BY prefix, prefix_id
                 );"""
         self.execute(sql)
 
@@ -178,69 +240,6 @@ class Blocks_Table(Generic_Table):
                 );"""
         self.execute(sql)
 
-# NOTE 0 valid, 1 unknown, 2 invalid by origin, 3 invalid by length
-
-class ROA_Known_Validity_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
-
-    name = "roa_known_validity"
-
-    columns = ["prefix", "origin", "roa_validity"]
-
-    def fill_table(self):
-        """Fills table with data"""
-
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS (
-                    SELECT dpo.prefix,
-                           dpo.origin,
-                           --NOTE: don't change the numbering. It's dependent elsewhere as well
-                           CASE WHEN r.asn != dpo.origin AND MASKLEN(dpo.prefix) > r.max_length
-                                    THEN {ROA_Validity.INVALID_BY_ALL.value}
-                                WHEN MASKLEN(dpo.prefix) > r.max_length
-                                    THEN {ROA_Validity.INVALID_BY_LENGTH.value}
-                                WHEN r.asn != dpo.origin
-                                    THEN {ROA_Validity.INVALID_BY_ORIGIN.value}
-                                WHEN r.asn = dpo.origin
-                                     AND MASKLEN(dpo.prefix) <= r.max_length
-                                        THEN {ROA_Validity.VALID.value} --valid
-                                ELSE {ROA_Validity.UNKNOWN.value} --unknown
-                            END AS roa_validity
-                    FROM {Distinct_Prefix_Origins_W_IDs_Table.name} dpo
-                    INNER JOIN (SELECT prefix,
-                                      asn,
-                                      max_length
-                               FROM roas WHERE (SELECT MAX(created_at)
-                                                FROM roas) = created_at) r
-                        ON dpo.prefix <<= r.prefix
-                );"""
-        self.execute(sql)
-
-        # If there are overlapping ROAs, keep the most valid one
-        # https://stackoverflow.com/a/6584134
-        sql = f"""DELETE FROM {self.name} a USING (
-                SELECT MIN(roa_validity) AS roa_validity, prefix, origin
-                    FROM {self.name}
-                    GROUP BY prefix, origin HAVING COUNT(*) > 1
-                ) b
-                WHERE a.prefix = b.prefix
-                    AND a.origin = b.origin
-                    AND a.roa_validity != b.roa_validity"""
-        self.execute(sql)
-
-        # https://stackoverflow.com/a/6584134
-        # In case there are any other duplicates, remove them
-        sql = f"""DELETE FROM {self.name} a USING (
-                SELECT MIN(ctid) as ctid, prefix, origin, roa_validity FROM {self.name}
-                GROUP BY prefix, origin, roa_validity HAVING COUNT(*) > 1
-                ) b
-                WHERE a.prefix = b.prefix AND a.origin = b.origin AND
-                    a.roa_validity = b.roa_validity AND a.ctid <> b.ctid;"""
-        self.execute(sql)
-
 class ROA_Validity_Table(Generic_Table):
     """Class with database functionality
 
@@ -252,20 +251,39 @@ class ROA_Validity_Table(Generic_Table):
 
     columns = ["prefix", "origin", "roa_validity"]
 
-    def fill_table(self):
-        """Fills table with data"""
+    def _create_tables(self):
+        """Creates tables if they do not exist"""
 
-        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name} AS (
-                    SELECT prefix, origin, roa_validity
-                        FROM {ROA_Known_Validity_Table.name}
-                    UNION ALL
-                    (SELECT prefix, origin, {ROA_Validity.UNKNOWN.value} AS roa_validity
-                        FROM {Distinct_Prefix_Origins_W_IDs_Table.name}
-                    EXCEPT SELECT prefix, origin, {ROA_Validity.UNKNOWN.value} AS roa_validity
-                        FROM {ROA_Known_Validity_Table.name})
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}(
+                prefix CIDR,
+                origin BIGINT,
+                roa_validity SMALLINT
                 );"""
         self.execute(sql)
 
+    def fill_table(self, binary=False):
+        """Fills table with the validity of every distinct prefix origin
+
+        Each prefix origin is classified in process against the latest
+        ROAs, see ROV_Classifier. This used to be a GIST join with the
+        roas table, then deletes for overlapping ROAs, then a
+        UNION/EXCEPT for the unknowns. NOTE: the numbering is from
+        ROA_Validity, and is dependent elsewhere as well.
+
+        If binary, rows are inserted with binary COPY.
+        """
+
+        classify = ROV_Classifier.from_db().classify
+        sql = f"""SELECT prefix, origin
+                FROM {Distinct_Prefix_Origins_W_IDs_Table.name};"""
+        # Tuples, since a dict per row is much slower
+        with self.conn.cursor(
+                cursor_factory=psycopg2.extensions.cursor) as tuple_cursor:
+            tuple_cursor.execute(sql)
+            rows = ((prefix, origin, classify(prefix, origin))
+                    for prefix, origin in tuple_cursor)
+            _copy_rows(self.__class__, rows, binary)
+
 class Prefix_Origin_Blocks_Metadata_Table(Generic_Table):
     """Class with database functionality"""
 
@@ -274,6 +292,9 @@ class Prefix_Origin_Blocks_Metadata_Table(Generic_Table):
 
     name = "prefix_origin_block_metadata"
 
+    columns = ["prefix", "origin", "prefix_id", "origin_id",
+               "prefix_origin_id", "block_id", "roa_validity"]
+
     def fill_table(self):
         sql = f"""CREATE UNLOGGED TABLE {self.name} AS (
                     SELECT dpo.prefix,
@@ -302,6 +323,10 @@ class Prefix_Origin_Metadata_Table(Generic_Table):
 
     name = "prefix_origin_metadata"
 
+    columns = ["prefix", "origin", "prefix_id", "origin_id",
+               "prefix_origin_id", "block_id", "roa_validity",
+               "block_prefix_id"]
+
     def fill_table(self):
         sql = f"""CREATE UNLOGGED TABLE {self.name} AS (
                 SELECT dpo.prefix,
@@ -352,6 +377,55 @@ class Prefix_Origin_Metadata_Table(Generic_Table):
         with Distinct_Prefix_Origins_W_IDs_Table() as db:
             assert db.get_count() == self.get_count()
 
+class Metadata_Inputs_Table(Generic_Table):
+    """Class with database functionality
+
+    Records the inputs that each stage of MRT_Metadata_Parser consumed,
+    so that an incremental run knows what changed since. See
+    incremental_metadata.py"""
+
+    __slots__ = []
+
+    name = "mrt_metadata_inputs"
+
+    columns = ["stage", "input", "fingerprint"]
+
+    def _create_tables(self):
+        """Creates tables if they do not exist"""
+
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}(
+                stage TEXT,
+                input TEXT,
+                fingerprint TEXT
+                );"""
+        self.execute(sql)
+
+    def get_inputs(self, stage: str) -> dict:
+        """Returns {input: fingerprint} that stage last consumed"""
+
+        sql = f"SELECT input, fingerprint FROM {self.name} WHERE stage = %s"
+        return {x["input"]: x["fingerprint"]
+                for x in self.execute(sql, [stage])}
+
+    def set_inputs(self, stage: str, inputs: dict):
+        """Replaces the inputs recorded for stage"""
+
+        self.execute(f"DELETE FROM {self.name} WHERE stage = %s", [stage])
+        for _input, fingerprint in inputs.items():
+            sql = f"INSERT INTO {self.name} VALUES (%s, %s, %s)"
+            self.execute(sql, [stage, _input, fingerprint])
+
+    def get_table_inputs(self, *names) -> dict:
+        """Returns {table: fingerprint} of tables and their partitions
+
+        See sql_pipeline.get_fingerprints. The fingerprint changes when
+        a table is recreated, truncated, or grows, which is how
+        MRT_Parser and ROAs_Parser refill their tables.
+        """
+
+        return get_fingerprints(self, names)
+
+
 class MRT_W_Metadata_Table(Generic_Table):
     """Class with database functionality"""
 
@@ -362,7 +436,8 @@ class MRT_W_Metadata_Table(Generic_Table):
 
     columns = ["prefix", "as_path", "origin", "time", "monitor_asn",
                "prefix_id", "origin_id", "prefix_origin_id", "block_id",
-               "roa_validity", "block_prefix_id", "origin_hijack_asn"]
+               "roa_validity", "block_prefix_id", "origin_hijack_asn",
+               "path_id"]
 
     def _create_tables(self):
         sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}(
@@ -377,17 +452,32 @@ class MRT_W_Metadata_Table(Generic_Table):
                 block_id INTEGER,
                 roa_validity SMALLINT,
                 block_prefix_id INTEGER,
-                origin_hijack_asn BIGINT
+                origin_hijack_asn BIGINT,
+                path_id BIGINT
                );"""
         self.execute(sql)
 
     def fill_table(self):
-        self.execute(f"DROP TABLE IF EXISTS {self.name}")
+        """Joins prefix origin metadata onto the mrt announcements
+
+        If paths were encoded, as_path stays NULL (and path_id is
+        kept). Only the monitor is looked up in as_paths. To get
+        full paths, see create_expanded_view.
+        """
+
+        self.clear_table()
+        # Make sure it exists for the join, even if paths weren't encoded
+        with AS_Paths_Table():
+            pass
         self.execute("ANALYZE")
         sql = f"""CREATE UNLOGGED TABLE {self.name} AS (
-                SELECT mrt.*,
+                SELECT mrt.prefix,
+                       mrt.as_path,
+                       mrt.origin,
+                       mrt.time,
                        --NOTE that postgres starts at 1 not 0
-                       mrt.as_path[1] AS monitor_asn,
+                       COALESCE(mrt.as_path[1], paths.as_path[1])
+                            AS monitor_asn,
                        pom.prefix_id,
                        pom.origin_id,
                        pom.prefix_origin_id,
@@ -395,119 +485,41 @@ class MRT_W_Metadata_Table(Generic_Table):
                        pom.block_id,
                        pom.roa_validity,
                        pom.block_prefix_id,
-                       NULL AS origin_hijack_asn--,
+                       NULL AS origin_hijack_asn,
                        --pom.block_origin_id,
                        --pom.block_prefix_group_id,
                        --pom.block_prefix_origin_id
+                       mrt.path_id
                 FROM {MRT_Announcements_Table.name} mrt
                 INNER JOIN {Prefix_Origin_Metadata_Table.name} pom
                     ON pom.prefix = mrt.prefix AND pom.origin = mrt.origin
+                LEFT JOIN {AS_Paths_Table.name} paths
+                    ON paths.path_id = mrt.path_id
                 );"""
         self.execute(sql)
 
+    def clear_table(self):
+        """Drops the expanded view first, since it depends on the table"""
 
+        self.execute(f"DROP VIEW IF EXISTS {self.name}_expanded")
+        super().clear_table()
 
-##################
-### Old Tables ###
-##################
-
-# These were some old tables when we initially wanted to do the mrt anns
-# and have each iteration in exr be from the same prefix group
-# But we didn't need to for our phd
-# I leave them here for the next person to tackle that problem
-
-
-
-
-class Superprefixes_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
-
-    name = "superprefixes"
-
-    columns = ["prefix"]
-
-    def fill_table(self):
-        """Fills table with data"""
-
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                    SELECT DISTINCT ON (prefix) dpo.prefix
-                       FROM {Prefix_IDs_Table.name} dpo
-                        LEFT JOIN {Prefix_IDs_Table.name} dpo2
-                            ON dpo2.prefix >> dpo.prefix
-                        WHERE dpo2.prefix_id IS NULL);"""
-        self.execute(sql)
-
-class Superprefix_Groups_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
-
-    name = "superprefix_groups"
-
-    columns = ["prefix", "prefix_group_id"]
-
-    def fill_table(self):
-        """Fills table with data"""
-
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                        SELECT prefix, ROW_NUMBER() OVER () - 1
-                                    AS prefix_group_id
-                        FROM {Superprefixes_Table.name}
-                );""" 
-        self.execute(sql)
-
-class Unknown_Prefixes_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
-
-    name = "unknown_prefixes"
-
-    columns = ["prefix"]
-
-    def fill_table(self):
-        """Fills table with data"""
-
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                        SELECT prefix FROM {Prefix_IDs_Table.name}
-                        EXCEPT
-                        SELECT prefix FROM {Superprefixes_Table.name}
-                );""" 
-        self.execute(sql)
-
-
-class Prefix_Groups_Table(Generic_Table):
-    """Class with database functionality
-
-    in depth explanation at the top of the file"""
-
-    __slots__ = []
-
-    name = "prefix_groups"
-
-    columns = ["prefix", "prefix_group_id"]
+    def create_expanded_view(self, name=None) -> str:
+        """Creates a view with encoded paths expanded, returns its name
 
-    def fill_table(self):
-        """Fills table with data"""
+        Paths are only looked up in as_paths as rows are read, so the
+        table itself stays small. Used as the extrapolator input.
+        """
 
-        sql = f"""CREATE UNLOGGED TABLE {self.name} AS(
-                         SELECT u_p.prefix, spg.prefix_group_id
-                        FROM {Unknown_Prefixes_Table.name} u_p
-                        INNER JOIN {Superprefix_Groups_Table.name} spg
-                            ON u_p.prefix << spg.prefix
-                        UNION ALL
-                        SELECT prefix, prefix_group_id
-                            FROM {Superprefix_Groups_Table.name}
-                );""" 
+        name = name if name else f"{self.name}_expanded"
+        columns = ",\n".join(f"m.{x}" if x != "as_path"
+                              else "COALESCE(m.as_path, p.as_path) AS as_path"
+                              for x in self.columns)
+        sql = f"""CREATE OR REPLACE VIEW {name} AS (
+                SELECT {columns}
+                FROM {self.name} m
+                LEFT JOIN {AS_Paths_Table.name} p
+                    ON p.path_id = m.path_id
+                );"""
         self.execute(sql)
-
-
-
+        return name
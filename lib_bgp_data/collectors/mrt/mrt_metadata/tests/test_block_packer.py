@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the block_packer.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import bisect
+import logging
+import time
+
+import numpy as np
+import pytest
+
+from ..block_packer import Block_Packer
+
+
+def first_fit(weights, max_block_size):
+    """The packer that Block_Packer replaced, for the benchmark
+
+    Bins are kept sorted by load, and each weight, heaviest first,
+    goes into the first (lightest) bin with room.
+    """
+
+    class Bin:
+        def __init__(self, bin_id):
+            self.bin_id = bin_id
+            self.indexes = []
+            self.total_weight = 0
+
+        def __lt__(self, other):
+            return self.total_weight < other.total_weight
+
+    order = sorted(range(len(weights)), key=lambda i: weights[i],
+                   reverse=True)
+    bins = list(sorted(Bin(i) for i in range(len(weights)
+                                             // max_block_size + 1)))
+    for i in order:
+        for b_index, b in enumerate(bins):
+            if len(b.indexes) < max_block_size:
+                b.indexes.append(i)
+                b.total_weight += weights[i]
+                break
+        bisect.insort_left(bins, bins.pop(b_index))
+    block_ids = np.empty(len(weights), dtype=np.int64)
+    for b in bins:
+        block_ids[b.indexes] = b.bin_id
+    return block_ids
+
+
+@pytest.mark.mrt_parser
+class Test_Block_Packer:
+    """Tests the Block_Packer class"""
+
+    def test_lpt(self):
+        """Heaviest first, each into the lightest block"""
+
+        block_ids = Block_Packer(3, 2).pack([1, 5, 4, 3, 2, 1])
+        # 5 -> 0, 4 -> 1, 3 -> 1, 2 -> 0, 1 -> 0 (full), 1 -> 1
+        assert block_ids.tolist() == [0, 0, 1, 1, 0, 1]
+        assert Block_Packer.get_loads([1, 5, 4, 3, 2, 1],
+                                      block_ids).tolist() == [8, 8]
+
+    def test_max_block_size(self):
+        """Full blocks must not get more prefixes, even if lightest"""
+
+        weights = [100] + [1] * 9
+        block_ids = Block_Packer(5, 2).pack(weights)
+        assert np.bincount(block_ids).tolist() == [5, 5]
+
+    def test_block_count(self):
+        """Default is prefixes // max_block_size + 1, and must fit"""
+
+        assert Block_Packer(400).get_block_count(1000) == 3
+        assert Block_Packer(400, 10).get_block_count(1000) == 10
+        with pytest.raises(ValueError):
+            Block_Packer(400, 2).get_block_count(1000)
+
+    def test_get_rows(self):
+        """Rows are [block_id, prefix], like the blocks table"""
+
+        rows = Block_Packer(1).get_rows([["1.0.0.0/8", 1],
+                                         ["2.0.0.0/8", 2]])
+        assert sorted(rows) == [[0, "2.0.0.0/8"], [1, "1.0.0.0/8"]]
+        assert Block_Packer().get_rows([]) == []
+
+    def test_large_weights(self):
+        """Weights too large to shift in int64 must still be packed"""
+
+        block_ids = Block_Packer(2).pack([2**62, 5, 1, 1])
+        assert block_ids.tolist() == [0, 1, 2, 2]
+
+    @pytest.mark.slow
+    @pytest.mark.parametrize("prefixes", [10**4, 10**6])
+    def test_benchmark(self, prefixes):
+        """Compares speed and the heaviest block with first fit
+
+        First fit is only run at 10**4 prefixes, since it takes far
+        too long beyond that.
+        """
+
+        rng = np.random.default_rng(0)
+        # Announcements per prefix are heavy tailed
+        weights = np.minimum(rng.zipf(1.5, prefixes), 10**6)
+        start = time.perf_counter()
+        block_ids = Block_Packer(400).pack(weights)
+        seconds = time.perf_counter() - start
+        loads = Block_Packer.get_loads(weights, block_ids)
+        assert np.bincount(block_ids).max() <= 400
+        assert seconds < 1
+        logging.info(f"{prefixes} prefixes, heap: {seconds}s "
+                     f"heaviest block {loads.max()}")
+        if prefixes <= 10**4:
+            start = time.perf_counter()
+            old_ids = first_fit(weights.tolist(), 400)
+            old_seconds = time.perf_counter() - start
+            old_loads = Block_Packer.get_loads(weights, old_ids)
+            logging.info(f"first fit: {old_seconds}s "
+                         f"heaviest block {old_loads.max()}")
+            assert loads.max() <= old_loads.max()
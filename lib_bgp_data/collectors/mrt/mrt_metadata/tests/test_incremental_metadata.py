@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the incremental_metadata.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import pytest
+
+from ..block_packer import Block_Packer
+from ..incremental_metadata import Incremental_Metadata
+from ..tables import Distinct_Prefix_Origins_W_IDs_Table
+
+
+@pytest.mark.mrt_parser
+class Test_Incremental_Metadata:
+    """Tests the Incremental_Metadata class"""
+
+    def test_extend_ids(self):
+        """Kept prefix origins keep ids, new ones get unused ids"""
+
+        old = {("1.0.0.0/8", 1): (0, 0, 0),
+               ("2.0.0.0/8", 2): (1, 1, 1),
+               ("3.0.0.0/8", 3): (2, 2, 2)}
+        counts = {("1.0.0.0/8", 1): 5,
+                  ("2.0.0.0/8", 3): 1,
+                  ("4.0.0.0/8", 4): 1}
+        ids = Incremental_Metadata.extend_ids(counts, old)
+        assert ids[("1.0.0.0/8", 1)] == (0, 0, 0)
+        # The origin was in a removed prefix origin, so it's new too
+        assert ids[("2.0.0.0/8", 3)] == (3, 3, 3)
+        assert ids[("4.0.0.0/8", 4)] == (4, 4, 4)
+
+    def test_extend_ids_from_nothing(self):
+        """With no old ids, ids are the same as a full run's"""
+
+        rows = [("1.0.0.0/8", 1, 5), ("1.0.0.0/8", 2, 1), ("2.0.0.0/8", 1, 1)]
+        ids = Incremental_Metadata.extend_ids({x[:2]: x[2] for x in rows}, {})
+        full = Distinct_Prefix_Origins_W_IDs_Table.assign_ids(rows)
+        assert {x[:2]: x[2:5] for x in full} == ids
+
+    def test_get_groups(self):
+        """Groups keep their id while their superprefix is the same"""
+
+        groups = Incremental_Metadata.get_groups(
+            ["1.0.0.0/8", "1.2.0.0/16", "2.0.0.0/8", "3.0.0.0/8"],
+            {"2.0.0.0/8": 7, "1.2.0.0/16": 3})
+        assert groups == {"1.0.0.0/8": (8, "1.0.0.0/8", 0),
+                          "1.2.0.0/16": (8, "1.0.0.0/8", 1),
+                          "2.0.0.0/8": (7, "2.0.0.0/8", 0),
+                          "3.0.0.0/8": (9, "3.0.0.0/8", 0)}
+
+    def test_extend_blocks(self):
+        """Prefixes stay in their block, new ones go in the lightest"""
+
+        old = {"1.0.0.0/8": 0, "2.0.0.0/8": 0, "3.0.0.0/8": 1}
+        counts = {"1.0.0.0/8": 10, "3.0.0.0/8": 1,
+                  "4.0.0.0/8": 5, "5.0.0.0/8": 5, "6.0.0.0/8": 5}
+        blocks = Incremental_Metadata.extend_blocks(counts,
+                                                    old,
+                                                    Block_Packer(2))
+        assert blocks["1.0.0.0/8"] == 0
+        assert blocks["3.0.0.0/8"] == 1
+        # Only two have room, so a new (empty) block 2 is added
+        assert blocks["4.0.0.0/8"] == 2
+        assert blocks["5.0.0.0/8"] == 1
+        assert blocks["6.0.0.0/8"] == 2
+        assert "2.0.0.0/8" not in blocks
+
+    def test_get_block_prefix_ids(self):
+        """Numbered in cidr order within each block, from 0"""
+
+        blocks = {"10.0.0.0/8": 0, "9.0.0.0/8": 0, "9.0.0.0/16": 0,
+                  "::/0": 0, "1.0.0.0/8": 1}
+        assert Incremental_Metadata.get_block_prefix_ids(blocks) == {
+            "9.0.0.0/8": 0, "9.0.0.0/16": 1, "10.0.0.0/8": 2, "::/0": 3,
+            "1.0.0.0/8": 0}
+
+    def test_diff(self):
+        """Changed rows are deleted and inserted, others are left alone"""
+
+        old = {1: (1, "a"), 2: (2, "b"), 3: (3, "c")}
+        new = {1: (1, "a"), 2: (2, "x"), 4: (4, "d")}
+        deletes, inserts = Incremental_Metadata.diff(old, new)
+        assert sorted(deletes) == [2, 3]
+        assert sorted(inserts) == [2, 4]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the prefix_trie.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import pytest
+
+from ..prefix_trie import Prefix_Trie
+from ..tables import Distinct_Prefix_Origins_W_IDs_Table
+
+
+@pytest.mark.mrt_parser
+class Test_Prefix_Trie:
+    """Tests the Prefix_Trie class"""
+
+    def test_groups(self):
+        """Each prefix is grouped under its top level covering prefix"""
+
+        trie = Prefix_Trie(["1.2.3.0/24", "1.2.0.0/16", "1.2.3.128/25",
+                            "1.2.4.0/24", "1.3.0.0/16", "2001:db8::/32",
+                            "2001:db8:1::/48", "2002::/16", "1.2.0.0/16"])
+        assert len(trie) == 8
+        assert trie.get_groups() == {
+            "1.2.0.0/16": (0, "1.2.0.0/16", 0),
+            "1.2.3.0/24": (0, "1.2.0.0/16", 1),
+            "1.2.3.128/25": (0, "1.2.0.0/16", 2),
+            # A sibling, so the stack must be popped back to the /16
+            "1.2.4.0/24": (0, "1.2.0.0/16", 1),
+            "1.3.0.0/16": (1, "1.3.0.0/16", 0),
+            "2001:db8::/32": (2, "2001:db8::/32", 0),
+            "2001:db8:1::/48": (2, "2001:db8::/32", 1),
+            "2002::/16": (3, "2002::/16", 0)}
+
+    def test_default_route(self):
+        """0.0.0.0/0 covers every IPV4 prefix, but no IPV6 ones"""
+
+        groups = Prefix_Trie(["1.0.0.0/8", "0.0.0.0/0", "::/0",
+                              "2001:db8::/32"]).get_groups()
+        assert groups["1.0.0.0/8"] == (0, "0.0.0.0/0", 1)
+        assert groups["2001:db8::/32"] == (1, "::/0", 1)
+
+    def test_walk_sorted(self):
+        """Walking sorted prefixes is the same as walking the trie"""
+
+        prefixes = ["1.2.3.0/24", "1.2.0.0/16", "1.2.3.128/25", "1.3.0.0/16",
+                    "2001:db8::/32", "2001:db8:1::/48", "0.0.0.0/0"]
+        trie = Prefix_Trie(prefixes)
+        ordered = sorted(prefixes, key=Prefix_Trie.get_key)
+        walked = Prefix_Trie.walk_sorted((x, i) for i, x in enumerate(ordered))
+        assert [(prefix, *group) for prefix, _, *group in walked] ==\
+            list(trie.walk())
+        items = [x[1] for x in Prefix_Trie.walk_sorted(
+            (x, i) for i, x in enumerate(ordered))]
+        assert items == list(range(len(ordered)))
+
+    def test_walk_sorted_out_of_order(self):
+        """Prefixes that aren't sorted must not be walked"""
+
+        with pytest.raises(AssertionError):
+            list(Prefix_Trie.walk_sorted([("1.3.0.0/16", None),
+                                          ("1.2.0.0/16", None)]))
+
+    def test_assign_ids_with_groups(self):
+        """prefix_group_id comes from the groups"""
+
+        rows = [("1.2.0.0/16", 1, 3), ("1.2.3.0/24", 2, 1),
+                ("1.3.0.0/16", 1, 5)]
+        groups = Prefix_Trie(x[0] for x in rows).get_groups()
+        assert [x[5] for x in Distinct_Prefix_Origins_W_IDs_Table
+                .assign_ids(rows, groups)] == [0, 0, 1]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the tables.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import pytest
+
+from ..tables import Distinct_Prefix_Origins_W_IDs_Table
+
+
+@pytest.mark.mrt_parser
+class Test_Distinct_Prefix_Origins_W_IDs_Table:
+    """Tests assign_ids of the Distinct_Prefix_Origins_W_IDs_Table"""
+
+    # (prefix, origin, ann_count), in prefix order like get_counts
+    rows = [("1.2.0.0/16", 1, 3),
+            ("1.2.0.0/16", 2, 1),
+            ("1.2.3.0/24", 2, 4),
+            ("1.3.0.0/16", None, 2),
+            ("1.4.0.0/16", 1, 5),
+            ("1.5.0.0/16", None, 1)]
+
+    def test_dense_ids(self):
+        """Every id starts at 0 and has no gaps"""
+
+        ids = list(Distinct_Prefix_Origins_W_IDs_Table.assign_ids(self.rows))
+        # prefix_id, origin_id, prefix_origin_id
+        assert [x[2:5] for x in ids] == [(0, 0, 0),
+                                         (0, 1, 1),
+                                         (1, 1, 2),
+                                         (2, 2, 3),
+                                         (3, 0, 4),
+                                         (4, 2, 5)]
+        # Without groups, every prefix is in group 0
+        assert [x[5] for x in ids] == [0] * len(self.rows)
+        # Counts and prefix origins are kept
+        assert [(x[0], x[1], x[6]) for x in ids] == self.rows
+
+    def test_duplicate_and_null_origins(self):
+        """The same origin always gets the same id, and so does NULL"""
+
+        ids = list(Distinct_Prefix_Origins_W_IDs_Table.assign_ids(self.rows))
+        origin_ids = {}
+        for prefix, origin, _, origin_id, *_ in ids:
+            assert origin_ids.setdefault(origin, origin_id) == origin_id
+        assert len(origin_ids) == 3
+        assert None in origin_ids
+
+    def test_stable_ordering(self):
+        """The same rows in the same order always get the same ids
+
+        get_counts orders its rows, so ids are the same every run.
+        """
+
+        assign_ids = Distinct_Prefix_Origins_W_IDs_Table.assign_ids
+        assert list(assign_ids(self.rows)) == list(assign_ids(iter(self.rows)))
+        # Ids only depend on order, the first prefix is always id 0
+        reordered = list(assign_ids(reversed(self.rows)))
+        assert reordered[0][:5] == ("1.5.0.0/16", None, 0, 0, 0)
@@ -8,8 +8,6 @@ insert the data into a database. For a more detailed explanation see README.
 """
 
 from enum import Enum
-import logging
-import os
 
 from .tables import Provider_Customers_Table, Peers_Table
 from ...utils.base_classes import File
@@ -38,73 +36,60 @@ class Rel_File(File):
 
     __slots__ = []
 
-    def parse_file(self):
+    def parse_file(self, binary=False):
         """Calls all functions to parse a file into the db.
 
-        For more in depth explanation see top of file."""
+        For more in depth explanation see top of file. If binary, rows
+        are inserted with binary COPY (see utils.binary_to_db)."""
 
         # Downloads the file
         utils.download_file(self.url, self.path)
-        # Unzips file and assigns new path
-        self.path: str = utils.unzip_bz2(self.path)
-        # Gets data and writes it to the csvs
-        self._db_insert()
-
-    def _db_insert(self):
-        """Writes both csv files needed and insert into the database.
-
-        First get the attributes of each relationship type. This
-        includes the string used to grep the original file, the csv path
-        and also the table name. Then for each of the relationship types
-        cat the original file, grep for either customer_provider or peer
-        relationships, and put it into a CSV file. Then insert that CSV
-        into the database, and delete all old files. For a more in depth
-        explanation see the top of the file. For how each specific CSV
-        is formatted see below:
+        # Decompresses while reading and inserts into the db
+        self._db_insert(binary)
+
+    def _db_insert(self, binary=False):
+        """Streams each relationship type into its table.
+
+        The bz2 file is decompressed as it's read, so no decompressed
+        copy is written to disk, and rows are copied as they are read,
+        so they are never all held in memory. This previously took a
+        cat and grep pipeline per type. The file is small, so it's
+        read once per type rather than copying into both tables at
+        once. For how each line is formatted see below:
 
         <provider-as>|<customer-as>|-1
         <peer-as>|<peer-as>|0|<source>
         """
 
-        grep, csvs, tables = self._get_rel_attributes()
-
-        # For each type of csv:
-        for key in Rel_Types.__members__.values():
-            # Grep the CSV based on relationship information into a CSV
-            utils.run_cmds(f"cat {self.path} | {grep[key]} > {csvs[key]}")
-            # Inserts the CSV into the database
-            utils.csv_to_db(tables[key], csvs[key], clear_table=True)
+        for key, Table in self._get_table_attributes().items():
+            with utils.open_decompressed(self.path, "rt") as f:
+                rows = self._get_rel_rows(f, key)
+                if binary:
+                    ints = (map(int, x.split("\t")) for x in rows)
+                    utils.binary_to_db(Table, ints, clear_table=True)
+                else:
+                    utils.stream_to_db(Table, rows, clear_table=True)
         # Deletes the old paths
         utils.delete_paths([self.path, self.csv_dir])
 
-    def _get_rel_attributes(self):
-        """Returns the grep string, csv path, and table attributes.
-
-        The grep strings first filter based on whether the information
-        is a customer_provider pair or a peer pair. If there is a -1 it
-        is customer provider data, else it is peer data. If there is a #
-        that is a comment and shouldn't be included in a csv. cat is
-        called and gets piped into the grep strings, which then get
-        piped into cut which removes unnessecary information, and then
-        is piped into sed to produce a tab delimited CSV. The csvs are
-        the paths to each csv file, and the tables are for insertion
-        later. This is put here instead of init or having classes in the
-        enum for cleaner code, other methods get a little messy.
+    def _get_rel_rows(self, lines, key):
+        """Yields tab delimited rows of one relationship type.
+
+        If there is a -1 it is customer provider data, else it is peer
+        data. If there is a # that is a comment and is skipped. Only
+        the first two fields (the ASNs) are kept.
         """
 
-        # The start of the grep strings
-        _grep_temp = {Rel_Types.PROVIDER_CUSTOMERS:
-                      'grep "\-1" | grep -F -v "#"',
-                      Rel_Types.PEERS: 'grep -v "\-1" | grep -F -v "#"'}
-        # Appended onto all grep strings to format for CSV insertion
-        grep = {key: val + ' | cut -d "|" -f1,2 | sed -e "s/|/\t/g"'
-                for key, val in _grep_temp.items()}
-        # Paths for each csv
-        csvs = {key: f'{self.csv_dir}/{key.value}_rel.csv' for key in
-                Rel_Types.__members__.values()}
-
-        # The last value is the tables for csv insertion
-        return grep, csvs, self._get_table_attributes()
+        for line in lines:
+            if "#" in line:
+                continue
+            fields = line.split("|", 3)
+            if len(fields) < 3:
+                continue
+            line_key = (Rel_Types.PROVIDER_CUSTOMERS if "-1" in line
+                        else Rel_Types.PEERS)
+            if line_key == key:
+                yield f"{fields[0]}\t{fields[1]}\n"
 
     def _get_table_attributes(self):
         """Returns tables to be used for CSV insertion"""
@@ -30,18 +30,19 @@ class Relationships_Parser(Parser):
 
     tables = [ASes_Table, AS_Connectivity_Table, Provider_Customers_Table]
 
-    def _run(self, *args, url=None):
+    def _run(self, *args, url=None, binary_copy=False):
         """Downloads and parses file
 
         In depth explanation at top of module. Aggregate months aggregates
         relationship data from x months ago into the same table
+        binary_copy inserts relationships with binary COPY
         """
 
         with Provider_Customers_Table() as _:
             pass
 
         url = url if url else self._get_urls()[0]
-        Rel_File(self.path, self.csv_dir, url).parse_file()
+        Rel_File(self.path, self.csv_dir, url).parse_file(binary_copy)
         utils.delete_paths([self.csv_dir, self.path])
 
         # Fills these rov++ specific tables
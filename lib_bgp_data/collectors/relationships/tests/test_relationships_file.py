@@ -5,7 +5,7 @@
 For specifics on each test, see docstrings under each function.
 """
 
-import os
+import bz2
 
 import pytest
 from unittest.mock import Mock, patch
@@ -47,9 +47,6 @@ class Test_Relationships_File:
         utils.download_file(self.rel_file.url,
                             self.rel_file.path)
 
-        # Unzip this file and assign its new path
-        self.rel_file.path = utils.unzip_bz2(self.rel_file.path)
-
         _peer_count, _cust_prov_count = self._get_lines(self.rel_file.path)
 
         # Clean up with utils so as not to contaminate test
@@ -62,30 +59,20 @@ class Test_Relationships_File:
                 assert _peer_count == _peers.get_count()
                 assert _cust_prov_count == _cust_provs.get_count()
 
-    def test__get_rel_attributes(self):
-        """Tests the _get_rel_attributes function"""
-
-        # Grep call for finding peer relationships:
-        # All lines not containing '-1' or '#', delimited by tabs
-        _peers_grep = (r'grep -v "\-1" | grep -F -v "#" | cut -d "|" -f1,2'
-                       ' | sed -e "s/|/\t/g"')
-        # Grep call for finding customer-provder relationships:
-        # All lines containing '-1' but not '#", delimited by tabs
-        _cust_prov_grep = (r'grep "\-1" | grep -F -v "#" | cut -d "|"'
-                           ' -f1,2 | sed -e "s/|/\t/g"')
-        # Expected return value for 'grep' from this method
-        _exp_grep = {Rel_Types.PROVIDER_CUSTOMERS: _cust_prov_grep,
-                     Rel_Types.PEERS: _peers_grep}
-        # Assume rovpp == False for table attributes call, since it makes
-        # no difference for testing this method
-        _exp_table_attr = {Rel_Types.PROVIDER_CUSTOMERS:
-                           Provider_Customers_Table,
-                           Rel_Types.PEERS: Peers_Table}
-
-        _grep, _csvs, _table_attr = self.rel_file._get_rel_attributes()
-
-        # Finally, make sure all output matches what is expected
-        assert (_grep, _table_attr) == (_exp_grep, _exp_table_attr)
+    def test__get_rel_rows(self):
+        """Tests the _get_rel_rows function"""
+
+        lines = ["# source:topology|BGP\n",
+                 "1|11537|0|bgp\n",
+                 "1|21616|-1|bgp\n",
+                 "\n",
+                 "1|44222|0|bgp"]
+        # Customer provider lines contain -1, comments are skipped
+        # and only the two ASNs are kept, tab delimited
+        expected = {Rel_Types.PROVIDER_CUSTOMERS: ["1\t21616\n"],
+                    Rel_Types.PEERS: ["1\t11537\n", "1\t44222\n"]}
+        for key, rows in expected.items():
+            assert list(self.rel_file._get_rel_rows(lines, key)) == rows
 
     def test__get_table_attributes(self):
         """Tests the _get_table_attributes function"""
@@ -103,15 +90,11 @@ class Test_Relationships_File:
         expected output. We check that the data in the db is equivalent to
         what we expect."""
 
-        # Patch the utils.download and utils.unzip_bz2 methods and then run
-        # the parse_file method
+        # Patch the utils.download method and then run the parse_file method
         dl = ("lib_bgp_data.collectors.relationships.relationships_file"
               ".utils.download_file")
-        uz = ("lib_bgp_data.collectors.relationships.relationships_file"
-              ".utils.unzip_bz2")
-        with patch(dl) as dl_mock, patch(uz) as uz_mock:
+        with patch(dl) as dl_mock:
             dl_mock.side_effect = self._custom_download_file
-            uz_mock.side_effect = self._custom_unzip_bz2
             self.rel_file.parse_file()
 
         # Check the database and assure we have expected outputs for both
@@ -136,7 +119,7 @@ class Test_Relationships_File:
     def _get_lines(self, path):
         """Returns total number of lines in the file"""
 
-        with open(path) as sample:
+        with utils.open_decompressed(path, "rt") as sample:
             peer_count = 0
             cust_prov_count = 0
             for line in sample:
@@ -147,23 +130,14 @@ class Test_Relationships_File:
         return peer_count, cust_prov_count
 
     def _custom_download_file(self, url, path):
-        """Writes a test file to where the file would normally be
+        """Writes a bz2 test file to where the file would normally be
         downloaded
         """
 
-        test_folder = "/tmp/test_Relationships_Parser/"
-        if not os.path.exists(test_folder):
-            os.makedirs(test_folder)
-        test_path = test_folder + "1.decompressed"
         test_file = ["1|11537|0|bgp\n",
                      "1|21616|-1|bgp\n",
                      "1|34732|-1|bgp\n",
                      "1|41387|-1|bgp\n",
                      "1|44222|0|bgp"]
-        with open(test_path, "w") as test:
+        with bz2.open(path, "wt") as test:
             test.writelines(test_file)
-
-    def _custom_unzip_bz2(self, path):
-        """Returns the path of where the unzipped file would be"""
-
-        return "/tmp/test_Relationships_Parser/1.decompressed"
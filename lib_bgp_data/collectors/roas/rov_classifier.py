@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class ROV_Classifier
+
+The purpose of this class is to find the ROA validity of prefix
+origins in process. MRT_Metadata_Parser used to classify every
+distinct prefix origin with a GIST <<= join against the roas table,
+and then fix up overlapping ROAs and add the unknowns with more passes.
+The simulator's RPKI checked each announcement against every ROA. Both
+now use this class.
+
+ROAs are stored as a prefix trie, flattened into one hash table per
+prefix length: {prefix length: {network: [(asn, max_length)]}}. To
+classify a prefix, the prefix is masked down to each ROA prefix length
+that is no longer than it, and that level is looked up. So a lookup is
+at most one dict lookup per prefix length in use (O(prefix length)),
+no matter how many ROAs there are.
+
+Validity is the same as in SQL before, see ROA_Validity:
+    -No ROA covers the prefix: unknown
+    -Otherwise each covering ROA gives valid, invalid by length
+     (prefix is longer than max_length), invalid by origin, or
+     invalid by all (both), and the most valid one is kept
+
+Design choices:
+    -Only the prefix lengths that have ROAs are checked, in order, so
+     a lookup stops at the first length longer than the prefix
+    -A dict per level rather than a node per bit, since in python a
+     dict lookup costs about the same as following one pointer, and
+     there are far fewer levels in use than bits
+    -Networks are ints, so IPV6 needs no special casing. Host bits of
+     a prefix are ignored, just like the cidr type
+    -Bulk classification takes prefix strings, or the numpy columns of
+     a RIB snapshot (see rib_snapshot.py), so prefixes don't need to be
+     formatted just to be parsed again. pyarrow arrays work as well,
+     but pyarrow is not a dependency
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from socket import inet_pton, AF_INET, AF_INET6
+
+import numpy as np
+import psycopg2.extensions
+
+from .tables import ROAs_Table
+from ...utils.base_classes import ROA_Validity
+
+
+class ROV_Classifier:
+    """Classifies prefix origins against ROAs with a prefix trie.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["_levels", "_lengths"]
+
+    _VALID = ROA_Validity.VALID.value
+    _UNKNOWN = ROA_Validity.UNKNOWN.value
+    _INVALID_BY_LENGTH = ROA_Validity.INVALID_BY_LENGTH.value
+    _INVALID_BY_ORIGIN = ROA_Validity.INVALID_BY_ORIGIN.value
+    _INVALID_BY_ALL = ROA_Validity.INVALID_BY_ALL.value
+
+    def __init__(self, roas=()):
+        """Adds (prefix, asn, max_length) ROAs"""
+
+        # IPV6: {prefix length: {network: [(asn, max_length)]}}
+        self._levels = {False: {}, True: {}}
+        # IPV6: sorted prefix lengths that have ROAs
+        self._lengths = {False: [], True: []}
+        for prefix, asn, max_length in roas:
+            self.add(prefix, asn, max_length)
+
+    @classmethod
+    def from_db(cls):
+        """Loads the latest ROAs from the roas table"""
+
+        with ROAs_Table() as db:
+            sql = f"""SELECT prefix, asn, max_length FROM {db.name}
+                    WHERE created_at = (SELECT MAX(created_at)
+                                        FROM {db.name});"""
+            # Tuples, since a dict per row is much slower
+            with db.conn.cursor(
+                    cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute(sql)
+                return cls(cursor)
+
+    def add(self, prefix: str, asn: int, max_length: int = None):
+        """Adds a ROA, max_length defaults to the prefix length"""
+
+        ipv6, addr, prefix_len = self._parse(prefix)
+        max_length = prefix_len if max_length is None else max_length
+        levels = self._levels[ipv6]
+        if prefix_len not in levels:
+            levels[prefix_len] = {}
+            self._lengths[ipv6] = sorted(levels)
+        network = addr >> ((128 if ipv6 else 32) - prefix_len)
+        levels[prefix_len].setdefault(network, []).append((asn, max_length))
+
+    def classify(self, prefix: str, origin: int) -> int:
+        """Returns the ROA_Validity value of a prefix origin"""
+
+        ipv6, addr, prefix_len = self._parse(prefix)
+        return self._classify(ipv6, addr, prefix_len, origin)
+
+    def classify_many(self, prefixes, origins) -> np.ndarray:
+        """Returns the ROA_Validity values of prefix origins as int8s"""
+
+        classify = self.classify
+        return np.fromiter((classify(prefix, origin) for prefix, origin
+                            in zip(self._to_list(prefixes),
+                                   self._to_list(origins))),
+                           dtype=np.int8,
+                           count=len(prefixes))
+
+    def classify_columns(self, addr_hi, addr_lo, prefix_len, ipv6,
+                         origin) -> np.ndarray:
+        """Returns ROA_Validity values as int8s from prefix columns
+
+        Columns are those of a RIB snapshot part, where an IPV4
+        address is in addr_lo, and an origin of -1 is NULL.
+        """
+
+        _classify = self._classify
+        columns = zip(*(self._to_list(x) for x in [addr_hi,
+                                                   addr_lo,
+                                                   prefix_len,
+                                                   ipv6,
+                                                   origin]))
+        return np.fromiter((_classify(v6, (hi << 64) | lo, length,
+                                      None if asn == -1 else asn)
+                            for hi, lo, length, v6, asn in columns),
+                           dtype=np.int8,
+                           count=len(prefix_len))
+
+########################
+### Helper Functions ###
+########################
+
+    def _classify(self, ipv6: bool, addr: int, prefix_len: int,
+                  origin: int) -> int:
+        """Returns the most valid validity out of the covering ROAs"""
+
+        bits = 128 if ipv6 else 32
+        levels = self._levels[ipv6]
+        best = None
+        for length in self._lengths[ipv6]:
+            if length > prefix_len:
+                break
+            roas = levels[length].get(addr >> (bits - length))
+            if roas is None:
+                continue
+            for asn, max_length in roas:
+                if asn == origin:
+                    if prefix_len <= max_length:
+                        return self._VALID
+                    validity = self._INVALID_BY_LENGTH
+                elif prefix_len <= max_length:
+                    validity = self._INVALID_BY_ORIGIN
+                else:
+                    validity = self._INVALID_BY_ALL
+                if best is None or validity < best:
+                    best = validity
+        return self._UNKNOWN if best is None else best
+
+    @staticmethod
+    def _parse(prefix: str) -> tuple:
+        """Returns (ipv6, address as an int, prefix length)"""
+
+        addr, prefix_len = str(prefix).split("/")
+        if ":" in addr:
+            return True, int.from_bytes(inet_pton(AF_INET6, addr), "big"),\
+                int(prefix_len)
+        return False, int.from_bytes(inet_pton(AF_INET, addr), "big"),\
+            int(prefix_len)
+
+    @staticmethod
+    def _to_list(values) -> list:
+        """Returns numpy arrays, pyarrow arrays, or iterables as a list"""
+
+        # pyarrow
+        if hasattr(values, "to_pylist"):
+            return values.to_pylist()
+        if hasattr(values, "tolist"):
+            return values.tolist()
+        return list(values)
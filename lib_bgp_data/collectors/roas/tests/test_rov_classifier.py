@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the rov_classifier.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import numpy as np
+import pytest
+
+from ..rov_classifier import ROV_Classifier
+from ..tables import ROAs_Table
+from ....utils.base_classes import ROA_Validity
+
+
+@pytest.mark.roas_parser
+class Test_ROV_Classifier:
+    """Tests the ROV_Classifier class"""
+
+    roas = [("1.2.0.0/16", 5, 16),
+            ("1.2.0.0/16", 6, 24),
+            ("2001:db8::/32", 7, 48)]
+
+    @pytest.fixture
+    def classifier(self):
+        return ROV_Classifier(self.roas)
+
+    @pytest.mark.parametrize("prefix, origin, validity", [
+        ("1.2.0.0/16", 5, ROA_Validity.VALID),
+        ("1.2.3.0/24", 5, ROA_Validity.INVALID_BY_LENGTH),
+        # The second ROA makes it valid
+        ("1.2.3.0/24", 6, ROA_Validity.VALID),
+        # Invalid by origin is more valid than invalid by all
+        ("1.2.3.0/24", 9, ROA_Validity.INVALID_BY_ORIGIN),
+        ("1.2.3.0/25", 9, ROA_Validity.INVALID_BY_ALL),
+        ("1.3.0.0/16", 5, ROA_Validity.UNKNOWN),
+        # Less specific than the ROA, so not covered
+        ("1.0.0.0/8", 5, ROA_Validity.UNKNOWN),
+        ("2001:db8:1::/48", 7, ROA_Validity.VALID),
+        ("2001:db8:1::/64", 7, ROA_Validity.INVALID_BY_LENGTH),
+        ("2001:db9::/32", 7, ROA_Validity.UNKNOWN)])
+    def test_classify(self, classifier, prefix, origin, validity):
+        """Validity must match what the SQL classification gave"""
+
+        assert classifier.classify(prefix, origin) == validity.value
+
+    def test_classify_many(self, classifier):
+        """Bulk classification of numpy arrays"""
+
+        validities = classifier.classify_many(
+            np.array(["1.2.0.0/16", "1.3.0.0/16", "1.2.3.0/25"]),
+            np.array([5, 5, 9]))
+        assert validities.dtype == np.int8
+        assert validities.tolist() == [ROA_Validity.VALID.value,
+                                       ROA_Validity.UNKNOWN.value,
+                                       ROA_Validity.INVALID_BY_ALL.value]
+
+    def test_classify_columns(self, classifier):
+        """RIB snapshot columns give the same result as the prefixes"""
+
+        validities = classifier.classify_columns(
+            addr_hi=np.array([0, 0x20010db800010000], dtype="<u8"),
+            addr_lo=np.array([0x01020300, 0], dtype="<u8"),
+            prefix_len=np.array([24, 64], dtype="u1"),
+            ipv6=np.array([False, True]),
+            origin=np.array([-1, 7], dtype="<i8"))
+        assert validities.tolist() == [ROA_Validity.INVALID_BY_ORIGIN.value,
+                                       ROA_Validity.INVALID_BY_LENGTH.value]
+
+    def test_from_db(self):
+        """Only the latest ROAs are loaded"""
+
+        with ROAs_Table(clear=True) as db:
+            db.execute(f"""INSERT INTO {db.name} VALUES
+                       (5, '1.2.0.0/16', 16, 2),
+                       (6, '1.3.0.0/16', 16, 1)""")
+        classifier = ROV_Classifier.from_db()
+        assert classifier.classify("1.2.0.0/16", 5) ==\
+            ROA_Validity.VALID.value
+        assert classifier.classify("1.3.0.0/16", 6) ==\
+            ROA_Validity.UNKNOWN.value
+        with ROAs_Table() as db:
+            db.clear_table()
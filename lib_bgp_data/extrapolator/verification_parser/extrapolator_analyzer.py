@@ -15,6 +15,7 @@ __email__ = "jfuruness@gmail.com"
 __status__ = "Development"
 
 
+import psycopg2.extensions
 
 from .tables import Monitors_Table, Control_Monitors_Table
 
@@ -43,10 +44,10 @@ class Extrapolator_Analyzer(Parser):
                 db.execute(f"""CREATE TABLE mrt_verif_test AS (
                             SELECT * FROM mrt_w_metadata WHERE block_id <= 100);""")
                 table = "mrt_verif_test"
-            rows = db.get_all()
+            asns = db.fetch(f"SELECT asn FROM {db.name}", mode="numpy")["asn"]
             final_results = {}
-            for row in rows:
-                final_results[row['asn']] = {}
+            for asn in asns.tolist():
+                final_results[asn] = {}
                 exr_rows = []
                 output_tables = []
                 for origin_only_mode, mh_prop in [[0, 0],
@@ -56,8 +57,8 @@ class Extrapolator_Analyzer(Parser):
                     output_tables.append(output_table)
                     cmd = (f"time /usr/bin/master_extrapolator ")
                     cmd += f"-a {table} --store-results=0 "
-                    cmd += (f"--full-path-asns {row['asn']} "
-                            f"--exclude-monitor={row['asn']} "
+                    cmd += (f"--full-path-asns {asn} "
+                            f"--exclude-monitor={asn} "
                             f"--mh-propagation-mode={mh_prop} "
                             f"--origin-only={origin_only_mode} "
                             f"--log-folder=/tmp/exr-log --log-std-out=1 "
@@ -69,7 +70,7 @@ class Extrapolator_Analyzer(Parser):
                     sql = f"""CREATE UNLOGGED TABLE control_data AS (
                             SELECT * FROM {table}
                                 WHERE monitor_asn = %s);"""
-                    db.execute(sql, [row['asn']])
+                    db.execute(sql, [asn])
                     
                     print("Created control tbl")
                     for output_table in output_tables:
@@ -80,19 +81,22 @@ class Extrapolator_Analyzer(Parser):
                                     FROM control_data ctrl
                                 LEFT JOIN {output_table} out
                                     ON out.prefix_id = ctrl.prefix_id"""
-                        results = (db.execute(sql))
-                        distances = []
+                        # Streamed as tuples, since there's a row per prefix
+                        results = db.stream(sql, cursor_factory=psycopg2.extensions.cursor)
+                        total_distance = 0
+                        count = 0
                         from tqdm import tqdm
                         # NOTE: if this is too slow, use the python-levenshtein for a c version
                         # And just convert ints to strs
-                        for result in tqdm(results, total=len(results), desc="calculating levenshtein"):
-                            if result["estimate"] is None:
-                                distances.append(len(result["ground_truth"]))
+                        for ground_truth, estimate in tqdm(results, desc="calculating levenshtein"):
+                            if estimate is None:
+                                total_distance += len(ground_truth)
                             else:
-                                distances.append(self.levenshtein(result["ground_truth"], result["estimate"]))
+                                total_distance += self.levenshtein(ground_truth, estimate)
+                            count += 1
 
                         from statistics import mean
-                        final_results[row['asn']][output_table] = mean(distances)
+                        final_results[asn][output_table] = total_distance / count
                         from pprint import pprint
                         pprint(final_results)
                     agg_dict = {}
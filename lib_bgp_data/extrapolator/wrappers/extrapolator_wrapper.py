@@ -39,12 +39,20 @@ class Extrapolator_Wrapper(Parser):
     default_depref_table = "exr_results_depref"
     branch = "master"
 
-    def _run(self, input_table="mrt_w_metadata", bash_args=None):
+    def _run(self,
+             input_table="mrt_w_metadata",
+             bash_args=None,
+             expand_paths=False):
         """Runs the bgp-extrapolator and verifies input.
 
         Installs if necessary. See README for in depth instructions.
+        If the MRT_Parser encoded the AS paths, set expand_paths to read
+        the view that the MRT_Metadata_Parser made with the full paths.
         """
 
+        if expand_paths:
+            input_table = f"{input_table}_expanded"
+
         self._input_validation([input_table])
 
         logging.info("About to run the forecast extrapolator")
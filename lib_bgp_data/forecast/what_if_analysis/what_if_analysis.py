@@ -8,6 +8,7 @@ see __init__.py for a deeper explanation
 from .pre_exr_sql import get_pre_exr_sql
 from .post_exr_sql import get_post_exr_sql
 from ..utils import utils, error_catcher, Database, db_connection
+from ...utils.database import SQL_Pipeline
 
 __author__ = "Justin Furuness"
 __credits__ = ["Justin Furuness"]
@@ -33,16 +34,13 @@ class What_If_Analysis:
 #    @utils.run_parser()
     def run_pre_exr(self, valid_before_time):
         self.logger.info("Beginning what if analysis for pre processing")
-        with db_connection(Database, self.logger) as _db:
-            for sql in get_pre_exr_sql(valid_before_time):
-                self.logger.info("Executing\n{}".format(sql))
-                _db.cursor.execute(sql)
+        # Independent tables and indexes are built at the same time
+        SQL_Pipeline.from_statements("what_if_pre_exr",
+                                     get_pre_exr_sql(valid_before_time)).run()
 
 #    @error_catcher()
 #    @utils.run_parser()
     def run_post_exr(self):
         self.logger.info("Beginning what if analysis for post processing")
-        with db_connection(Database, self.logger) as _db:
-            for sql in get_post_exr_sql():
-                self.logger.debug("Executing\n{}".format(sql))
-                _db.cursor.execute(sql)
+        SQL_Pipeline.from_statements("what_if_post_exr",
+                                     get_post_exr_sql()).run()
@@ -22,6 +22,7 @@ from .tables import Simulation_Results_Avg_Table
 from ..simulator.tables import Simulation_Results_Table
 
 from ...utils.base_classes import Parser
+from ...utils.database import SQL_Pipeline
 
 
 class Graph_Generator(Parser):
@@ -37,10 +38,28 @@ class Graph_Generator(Parser):
         return self.get_graph_data(x_axis_pts, x_axis_col)
 
     def generate_agg_tables(self):
+        """Aggregates the simulation results, then averages them
+
+        Skipped if the simulation results haven't changed since the
+        last time, see SQL_Pipeline.
+        """
+
+        pipeline = SQL_Pipeline("graph_generator", skip_unchanged=True)
+        inputs = [Simulation_Results_Table.name]
         for Table in [Simulation_Results_Agg_Table,
                       Simulation_Results_Avg_Table]:
-            with Table(clear=True) as db:
-                db.fill_table()
+            pipeline.add(Table.name,
+                         func=lambda db, Table=Table: self._fill_table(Table),
+                         inputs=inputs,
+                         outputs=[Table.name])
+            inputs = [Table.name]
+        pipeline.run()
+
+    def _fill_table(self, Table):
+        """Recreates and fills Table"""
+
+        with Table(clear=True) as db:
+            db.fill_table()
 
     def get_graph_data(self, x_axis_pts, x_axis_col):
         """Generates all the possible lines on all graphs and fills data"""
@@ -45,8 +45,8 @@ class Line:
             # Gets the name
             sql += f" ORDER BY {x_axis_col}"
             # Gets the list of potential x values
-            results = [x for x in db.execute(sql)
-                       if x[x_axis_col] in x_attrs]
+            with db.stream(sql) as rows:
+                results = [x for x in rows if x[x_axis_col] in x_attrs]
         for result in results:
             self.x.append(int(result[x_axis_col]))
             self.y.append(float(result[graph_type]) * 100)
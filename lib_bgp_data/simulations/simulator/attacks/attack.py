@@ -195,6 +195,13 @@ class Attack:
                          for x in MRT_W_Metadata_Table.columns])
         return rows
 
+    @property
+    def binary_db_rows(self):
+        """Same as db_rows, but unformatted for utils.binary_to_db"""
+
+        return [[ann.get(x) for x in MRT_W_Metadata_Table.columns]
+                for ann in self.victim_rows + self.attacker_rows]
+
     def _format(self, announcement_dict, column):
         """Formats item for db insertion
 
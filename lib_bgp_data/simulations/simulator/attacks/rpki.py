@@ -6,7 +6,8 @@
 This class is used to store information about RPKI.
 This can be used to determine announcement validity
 The reason we aren't doing this in SQL is because
-typical case is 1 ann, and we want speed
+typical case is 1 ann, and we want speed. The same ROV_Classifier is
+used for the MRT announcements, so both agree on validity
 
 See README for in depth instruction
 """
@@ -18,9 +19,7 @@ __maintainer__ = "Justin Furuness"
 __email__ = "jfuruness@gmail.com"
 __status__ = "Development"
 
-from netaddr import IPNetwork
-
-from ....utils.base_classes import ROA_Validity
+from ....collectors.roas.rov_classifier import ROV_Classifier
 
 
 class RPKI:
@@ -30,33 +29,20 @@ class RPKI:
     """
 
     def __init__(self, roas: list):
-        """Save roas"""
+        """Save roas, and index them by prefix for check_ann"""
 
         self.roas = roas
+        self.classifier = ROV_Classifier((roa.prefix.cidr,
+                                          roa.origin,
+                                          roa.max_len) for roa in roas)
 
     def check_ann(self, prefix: str, origin: int):
-        """Checks announcement validity. Returns worst validity found
+        """Checks announcement validity. Returns the ROA_Validity value
 
-        NOTE: if you end up doing this with lots of announcements,
-        This should probably be done in SQL
+        Valid if any ROA makes it valid, unknown if no ROA covers it,
+        and otherwise the most valid of the covering ROAs. This is a
+        lookup per prefix length (see ROV_Classifier), rather than a
+        check against every ROA.
         """
 
-        # Default validity
-        worst_validity = ROA_Validity.UNKNOWN
-        # Convert to proper datatype
-        prefix = IPNetwork(prefix)
-        # List of ROA objects
-        for roa in self.roas:
-            # Get validity
-            validity = roa.check_validity(prefix, origin)
-            # If valid, return
-            if validity == ROA_Validity.VALID:
-                return validity.value
-            # Continue looking for worst validity possible
-            else:
-                # If validity is worse, set worst_validity
-                # valid < unknown < invalid by asn or length < invalid by all
-                if worst_validity.value < validity.value:
-                    worst_validity = validity
-
-        return worst_validity.value
+        return self.classifier.classify(prefix, origin)
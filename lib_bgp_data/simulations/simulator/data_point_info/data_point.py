@@ -25,7 +25,13 @@ from ....utils.base_classes import Parser
 class Data_Point(Parser):
     """Represents a data point on the graph"""
 
-    def __init__(self, tables, percent_iter, percent, csv_dir, deterministic):
+    def __init__(self,
+                 tables,
+                 percent_iter,
+                 percent,
+                 csv_dir,
+                 deterministic,
+                 binary_copy=False):
         """stores relevant info"""
 
         # Subtables object
@@ -41,6 +47,8 @@ class Data_Point(Parser):
         self.csv_dir = csv_dir
         # Helpful for debugging
         self.deterministic = deterministic
+        # Inserts attacks with binary COPY instead of a csv
+        self.binary_copy = binary_copy
 
     def get_data(self,
                  pbars,
@@ -162,6 +170,10 @@ class Data_Point(Parser):
         attack = Attack_Cls(victim, attacker)
 
         path = join(self.csv_dir, "mrts.csv")
-        utils.rows_to_db(attack.db_rows, path, MRT_W_Metadata_Table)
+        rows = attack.binary_db_rows if self.binary_copy else attack.db_rows
+        utils.rows_to_db(rows,
+                         path,
+                         MRT_W_Metadata_Table,
+                         binary=self.binary_copy)
 
         return attack
@@ -53,9 +53,11 @@ class Simulator(Parser):
              edge_hijack=True,
              etc_hijack=False,
              top_100_hijack=False,
-             redownload_base_data=False):
+             redownload_base_data=False,
+             binary_copy=False):
         """Runs Attack/Defend simulation.
         In depth explanation at top of module.
+        binary_copy inserts attacks with binary COPY instead of a csv
         """
 
         self._validate_input(num_trials,
@@ -82,7 +84,12 @@ class Simulator(Parser):
         tables.fill_tables()
 
         # All data points that we want to graph
-        data_pts = [Data_Point(tables, i, percent, self.csv_dir, deterministic)
+        data_pts = [Data_Point(tables,
+                               i,
+                               percent,
+                               self.csv_dir,
+                               deterministic,
+                               binary_copy)
                     for i, percent in enumerate(percents)]
 
         # Total number of attack/defend scenarios for tqdm
@@ -15,6 +15,8 @@ __status__ = "Development"
 import logging
 import sys
 
+import numpy as np
+
 from ..tables import Simulation_Results_Table
 from ...enums import AS_Types
 from ...enums import Control_Plane_Conditions as C_Plane_Conds
@@ -39,9 +41,10 @@ class Output_Subtables:
               extra_bash_arg_5):
         """Stores data"""
 
-        # Gets all the asn data
+        # Gets all the asn data, as arrays since it's one row per AS
         with Simulation_Extrapolator_Forwarding_Table(round_num=round_num) as _db:
-            ases = {x["asn"]: x for x in _db.get_all()}
+            sql = f"SELECT asn, received_from_asn FROM {_db.name}"
+            ases = _db.fetch(sql, mode="numpy")
 
         # Stores the data for the specific subtables
         for table in self.tables:
@@ -82,11 +85,15 @@ class Output_Subtable:
         """Stores output in the simulation results table"""
 
         # All ases for that subtable
-        subtable_ases = {x["asn"]: x for x in self.Forwarding_Table.get_all()}
-        # We don't want to track the attacker, faster than filtering dict comp
-        for uncountable_asn in [attack.attacker, attack.victim]:
-            if uncountable_asn in subtable_ases:
-                del subtable_ases[uncountable_asn]
+        sql = f"""SELECT asn, received_from_asn, impliment
+              FROM {self.Forwarding_Table.name}"""
+        subtable_ases = self.Forwarding_Table.fetch(sql, mode="numpy")
+        # One row per AS
+        _, keep = np.unique(subtable_ases["asn"], return_index=True)
+        # We don't want to track the attacker
+        keep = keep[~np.isin(subtable_ases["asn"][keep],
+                             [attack.attacker, attack.victim])]
+        subtable_ases = {k: v[keep] for k, v in subtable_ases.items()}
 
         # Insert the trial data into the simulation results table
         with Simulation_Results_Table() as db:
@@ -109,33 +116,51 @@ class Output_Subtable:
                       self._get_visible_hijack_data(table_names, attack, round_num))
 
     def _get_traceback_data(self, subtable_ases, all_ases, attack):
-        """Gets the data plane data through tracing back"""
+        """Gets the data plane data through tracing back
+
+        subtable_ases and all_ases are {column: array}. Every AS of
+        the subtable is traced back one hop at a time, all at once.
+        """
 
         # NOTE: this can easily be changed to SQL. See super optimized folder.
         conds = {x: {y: 0 for y in AS_Types.list_values()}
                  for x in Data_Plane_Conditions.list_values()}
 
-        # For all the ases in the subtable
-        for og_asn, og_as_data in subtable_ases.items():
-            asn, as_data = og_asn, og_as_data
-            looping = True
-            # SHOULD NEVER BE LONGER THAN 64
-            # Done to catch extrapolator loops
-            for i in range(64):
-                # Conds are end conditions. See README.
-                if (condition := as_data["received_from_asn"]) in conds:
-                    conds[condition][og_as_data["impliment"]] += 1
-                    looping = False
-                    break
-                else:
-                    asn = as_data["received_from_asn"]
-                    as_data = all_ases[asn]
-
-            # NEEDED FOR EXR DEVS
-            # If it ends the for loop and didn't change looping...
-            if looping:
-                loop_data = [all_ases, og_asn, og_as_data, attack]
-                self._print_loop_debug_data(*loop_data)
+        # Sorted, so that hops can be looked up with searchsorted
+        asns, indexes = np.unique(all_ases["asn"], return_index=True)
+        received_from = all_ases["received_from_asn"][indexes]
+        # The AS each AS of the subtable has traced back to so far
+        current = subtable_ases["received_from_asn"].copy()
+        done = np.zeros(len(current), dtype=bool)
+        # SHOULD NEVER BE LONGER THAN 64
+        # Done to catch extrapolator loops
+        for i in range(64):
+            # Conds are end conditions. See README.
+            done |= np.isin(current, list(conds))
+            if done.all():
+                break
+            hops = np.searchsorted(asns, current[~done])
+            found = asns[np.minimum(hops, len(asns) - 1)] == current[~done]
+            if not found.all():
+                raise KeyError(current[~done][~found][0])
+            current[~done] = received_from[hops]
+
+        for condition, adopt_counts in conds.items():
+            reached = done & (current == condition)
+            for adopt_val in adopt_counts:
+                adopt_counts[adopt_val] = int(np.count_nonzero(
+                    reached & (subtable_ases["impliment"] == adopt_val)))
+
+        # NEEDED FOR EXR DEVS
+        # If it ends the for loop and didn't finish...
+        if not done.all():
+            i = np.flatnonzero(~done)[0]
+            og_as_data = {k: v[i].item() for k, v in subtable_ases.items()}
+            all_ases = {asn: {"asn": asn, "received_from_asn": received}
+                        for asn, received in zip(asns.tolist(),
+                                                 received_from.tolist())}
+            loop_data = [all_ases, og_as_data["asn"], og_as_data, attack]
+            self._print_loop_debug_data(*loop_data)
         return conds
 
     def _get_visible_hijack_data(self, t_names, attack, round_num):
@@ -13,3 +13,4 @@ __status__ = "Development"
 
 from .logger import config_logging
 from . import utils
+from .file_cache import File_Cache
@@ -23,7 +23,7 @@ class File:
     In depth explanation in README.
     """
 
-    __slots__ = ['csv_dir', 'url', 'num', 'path', 'csv_name']
+    __slots__ = ['csv_dir', 'url', 'num', 'path', 'csv_name', '_size']
 
     def __init__(self,
                  path: str,
@@ -37,8 +37,21 @@ class File:
         self.num = num
         # Creates path as path/num/extension
         self.path = f"{path}/{num}{os.path.splitext(url)[1]}"
+        # Set the first time size is used, once the file is downloaded
+        self._size = None
         logging.debug("Initialized file instance")
 
+    @property
+    def size(self) -> int:
+        """Size of the downloaded file, only stat-ed once
+
+        Sorting used to call getsize twice for every comparison.
+        """
+
+        if self._size is None:
+            self._size = os.path.getsize(self.path)
+        return self._size
+
     def __lt__(self, other) -> bool:
         """less than attribute for sorting files, sorts based on size
 
@@ -48,4 +61,4 @@ class File:
 
         if isinstance(other, File):
             # Returns the smallest file size for a comparater
-            return os.path.getsize(self.path) < os.path.getsize(other.path)
+            return self.size < other.size
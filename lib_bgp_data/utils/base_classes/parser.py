@@ -23,6 +23,7 @@ from subprocess import check_call
 
 from ...utils import utils, config_logging
 from ..database import config
+from ..database.query_profiler import Query_Profiler
 
 
 class Parser:
@@ -88,6 +89,15 @@ class Parser:
         # Recreates empty directories
         utils.clean_paths([self.path, self.csv_dir])
         self.kwargs = kwargs
+        # True, or the seconds after which statements are explained
+        if kwargs.get("profile_queries"):
+            threshold = kwargs["profile_queries"]
+            # profile_analyze runs slow statements again to explain them
+            Query_Profiler.enable(
+                kwargs.get("profile_path",
+                           f"/tmp/{self.name}_query_profile.jsonl"),
+                None if threshold is True else threshold,
+                analyze=kwargs.get("profile_analyze", False))
         logging.debug(f"Initialized {self.name} at {utils.now()}")
         assert hasattr(self, "_run"), ("Needs _run, see Parser.py's run func "
                                        "Note that this is also used by default"
@@ -115,6 +125,8 @@ class Parser:
         # dates-in-minutes-using-datetime-timedelta-method/
         _min, _sec = divmod((utils.now() - start_time).total_seconds(), 60)
         logging.info(f"{self.__class__.__name__} took {_min}m {_sec}s")
+        if self.kwargs.get("profile_queries"):
+            Query_Profiler.log_report()
         if error:
             sys.exit(1)
 
@@ -15,7 +15,12 @@ __email__ = "jfuruness@gmail.com"
 __status__ = "Development"
 
 from .config import Config
+from .connection_pool import Connection_Pool
 from .database import Database
 from .generic_table import Generic_Table
+from .metadata_cache import Metadata_Cache
 from .postgres import Postgres
+from .query_profiler import Query_Profiler
+from .query_stream import Query_Stream
+from .sql_pipeline import SQL_Pipeline, SQL_Step
 from .tests.generic_table_test import Generic_Table_Test
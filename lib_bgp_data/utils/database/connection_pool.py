@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Connection_Pool
+
+The purpose of this class is to reuse database connections. Every
+Database, and so every Generic_Table in a with block, used to open a
+new connection and close it on exit. Connecting and authenticating
+costs far more than most of the queries that are run on the
+connection, and the simulator, Line.add_data and the forecast API
+open hundreds of them per run. multiprocess_execute also reconnected
+for every statement in every worker.
+
+Database now checks connections out of the pool of its process and
+returns them on close. A connection that's returned is kept (up to
+max_size of them) and handed to the next Database with the same
+credentials.
+
+Design choices:
+    -There is one pool per process. A forked child inherits the
+     parent's connections, but a postgres connection can't be shared
+     by two processes, so the child starts an empty pool of its own.
+     The inherited connections are never closed by the child, since
+     closing sends a terminate message on the parent's socket
+    -Connections are checked before they are handed out, without a
+     round trip: they must be open, and not in a transaction. One
+     that has been idle for longer than health_check_seconds also
+     has to answer SELECT 1, in case the server dropped it
+    -If max_size connections are already checked out, more are
+     opened anyway rather than blocking (a with block inside a with
+     block would otherwise deadlock), but they are closed on return
+    -Connections are kept per set of credentials, so different
+     database sections never share connections
+    -Connections are always autocommit, so returning one only resets
+     the cursor factory. Nothing in this package changes session
+     settings, which would be kept by the next user of the connection
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+
+class Connection_Pool:
+    """Keeps open database connections for reuse within a process.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["pid", "max_size", "health_check_seconds", "_idle",
+                 "_checked_out", "_overflow", "_connecting", "_lock",
+                 "connects", "reuses"]
+
+    # Defaults for the pool of each process, see configure
+    default_max_size = 32
+    default_health_check_seconds = 60
+
+    # pid: the pool of that process
+    _pools = {}
+    # Pools inherited from parent processes, kept so they're never closed
+    _inherited = []
+    _pools_lock = threading.Lock()
+
+    def __init__(self, max_size: int = None, health_check_seconds=None):
+        """Starts empty, for the current process"""
+
+        self.pid = os.getpid()
+        self.max_size = max_size or self.default_max_size
+        self.health_check_seconds = (self.default_health_check_seconds
+                                     if health_check_seconds is None
+                                     else health_check_seconds)
+        # credentials key: [(connection, time returned)], last is newest
+        self._idle = {}
+        # id(connection) of pooled connections that are checked out
+        self._checked_out = set()
+        # id(connection) of connections past max_size that are checked out
+        self._overflow = set()
+        # Number of pooled connections being opened
+        self._connecting = 0
+        self._lock = threading.Lock()
+        # Counts, to tell how often connecting was avoided
+        self.connects = 0
+        self.reuses = 0
+
+    @classmethod
+    def get(cls):
+        """Returns the pool of the current process"""
+
+        pid = os.getpid()
+        pool = cls._pools.get(pid)
+        if pool is None:
+            with cls._pools_lock:
+                pool = cls._pools.get(pid)
+                if pool is None:
+                    # Inherited over a fork, never to be used or closed
+                    cls._inherited.extend(cls._pools.values())
+                    cls._pools.clear()
+                    pool = cls._pools[pid] = cls()
+        return pool
+
+    @classmethod
+    def configure(cls, max_size: int = None, health_check_seconds=None):
+        """Sets the defaults, and resizes the current process's pool"""
+
+        if max_size is not None:
+            cls.default_max_size = max_size
+        if health_check_seconds is not None:
+            cls.default_health_check_seconds = health_check_seconds
+        pool = cls.get()
+        pool.max_size = cls.default_max_size
+        pool.health_check_seconds = cls.default_health_check_seconds
+        pool.trim()
+
+    def checkout(self, creds: dict, cursor_factory=None):
+        """Returns an open autocommit connection with these credentials
+
+        creds are the kwargs of psycopg2.connect, see
+        Config.get_db_creds. cursor_factory is the default of
+        conn.cursor().
+        """
+
+        key = self._get_key(creds)
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle and conn is None:
+                conn, returned_at = idle.pop()
+                if not self._is_healthy(conn, returned_at):
+                    self._close(conn)
+                    conn = None
+            if conn is not None:
+                self.reuses += 1
+                self._checked_out.add(id(conn))
+            # Reserved before connecting, so threads can't overshoot
+            pooled = self.size < self.max_size
+            if conn is None and pooled:
+                self._connecting += 1
+        if conn is None:
+            try:
+                conn = self._connect(creds)
+            except Exception:
+                with self._lock:
+                    self._connecting -= int(pooled)
+                raise
+            with self._lock:
+                self._connecting -= int(pooled)
+                # Past max_size, so it's closed on return
+                (self._checked_out if pooled else self._overflow).add(id(conn))
+        conn.cursor_factory = cursor_factory
+        return conn
+
+    def checkin(self, conn, creds: dict):
+        """Returns a connection, which is closed if it can't be reused
+
+        A connection from another process (checked out before a fork)
+        is only kept referenced, since closing it would close it for
+        the process that owns it.
+        """
+
+        with self._lock:
+            if id(conn) in self._checked_out:
+                self._checked_out.discard(id(conn))
+                if self._is_healthy(conn, time.monotonic()):
+                    # In case it was changed, since it's idle
+                    conn.autocommit = True
+                    self._idle.setdefault(self._get_key(creds), []).append(
+                        (conn, time.monotonic()))
+                    return
+            elif id(conn) in self._overflow:
+                self._overflow.discard(id(conn))
+            else:
+                self._inherited.append(conn)
+                return
+        self._close(conn)
+
+    @property
+    def idle_count(self) -> int:
+        """Returns the number of idle connections"""
+
+        return sum(len(x) for x in self._idle.values())
+
+    @property
+    def size(self) -> int:
+        """Returns the number of pooled connections, idle or not"""
+
+        return len(self._checked_out) + self._connecting + self.idle_count
+
+    def trim(self):
+        """Closes idle connections beyond max_size"""
+
+        with self._lock:
+            while self.size > self.max_size:
+                idle = max(self._idle.values(), key=len)
+                if not idle:
+                    break
+                # Oldest first
+                self._close(idle.pop(0)[0])
+
+    def close_all(self):
+        """Closes every idle connection of this process"""
+
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, _ in idle:
+                    self._close(conn)
+            self._idle = {}
+
+########################
+### Helper Functions ###
+########################
+
+    def _connect(self, creds: dict):
+        """Connects to the db, retrying in case it's somehow off"""
+
+        for i in range(10):
+            try:
+                conn = psycopg2.connect(**creds)
+                logging.debug("Database Connected")
+                # Automatically execute queries
+                conn.autocommit = True
+                self.connects += 1
+                return conn
+            except psycopg2.OperationalError as e:
+                logging.warning(f"Couldn't connect to db {e}")
+                time.sleep(10)
+        raise psycopg2.OperationalError("Couldn't connect to db")
+
+    def _is_healthy(self, conn, returned_at: float) -> bool:
+        """Returns True if conn can be handed out
+
+        Only connections that have been idle for a while are pinged.
+        """
+
+        if conn.closed or (conn.info.transaction_status
+                           != psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+            return False
+        if time.monotonic() - returned_at < self.health_check_seconds:
+            return True
+        try:
+            with conn.cursor(
+                    cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        """Closes a connection, ignoring ones that are already broken"""
+
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @staticmethod
+    def _get_key(creds: dict) -> tuple:
+        """Returns a hashable key of the credentials"""
+
+        return tuple(sorted((k, str(v)) for k, v in creds.items()
+                            if k != "cursor_factory"))
@@ -11,17 +11,27 @@ __email__ = "jfuruness@gmail.com"
 __status__ = "Development"
 
 
+from io import BytesIO
+from itertools import count
 import logging
 from multiprocessing import cpu_count
 import os
-import time
+import re
+from time import perf_counter
 
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 
+from .binary_copy_decoder import Binary_Copy_Decoder
 from .config import Config
 from . import config
+from .connection_pool import Connection_Pool
+from .metadata_cache import Metadata_Cache
 from .postgres import Postgres
+from .query_profiler import Query_Profiler
+from .query_stream import Query_Stream
 
 from ..logger import config_logging
 from .. import utils
@@ -30,7 +40,12 @@ from .. import utils
 class Database(Postgres):
     """Interact with the database"""
 
-    __slots__ = ['conn', 'cursor', '_clear']
+    __slots__ = ['conn', 'cursor', '_clear', '_creds']
+
+    # Rows fetched per round trip by stream
+    default_itersize = 10000
+    # Names the server side cursors of stream
+    _stream_ids = count()
 
     def __init__(self, cursor_factory=RealDictCursor, clear=False):
         """Create a new connection with the database"""
@@ -52,8 +67,7 @@ class Database(Postgres):
         if self._clear and hasattr(self, "clear_table"):
             self.clear_table()
         # Create the tables if possible
-        if hasattr(self, "_create_tables"):
-            self._create_tables()
+        self._ensure_tables()
         return self
 
     def __exit__(self, type, value, traceback):
@@ -64,45 +78,191 @@ class Database(Postgres):
     def _connect(self, cursor_factory=RealDictCursor):
         """Connects to db with default RealDictCursor.
 
-        Note that RealDictCursor returns everything as a dictionary."""
+        Note that RealDictCursor returns everything as a dictionary.
+        The connection is checked out of this process's pool, and is
+        only opened if there's no idle one, see Connection_Pool."""
 
         # Database needs access to the section header
-        kwargs = Config().get_db_creds()
-        if cursor_factory:
-            kwargs["cursor_factory"] = cursor_factory
-        # In case the database is somehow off we wait
-        for i in range(10):
-            try:
-                conn = psycopg2.connect(**kwargs)
-
-                logging.debug("Database Connected")
-                self.conn = conn
-                # Automatically execute queries
-                self.conn.autocommit = True
-                self.cursor = conn.cursor()
-                break
-            except psycopg2.OperationalError as e:
-                logging.warning(f"Couldn't connect to db {e}")
-                time.sleep(10)
-        if hasattr(self, "_create_tables"):
-            # Creates tables if do not exist
+        self._creds = Config().get_db_creds()
+        self.conn = Connection_Pool.get().checkout(self._creds,
+                                                   cursor_factory)
+        self.cursor = self.conn.cursor()
+        # Creates tables if do not exist
+        self._ensure_tables()
+
+    def _ensure_tables(self):
+        """Runs _create_tables, unless it already ran in this process
+
+        Only tables with a name are remembered, see Metadata_Cache.
+        """
+
+        if not hasattr(self, "_create_tables"):
+            return
+        name = getattr(self, "name", None)
+        database = self._creds["database"]
+        if name is None or not Metadata_Cache.has_table(database, name):
             self._create_tables()
+            if name is not None:
+                Metadata_Cache.add_table(database, name)
 
     def execute(self, sql: str, data: iter = []) -> list:
-        """Executes a query. Returns [] if no results."""
+        """Executes a query. Returns [] if no results.
+
+        If Query_Profiler is enabled, the statement is recorded. If
+        this Table's table is missing even though Metadata_Cache says
+        it exists, it's created again and the query is retried once,
+        see _forget_missing_table."""
 
         assert (isinstance(data, list)
                 or isinstance(data, tuple)), "Data must be list/tuple"
 
-        self.cursor.execute(sql, data)
+        start = perf_counter()
+        try:
+            self.cursor.execute(sql, data)
+        except psycopg2.errors.UndefinedTable as e:
+            if not self._forget_missing_table(e):
+                raise
+            start = perf_counter()
+            self.cursor.execute(sql, data)
+        if Query_Profiler.enabled:
+            Query_Profiler.record(self,
+                                  sql,
+                                  data,
+                                  perf_counter() - start,
+                                  self.cursor.rowcount)
+        Metadata_Cache.invalidate_sql(self._creds["database"], sql)
 
         try:
             return self.cursor.fetchall()
         except psycopg2.ProgrammingError as e:
             return []
 
+    def _forget_missing_table(self, error) -> bool:
+        """Forgets a cached table that doesn't exist, True to retry
+
+        Metadata_Cache only sees schema changes made through execute
+        in this process. A table dropped by another process (or with
+        cursor.execute) is still cached, so _create_tables is skipped
+        for it. Its entry is removed, and if it's this Table's table,
+        it's created again so the query can be retried.
+        """
+
+        match = re.search(r'relation "([^"]+)" does not exist', str(error))
+        if match is None:
+            return False
+        name = match.group(1).split(".")[-1]
+        database = self._creds["database"]
+        # Not cached, so the cache isn't why it's missing
+        if not Metadata_Cache.has_table(database, name):
+            return False
+        logging.debug(f"{name} was dropped elsewhere, forgetting it")
+        Metadata_Cache.invalidate(database, name)
+        if name != getattr(self, "name", None):
+            return False
+        self._ensure_tables()
+        return True
+
+    def fetch(self, sql: str, data: iter = [], mode: str = "tuples"):
+        """Returns all results of a query, in a fetch mode other than dicts
+
+        mode can be:
+            tuples - a list of tuples
+            numpy - {column name: NumPy array}
+            arrow - a pyarrow Table (pyarrow is optional, see setup.py)
+
+        For numpy and arrow, the query is copied out in postgres's
+        binary format and decoded into arrays all at once when every
+        column is a fixed width type without NULLs, see
+        Binary_Copy_Decoder. Otherwise the tuples are made into arrays.
+        Either way, sql must be a query (it's run as a subquery).
+        """
+
+        assert (isinstance(data, list)
+                or isinstance(data, tuple)), "Data must be list/tuple"
+        assert mode in ["tuples", "numpy", "arrow"], f"Invalid mode {mode}"
+
+        with self.conn.cursor(
+                cursor_factory=psycopg2.extensions.cursor) as cursor:
+            if mode == "tuples":
+                cursor.execute(sql, data)
+                return cursor.fetchall()
+            columns = self._fetch_columns(cursor, sql, data)
+        if mode == "numpy":
+            return columns
+        # Imported here since it's optional
+        import pyarrow
+        return pyarrow.table(columns)
+
+    def stream(self,
+               sql: str,
+               data: iter = [],
+               itersize: int = None,
+               batches: bool = False,
+               cursor_factory=None) -> Query_Stream:
+        """Returns the rows of a query lazily, instead of all at once
+
+        The query is run on a named (server side) cursor, and itersize
+        rows are fetched per round trip, so memory stays constant no
+        matter how large the result is. If batches, lists of up to
+        itersize rows are yielded instead of rows. cursor_factory
+        defaults to the one of this Database.
+
+        The cursor needs a transaction, so it's opened on another
+        connection of the pool, which leaves this one free for queries
+        while streaming. Temp tables of this connection are therefore
+        not visible to the query.
+
+        Callers that might not read every row must close the stream,
+        or use it as a context manager, so that the connection and its
+        transaction aren't held on to. See Query_Stream.
+        """
+
+        assert (isinstance(data, list)
+                or isinstance(data, tuple)), "Data must be list/tuple"
+
+        itersize = itersize or self.default_itersize
+        if cursor_factory is None:
+            cursor_factory = self.conn.cursor_factory
+        return Query_Stream(self._stream(sql,
+                                         data,
+                                         itersize,
+                                         batches,
+                                         cursor_factory))
+
+    def _stream(self, sql, data, itersize, batches, cursor_factory):
+        """Yields rows for stream, and gives the connection back when closed"""
+
+        pool = Connection_Pool.get()
+        conn = pool.checkout(self._creds, cursor_factory)
+        try:
+            conn.autocommit = False
+            name = f"stream_{os.getpid()}_{next(self._stream_ids)}"
+            with conn.cursor(name) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(sql, data)
+                if batches:
+                    rows = cursor.fetchmany(itersize)
+                    while rows:
+                        yield rows
+                        rows = cursor.fetchmany(itersize)
+                else:
+                    yield from cursor
+        finally:
+            try:
+                # Nothing was written, so nothing to commit
+                conn.rollback()
+                conn.autocommit = True
+            except psycopg2.Error:
+                # Broken, the pool will close it
+                pass
+            pool.checkin(conn, self._creds)
+
     def multiprocess_execute(self, sqls: list):
-        """Executes sql statements in parallel"""
+        """Executes sql statements in parallel
+
+        Each worker process reuses one connection from its own pool
+        for all of its statements.
+        """
 
         # Must close so connection isn't duplicated
         self.close()
@@ -110,13 +270,17 @@ class Database(Postgres):
             db_pool.map(lambda self, sql: self._reconnect_execute(sql),
                         [self]*len(sqls),
                         sqls)
+        # The workers' caches are separate from this process's
+        for sql in sqls:
+            Metadata_Cache.invalidate_sql(self._creds["database"], sql)
         self.__init__()
 
     def _reconnect_execute(self, sql: str):
         """To be used for parellel queries.
 
         In parallel queries, one connection between multiple processes
-        is not allowed.
+        is not allowed. Connecting and closing check the connection out
+        of and back into the worker's pool, so it's only opened once.
         """
 
         # Connect to db
@@ -126,11 +290,35 @@ class Database(Postgres):
         # Close db
         self.close()
 
+    def _fetch_columns(self, cursor, sql: str, data: iter) -> dict:
+        """Returns {column name: NumPy array} of the results of sql"""
+
+        query = cursor.mogrify(sql, data).decode().strip().rstrip(";")
+        # Gets the column types without running the query
+        cursor.execute(f"SELECT * FROM ({query}) columnar_query LIMIT 0")
+        decoder = Binary_Copy_Decoder(cursor.description)
+        if decoder.dtype is not None:
+            buf = BytesIO()
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT BINARY)",
+                               buf)
+            columns = decoder.decode(buf.getbuffer())
+            if columns is not None:
+                return columns
+        cursor.execute(query)
+        return decoder.rows_to_columns(cursor.fetchall(), decoder.names)
+
     def close(self):
-        """Closes the database connection correctly"""
+        """Returns the database connection to the pool
+
+        Safe to call more than once.
+        """
 
+        if self.conn is None:
+            return
         self.cursor.close()
-        self.conn.close()
+        Connection_Pool.get().checkin(self.conn, self._creds)
+        # So that it can't be used once another Database checks it out
+        self.conn = None
 
     def vacuum_analyze_checkpoint(self, full=False):
         """Vaccums, analyzes, and checkpoints.
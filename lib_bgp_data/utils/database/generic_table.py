@@ -18,6 +18,10 @@ fill_table - fills table with data, sometimes unessecary
 clear_table - inherited, clears table
 
 There are also some convenience funcs, documented below
+
+Subclasses are checked once, when they are defined, rather than every
+time they're made. Whether the table exists and its columns are cached
+for the process, see Metadata_Cache.
 """
 
 # Document the convenience funcs in readme!
@@ -38,6 +42,7 @@ import os
 import time
 
 from .database import Database
+from .metadata_cache import Metadata_Cache
 
 
 # SHOULD INHERIT DECOMETA!
@@ -47,19 +52,29 @@ class Generic_Table(Database):
 
     __slots__ = ["name"]
 
-    def __init__(self, *args, **kwargs):
-        """Asserts that name is set
+    def __init_subclass__(cls, **kwargs):
+        """Makes sure sql queries are formed properly
 
-        Makes sure sql queries are formed properly"""
+        Done once when the class is defined, rather than on every init"""
 
-        assert hasattr(self, "name"), "Inherited class MUST have a table name attr"
+        super().__init_subclass__(**kwargs)
         unlogged_err = ("Create unlogged tables for speed.\n Ex:"
                         "CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}...")
         # https://stackoverflow.com/a/427533/8903959
-        if "create table" in inspect.getsource(self.__class__):
+        try:
+            source = inspect.getsource(cls)
+        # Classes made without a source file can't be checked
+        except (OSError, TypeError):
+            return
+        if "create table" in source:
             raise Exception(unlogged_err + "\n And also capitalize SQL")
-        if "CREATE TABLE" in inspect.getsource(self.__class__):
+        if "CREATE TABLE" in source:
             raise Exception(unlogged_err)
+
+    def __init__(self, *args, **kwargs):
+        """Asserts that name is set"""
+
+        assert hasattr(self, "name"), "Inherited class MUST have a table name attr"
         super(Generic_Table, self).__init__(*args, **kwargs)
 
     def get_all(self) -> list:
@@ -67,6 +82,16 @@ class Generic_Table(Database):
 
         return self.execute(f"SELECT * FROM {self.name}")
 
+    def stream_all(self, itersize: int = None, batches: bool = False):
+        """Returns all rows from table lazily, see Database.stream
+
+        Close the stream (or use it with with) if not every row is read.
+        """
+
+        return self.stream(f"SELECT * FROM {self.name}",
+                           itersize=itersize,
+                           batches=batches)
+
     def get_count(self, sql: str = None, data: list = []) -> int:
         """Gets count from table"""
 
@@ -79,6 +104,7 @@ class Generic_Table(Database):
 
         logging.debug(f"Dropping {self.name} Table")
         self.cursor.execute(f"DROP TABLE IF EXISTS {self.name}")
+        Metadata_Cache.invalidate(self._creds["database"], self.name)
         logging.debug(f"{self.name} Table dropped")
 
     def copy_table(self, path: str):
@@ -103,12 +129,22 @@ class Generic_Table(Database):
     def columns(self) -> list:
         """Returns the columns of the table
 
-        used in utils to insert csv into the database"""
+        used in utils to insert csv into the database. Cached until the
+        table's schema is changed, see Metadata_Cache"""
 
+        database = self._creds["database"]
+        columns = Metadata_Cache.get_columns(database, self.name)
+        if columns is not None:
+            return list(columns)
         sql = """SELECT column_name FROM information_schema.columns
-              WHERE table_schema = 'public' AND table_name = %s;
+              WHERE table_schema = 'public' AND table_name = %s
+              ORDER BY ordinal_position;
               """
         self.cursor.execute(sql, [self.name])
         # Make sure that we don't get the _id columns
-        return [x['column_name'] for x in self.cursor.fetchall()
-                if "_id" not in x['column_name']]
+        columns = [x['column_name'] for x in self.cursor.fetchall()
+                   if "_id" not in x['column_name']]
+        # Doesn't exist yet, so it's not cached
+        if columns:
+            Metadata_Cache.set_columns(database, self.name, columns)
+        return columns
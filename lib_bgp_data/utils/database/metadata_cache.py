@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Metadata_Cache
+
+The purpose of this class is to remember, for the process, which tables
+exist and what their columns are. Every Generic_Table used to run its
+_create_tables (twice, on connect and on enter) and query
+information_schema for its columns every time, and the simulator makes
+thousands of them. Once a table has been created by a Table class in
+this process, _create_tables is skipped, and its columns are read once.
+
+Design choices:
+    -Entries are removed when this process changes a table's schema:
+     Database.execute invalidates the tables named in any CREATE,
+     DROP or ALTER statement, and clear_table invalidates its table.
+     A DDL statement that names no table or index (DROP SCHEMA, a DO
+     block) clears everything
+    -Only tables known to exist are cached, never tables known not to,
+     so a table made by another process is never missed
+    -Changes made by other processes (or the extrapolator, or raw
+     cursor.execute calls) can't be seen, so code that depends on
+     those can call clear. If a cached table turns out to be gone,
+     Database.execute forgets it, and if it's the Table's own table,
+     creates it again and retries the query once
+    -Keys include the database, since there can be more than one
+    -A forked child keeps its parent's cache, since the tables are
+     the same
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import re
+
+
+class Metadata_Cache:
+    """Remembers which tables exist, and their columns, for the process.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = []
+
+    # (database, table name) of tables created by their Table class
+    _tables = set()
+    # (database, table name): list of column names
+    _columns = {}
+
+    _ddl_re = re.compile(r"\b(CREATE|DROP|ALTER)\b", re.IGNORECASE)
+    # Indexes don't change what's cached
+    _index_re = re.compile(r"\b(CREATE\s+(UNIQUE\s+)?INDEX|DROP\s+INDEX)\b",
+                           re.IGNORECASE)
+    _table_re = re.compile(r"\b(?:TABLE|VIEW)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?"
+                           r"((?:ONLY\s+)?[\w.]+(?:\s*,\s*[\w.]+)*)",
+                           re.IGNORECASE)
+
+    @classmethod
+    def has_table(cls, database: str, name: str) -> bool:
+        """Returns True if the table was created in this process"""
+
+        return (database, name) in cls._tables
+
+    @classmethod
+    def add_table(cls, database: str, name: str):
+        """Remembers that the table exists"""
+
+        cls._tables.add((database, name))
+
+    @classmethod
+    def get_columns(cls, database: str, name: str) -> list:
+        """Returns the cached columns of a table, or None"""
+
+        return cls._columns.get((database, name))
+
+    @classmethod
+    def set_columns(cls, database: str, name: str, columns: list):
+        """Caches the columns of a table"""
+
+        cls._columns[(database, name)] = list(columns)
+
+    @classmethod
+    def invalidate(cls, database: str, name: str):
+        """Forgets a table, after its schema changes"""
+
+        cls._tables.discard((database, name))
+        cls._columns.pop((database, name), None)
+
+    @classmethod
+    def invalidate_sql(cls, database: str, sql: str):
+        """Forgets the tables whose schema sql changes, if any"""
+
+        if not cls._ddl_re.search(sql):
+            return
+        names = []
+        for match in cls._table_re.findall(sql):
+            match = re.sub(r"^ONLY\s+", "", match, flags=re.IGNORECASE)
+            names.extend(x.strip().split(".")[-1].lower()
+                         for x in match.split(","))
+        if not names and not cls._index_re.search(sql):
+            cls.clear()
+        for name in names:
+            cls.invalidate(database, name)
+
+    @classmethod
+    def clear(cls):
+        """Forgets everything"""
+
+        cls._tables = set()
+        cls._columns = {}
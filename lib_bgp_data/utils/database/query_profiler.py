@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Query_Profiler
+
+The purpose of this class is to find the slow sql of a run. Long
+statements (the metadata joins, Monitors_Table, the forwarding table
+self joins) were only visible as gaps between log timestamps. When the
+profiler is enabled, every statement run by Database.execute is
+written to a JSONL file with its duration and rowcount. The first time
+a statement takes longer than threshold_seconds, its plan is captured
+with EXPLAIN (FORMAT JSON) and written with it. report then ranks
+statements by their total time in a run.
+
+A Parser is profiled with profile_queries=True (or a threshold in
+seconds), and the report is logged when it ends. With
+profile_analyze=True, plans are captured with EXPLAIN (ANALYZE,
+BUFFERS, FORMAT JSON) instead.
+
+Only statements run by Database.execute are recorded. Statements run
+with cursor.execute or copy_expert directly (COPY in utils, the
+streaming cursors of Database.stream, etc.) are not.
+
+Design choices:
+    -A JSONL file rather than a table, since writing to a table would
+     run more statements through execute, and the file can be read
+     after a run that crashed. Workers that are forked while profiling
+     is enabled append to the same file
+    -Statements are grouped by their sql with whitespace collapsed,
+     without their data, so the same query with different values is
+     one entry
+    -Plans are captured with plain EXPLAIN by default, which only
+     plans the statement, on the same connection. EXPLAIN ANALYZE
+     would run the slow statement a second time, and DML would run
+     against data the first run already changed, so the plan wouldn't
+     be the one that ran. It's opt in with analyze, and then runs on
+     another connection in a transaction that's rolled back
+    -Plans are captured once per statement (plans already in the file
+     aren't captured again). For CREATE TABLE AS only the query is
+     explained. Statements EXPLAIN doesn't support (CREATE INDEX,
+     VACUUM, etc.) are only timed
+    -Failing to explain is logged and never fails the statement
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from datetime import datetime
+from hashlib import blake2b
+import json
+import logging
+import os
+import re
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+from .connection_pool import Connection_Pool
+
+
+class Query_Profiler:
+    """Records the duration and plans of sql statements.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = []
+
+    enabled = False
+    default_path = "/tmp/lib_bgp_data_query_profile.jsonl"
+    path = default_path
+    threshold_seconds = 60
+    explain = True
+    analyze = False
+
+    # Fingerprints of statements that have a plan in the file
+    _explained = set()
+    # When profiling was enabled, the start of the run that's reported
+    _enabled_at = None
+    _lock = threading.Lock()
+
+    _whitespace_re = re.compile(r"\s+")
+    # Statements that EXPLAIN ANALYZE can run
+    _explainable_re = re.compile(r"^\s*\(?\s*(SELECT|WITH|VALUES|INSERT"
+                                 r"|UPDATE|DELETE)\b", re.IGNORECASE)
+    # CREATE TABLE AS, the query is group 1
+    _create_as_re = re.compile(r"^\s*CREATE\s+(?:UNLOGGED\s+|TEMP\s+"
+                               r"|TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+"
+                               r"EXISTS\s+)?[\w.]+\s+AS\s+(.*)$",
+                               re.IGNORECASE | re.DOTALL)
+
+    @classmethod
+    def enable(cls, path: str = None, threshold_seconds: float = None,
+               explain: bool = True, analyze: bool = False):
+        """Starts profiling Database.execute in this process
+
+        Statements that take longer than threshold_seconds are
+        explained, if explain. If analyze, they're run again with
+        EXPLAIN ANALYZE. Records are appended to path.
+        """
+
+        cls.path = path or cls.default_path
+        if threshold_seconds is not None:
+            cls.threshold_seconds = threshold_seconds
+        cls.explain = explain
+        cls.analyze = analyze
+        cls._explained = {x["fingerprint"] for x in cls.read(cls.path)
+                          if "plan" in x}
+        cls._enabled_at = datetime.now().isoformat()
+        cls.enabled = True
+        logging.info(f"Profiling queries to {cls.path}")
+
+    @classmethod
+    def disable(cls):
+        """Stops profiling"""
+
+        cls.enabled = False
+
+    @classmethod
+    def record(cls, db, sql: str, data: iter, seconds: float, rowcount: int):
+        """Writes a statement's record, explaining it if it's slow
+
+        db is the Database that ran it.
+        """
+
+        statement = cls.normalize(sql)
+        fingerprint = blake2b(statement.encode(), digest_size=8).hexdigest()
+        record = {"pid": os.getpid(),
+                  "at": datetime.now().isoformat(),
+                  "fingerprint": fingerprint,
+                  "statement": statement,
+                  "seconds": seconds,
+                  "rowcount": rowcount}
+        if cls.explain and seconds >= cls.threshold_seconds:
+            with cls._lock:
+                first = fingerprint not in cls._explained
+                cls._explained.add(fingerprint)
+            if first:
+                plan = cls._explain(db, sql, data)
+                if plan is not None:
+                    record["plan"] = plan
+        line = json.dumps(record, default=str) + "\n"
+        with cls._lock:
+            # One write per record, so processes don't interleave lines
+            with open(cls.path, "a") as f:
+                f.write(line)
+
+    @classmethod
+    def report(cls, path: str = None, top: int = 20, since: str = None) -> list:
+        """Returns the top statements by total time, slowest first
+
+        Each is a dict of statement, calls, total, mean and max
+        seconds, rows, and plan (the captured plan or None). If since
+        (an isoformat time), only records from then on are counted.
+        """
+
+        stats = {}
+        # Plans are captured once, so they can be from an earlier run
+        plans = {}
+        for record in cls.read(path or cls.path):
+            if "plan" in record:
+                plans[record["fingerprint"]] = record["plan"]
+            if since is not None and record["at"] < since:
+                continue
+            stat = stats.setdefault(record["fingerprint"],
+                                    {"statement": record["statement"],
+                                     "calls": 0,
+                                     "total_seconds": 0,
+                                     "max_seconds": 0,
+                                     "rows": 0})
+            stat["calls"] += 1
+            stat["total_seconds"] += record["seconds"]
+            stat["max_seconds"] = max(stat["max_seconds"], record["seconds"])
+            stat["rows"] += max(record["rowcount"], 0)
+        for fingerprint, stat in stats.items():
+            stat["mean_seconds"] = stat["total_seconds"] / stat["calls"]
+            stat["plan"] = plans.get(fingerprint)
+        return sorted(stats.values(),
+                      key=lambda x: x["total_seconds"],
+                      reverse=True)[:top]
+
+    @classmethod
+    def log_report(cls, path: str = None, top: int = 20):
+        """Logs the report since profiling was enabled, see report"""
+
+        lines = [f"Top {top} statements by total time:"]
+        for stat in cls.report(path, top, cls._enabled_at):
+            lines.append(f"{stat['total_seconds']:>10.2f}s "
+                         f"{stat['calls']:>6} calls "
+                         f"{stat['max_seconds']:>9.2f}s max "
+                         f"{'(plan) ' if stat['plan'] else ''}"
+                         f"{stat['statement'][:100]}")
+        logging.info("\n".join(lines))
+
+    @staticmethod
+    def read(path: str) -> list:
+        """Returns the records in a profile file"""
+
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(x) for x in f if x.strip()]
+
+    @classmethod
+    def normalize(cls, sql: str) -> str:
+        """Returns sql with whitespace collapsed"""
+
+        return cls._whitespace_re.sub(" ", sql).strip()
+
+########################
+### Helper Functions ###
+########################
+
+    @classmethod
+    def _get_explainable(cls, sql: str) -> str:
+        """Returns the part of sql that can be explained, or None"""
+
+        match = cls._create_as_re.match(sql)
+        if match:
+            sql = match.group(1).strip()
+        if cls._explainable_re.match(sql):
+            return sql
+        return None
+
+    @classmethod
+    def _explain(cls, db, sql: str, data: iter):
+        """Returns the EXPLAIN plan of sql, or None
+
+        With analyze, see _explain_analyze.
+        """
+
+        explainable = cls._get_explainable(sql)
+        if explainable is None:
+            return None
+        if cls.analyze:
+            return cls._explain_analyze(db, sql, explainable, data)
+        try:
+            with db.conn.cursor(
+                    cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + explainable, data)
+                plan = cursor.fetchone()[0]
+            logging.debug(f"Captured plan of {cls.normalize(sql)[:100]}")
+            return plan
+        except psycopg2.Error as e:
+            logging.warning(f"Couldn't explain {cls.normalize(sql)[:100]}: {e}")
+            return None
+
+    @classmethod
+    def _explain_analyze(cls, db, sql: str, explainable: str, data: iter):
+        """Returns the EXPLAIN ANALYZE plan of explainable, or None
+
+        Run in a transaction that's rolled back, on another connection.
+        """
+
+        pool = Connection_Pool.get()
+        conn = pool.checkout(db._creds, psycopg2.extensions.cursor)
+        try:
+            conn.autocommit = False
+            with conn.cursor() as cursor:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+                               + explainable, data)
+                plan = cursor.fetchone()[0]
+            logging.debug(f"Captured plan of {cls.normalize(sql)[:100]}")
+            return plan
+        except psycopg2.Error as e:
+            logging.warning(f"Couldn't explain {cls.normalize(sql)[:100]}: {e}")
+            return None
+        finally:
+            try:
+                conn.rollback()
+                conn.autocommit = True
+            except psycopg2.Error:
+                # Broken, the pool will close it
+                pass
+            pool.checkin(conn, db._creds)
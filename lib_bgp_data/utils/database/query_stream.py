@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class Query_Stream
+
+The purpose of this class is to hand out the rows of Database.stream,
+and to make sure that the connection it streams from is given back.
+The rows come from a named cursor in a transaction on a connection
+checked out of the Connection_Pool. A plain generator only gives them
+back once it's run to the end or garbage collected, so a caller that
+breaks out of a loop would keep the connection checked out, with its
+transaction (and the locks and snapshot of it) open.
+
+Callers that might not read every row must close the stream, either
+with close or by using it as a context manager:
+
+    with db.stream(sql) as rows:
+        for row in rows:
+            ...
+
+Design choices:
+    -Nothing is checked out until the first row is asked for, so a
+     stream that's never read holds nothing
+    -close can be called more than once, and is also called when the
+     stream is garbage collected, as a last resort
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+
+class Query_Stream:
+    """Iterator over streamed rows that gives back its connection.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["_rows"]
+
+    def __init__(self, rows):
+        """Takes the generator of rows, which cleans up when closed"""
+
+        self._rows = rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """Closes the stream, see close"""
+
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Closes the cursor and checks the connection back in"""
+
+        self._rows.close()
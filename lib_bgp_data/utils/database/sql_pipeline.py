@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class SQL_Pipeline
+
+The purpose of this class is to run the steps that build a set of
+tables (CREATE UNLOGGED TABLE AS, CREATE INDEX, fill_table, etc.) as
+soon as the tables they read are ready, rather than one after another.
+MRT_Metadata_Parser, What_If_Analysis and Graph_Generator all used to
+run long lists of statements in order, even though most of them (the
+indexes on a table, or tables made from the same input) don't depend
+on each other. A run now takes about as long as its critical path,
+rather than the sum of its steps.
+
+Each SQL_Step declares the tables (or indexes) that it reads, its
+inputs, and the ones it writes, its outputs. A step waits for every
+earlier step that writes one of its inputs, reads one of its outputs,
+or writes one of its outputs, so the result is the same as running
+the steps in the order they were added. Steps that can't say what they
+touch are barriers, and wait for everything before them (and
+everything after them waits for them).
+
+Steps that are ready run in a thread pool, each with a connection
+checked out of the Connection_Pool. Every step's timing, and a
+fingerprint of its definition and inputs, is written to
+sql_pipeline_steps. If skip_unchanged is set, a step whose fingerprint
+is the same as last time, and whose outputs still exist, is skipped.
+
+Design choices:
+    -Threads rather than processes, since steps spend their time
+     waiting on postgres, and psycopg2 releases the GIL while it waits
+    -The dependencies are found from inputs and outputs, so that steps
+     can't be run in an order that the list of steps didn't allow
+    -A table's fingerprint is its oid, file, and size (see
+     get_fingerprints), which all change when it's recreated,
+     truncated, or grows. Reading it doesn't scan the table
+    -A step's definition includes the source of every Table class
+     that its func refers to, so changing a fill_table reruns the step
+     even though the lambda that calls it is the same
+    -Lists of statements, such as the what if analysis sql, can be
+     made into a pipeline with from_statements, which reads the tables
+     from the statements
+    -If a step fails, no more steps are started, the running ones are
+     waited for, and the error is raised
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from hashlib import blake2b
+import inspect
+import logging
+from multiprocessing import cpu_count
+import re
+from time import perf_counter
+
+from .database import Database
+from .generic_table import Generic_Table
+
+
+def get_fingerprints(db, names) -> dict:
+    """Returns {relation: fingerprint} of relations and their partitions
+
+    Relations that don't exist are left out. The fingerprint is the
+    oid, file, and size of a relation.
+    """
+
+    sql = """SELECT c.relname,
+                    c.oid::TEXT || ':' || c.relfilenode::TEXT
+                        || ':' || pg_relation_size(c.oid)::TEXT
+                        AS fingerprint
+            FROM pg_class c
+            WHERE c.relname = ANY(%s)
+                OR c.oid IN (SELECT i.inhrelid FROM pg_inherits i
+                             INNER JOIN pg_class p
+                                ON p.oid = i.inhparent
+                             WHERE p.relname = ANY(%s));"""
+    names = list(names)
+    return {x["relname"]: x["fingerprint"]
+            for x in db.execute(sql, [names, names])}
+
+
+class SQL_Pipeline_Steps_Table(Generic_Table):
+    """Class with database functionality
+
+    Holds the last run of every step of every SQL_Pipeline"""
+
+    __slots__ = []
+
+    name = "sql_pipeline_steps"
+
+    columns = ["pipeline", "step", "fingerprint", "seconds", "skipped"]
+
+    def _create_tables(self):
+        """Creates tables if they do not exist"""
+
+        sql = f"""CREATE UNLOGGED TABLE IF NOT EXISTS {self.name}(
+                pipeline TEXT,
+                step TEXT,
+                fingerprint TEXT,
+                seconds DOUBLE PRECISION,
+                skipped BOOLEAN,
+                finished_at TIMESTAMP DEFAULT now()
+                );"""
+        self.execute(sql)
+
+    def get_fingerprint(self, pipeline: str, step: str) -> str:
+        """Returns the fingerprint of the last run of a step, or None"""
+
+        sql = f"""SELECT fingerprint FROM {self.name}
+                WHERE pipeline = %s AND step = %s"""
+        results = self.execute(sql, [pipeline, step])
+        return results[0]["fingerprint"] if results else None
+
+    def record(self, pipeline: str, step: str, fingerprint: str,
+               seconds: float, skipped: bool):
+        """Replaces the last run of a step"""
+
+        sql = f"DELETE FROM {self.name} WHERE pipeline = %s AND step = %s"
+        self.execute(sql, [pipeline, step])
+        sql = f"""INSERT INTO {self.name}({", ".join(self.columns)})
+                VALUES (%s, %s, %s, %s, %s)"""
+        self.execute(sql, [pipeline, step, fingerprint, seconds, skipped])
+
+
+class SQL_Step:
+    """A step of an SQL_Pipeline.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["name", "sqls", "func", "inputs", "outputs", "definition"]
+
+    def __init__(self, name: str, sql=None, func=None, inputs=(),
+                 outputs=(), definition: str = ""):
+        """sql is a statement or list of them, run before func(db)
+
+        inputs and outputs are the names of the tables (or indexes)
+        that the step reads and writes. If inputs is None, the step is
+        a barrier, see the top of the module.
+
+        definition is anything else that the result depends on. It's
+        part of the fingerprint, so changing it reruns the step. The
+        source of the Table classes func refers to is already part of
+        it, see get_definition.
+        """
+
+        assert sql or func, f"{name} has nothing to run"
+        self.name = name
+        self.sqls = [sql] if isinstance(sql, str) else list(sql or [])
+        self.func = func
+        self.inputs = None if inputs is None else list(inputs)
+        self.outputs = list(outputs)
+        self.definition = definition
+
+    @property
+    def barrier(self) -> bool:
+        """True if the step waits for, and is waited on by, all others"""
+
+        return self.inputs is None
+
+    def run(self, db):
+        """Runs the statements, then func, on db"""
+
+        for sql in self.sqls:
+            db.execute(sql)
+        if self.func is not None:
+            self.func(db)
+
+    def get_definition(self) -> str:
+        """Returns what the step runs, for its fingerprint
+
+        func is usually a lambda that calls a Table's fill_table, so
+        the source of the Table (and the Tables it inherits from) is
+        added, since that's the SQL that actually runs.
+        """
+
+        definition = "\n".join([self.definition] + self.sqls)
+        if self.func is not None:
+            definition += self._get_source(self.func)
+            for Table in self._get_tables():
+                for Base in Table.__mro__:
+                    if Base is not Generic_Table and issubclass(
+                            Base, Generic_Table):
+                        definition += self._get_source(Base)
+        return definition
+
+########################
+### Helper Functions ###
+########################
+
+    def _get_tables(self) -> list:
+        """Returns the Table classes that func refers to
+
+        These are found in its default args (lambda db, Table=Table),
+        the variables it closes over, and the globals it names.
+        """
+
+        func = getattr(self.func, "__func__", self.func)
+        code = getattr(func, "__code__", None)
+        if code is None:
+            return []
+        values = list(func.__defaults__ or [])
+        values += [x.cell_contents for x in func.__closure__ or []
+                   if x.cell_contents is not None]
+        values += [func.__globals__[x] for x in code.co_names
+                   if x in func.__globals__]
+        tables = []
+        for value in values:
+            if (inspect.isclass(value)
+                    and issubclass(value, Generic_Table)
+                    and value not in tables):
+                tables.append(value)
+        return tables
+
+    @staticmethod
+    def _get_source(obj) -> str:
+        """Returns the source of obj, or its name if there is none"""
+
+        try:
+            return inspect.getsource(obj)
+        except (OSError, TypeError):
+            return getattr(obj, "__qualname__", repr(obj))
+
+
+class SQL_Pipeline:
+    """Runs SQL_Steps concurrently in dependency order.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["name", "steps", "workers", "skip_unchanged", "timings"]
+
+    def __init__(self, name: str, steps=(), workers: int = None,
+                 skip_unchanged: bool = False):
+        """workers defaults to the number of cpus"""
+
+        self.name = name
+        self.steps = list(steps)
+        self.workers = workers or cpu_count()
+        self.skip_unchanged = skip_unchanged
+        # step name: seconds, None if it was skipped
+        self.timings = {}
+
+    def add(self, *args, **kwargs) -> SQL_Step:
+        """Adds a step, args are those of SQL_Step"""
+
+        step = SQL_Step(*args, **kwargs)
+        assert step.name not in {x.name for x in self.steps},\
+            f"{step.name} was already added"
+        self.steps.append(step)
+        return step
+
+    @classmethod
+    def from_statements(cls, name: str, sqls: list, **kwargs):
+        """Returns a pipeline with one step per statement
+
+        The tables a statement reads and writes are read from it, for
+        DROP TABLE, CREATE TABLE (AS), CREATE INDEX and ALTER TABLE.
+        Anything else is a barrier. A statement that reads a table
+        waits for the indexes on it that were created before it.
+
+        Unnamed indexes have no name to check for, so their steps are
+        never skipped. Don't use skip_unchanged with these statements,
+        or indexes will be created twice.
+        """
+
+        pipeline = cls(name, **kwargs)
+        # table: the names of the index steps on it
+        indexes = {}
+        for i, sql in enumerate(sqls):
+            inputs, outputs, verb = cls._parse(sql)
+            if verb == "index":
+                index = f"{outputs[0]}_index_{i}"
+                indexes.setdefault(outputs[0], []).append(index)
+                outputs = [index]
+            elif verb == "drop":
+                indexes.pop(outputs[0], None)
+            elif inputs is not None:
+                for table in list(inputs):
+                    inputs.extend(indexes.get(table, []))
+            name = f"{i}_{verb}_{outputs[0]}" if outputs else f"{i}_{verb}"
+            pipeline.add(name,
+                         sql=sql,
+                         inputs=inputs,
+                         outputs=outputs)
+        return pipeline
+
+    def get_dependencies(self) -> dict:
+        """Returns {step name: names of steps it must wait for}"""
+
+        dependencies = {}
+        barrier = None
+        for i, step in enumerate(self.steps):
+            if step.barrier:
+                dependencies[step.name] = {x.name for x in self.steps[:i]}
+                barrier = step
+                continue
+            deps = set() if barrier is None else {barrier.name}
+            reads, writes = set(step.inputs), set(step.outputs)
+            for earlier in self.steps[:i]:
+                if earlier.barrier:
+                    continue
+                if (set(earlier.outputs) & (reads | writes)
+                        or set(earlier.inputs) & writes):
+                    deps.add(earlier.name)
+            dependencies[step.name] = deps
+        return dependencies
+
+    def get_critical_path(self, timings: dict = None) -> float:
+        """Returns the seconds of the longest chain of dependent steps"""
+
+        timings = self.timings if timings is None else timings
+        dependencies = self.get_dependencies()
+        # step name: seconds until it's done
+        finish = {}
+        for step in self.steps:
+            finish[step.name] = (max((finish[x] for x in
+                                      dependencies[step.name]), default=0)
+                                 + (timings.get(step.name) or 0))
+        return max(finish.values(), default=0)
+
+    def run(self) -> dict:
+        """Runs every step, returns {step name: seconds}
+
+        Skipped steps take None seconds.
+        """
+
+        self.timings = {}
+        dependencies = self.get_dependencies()
+        steps = {x.name: x for x in self.steps}
+        done = set()
+        # future: step name
+        running = {}
+        error = None
+        start = perf_counter()
+        logging.info(f"Running {len(self.steps)} steps of {self.name}")
+        with ThreadPoolExecutor(self.workers) as executor:
+            while len(done) < len(steps):
+                if error is None:
+                    for name, deps in dependencies.items():
+                        if (name not in done
+                                and name not in running.values()
+                                and deps <= done):
+                            future = executor.submit(self._run_step,
+                                                     steps[name])
+                            running[future] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        logging.error(f"{self.name} step {name} failed")
+                        error = error or future.exception()
+                    else:
+                        done.add(name)
+        if error is not None:
+            raise error
+        self._log_timings(perf_counter() - start)
+        return self.timings
+
+########################
+### Helper Functions ###
+########################
+
+    def _run_step(self, step: SQL_Step):
+        """Runs or skips a step with a connection from the pool"""
+
+        with Database() as db:
+            inputs = get_fingerprints(db, step.inputs or [])
+            fingerprint = blake2b(
+                repr((step.get_definition(), sorted(inputs.items()))).encode(),
+                digest_size=16).hexdigest()
+            with SQL_Pipeline_Steps_Table() as steps_db:
+                skip = (self.skip_unchanged
+                        and not step.barrier
+                        and steps_db.get_fingerprint(self.name, step.name)
+                        == fingerprint
+                        and len(get_fingerprints(db, step.outputs))
+                        >= len(set(step.outputs)))
+                start = perf_counter()
+                if skip:
+                    logging.info(f"{self.name}: skipping {step.name}, "
+                                 "its inputs are unchanged")
+                else:
+                    logging.debug(f"{self.name}: running {step.name}")
+                    step.run(db)
+                seconds = perf_counter() - start
+                steps_db.record(self.name,
+                                step.name,
+                                fingerprint,
+                                seconds,
+                                skip)
+            self.timings[step.name] = None if skip else seconds
+
+    def _log_timings(self, seconds: float):
+        """Logs the slowest steps, and wall time against the sum"""
+
+        ran = {k: v for k, v in self.timings.items() if v is not None}
+        for name, step_seconds in sorted(ran.items(),
+                                         key=lambda x: x[1],
+                                         reverse=True)[:10]:
+            logging.debug(f"{self.name}: {name} took {step_seconds:.2f}s")
+        logging.info(f"{self.name}: ran {len(ran)} steps, skipped "
+                     f"{len(self.timings) - len(ran)}, in {seconds:.2f}s. "
+                     f"Steps summed to {sum(ran.values()):.2f}s, critical "
+                     f"path was {self.get_critical_path():.2f}s")
+
+    @staticmethod
+    def _parse(sql: str) -> tuple:
+        """Returns (inputs, outputs, verb) of a statement
+
+        inputs is None if the statement isn't understood.
+        """
+
+        sql = " ".join(sql.split())
+        reads = [x.lower() for x in
+                 re.findall(r"\b(?:FROM|JOIN)\s+(\w+)", sql, re.I)]
+        match = re.match(r"DROP TABLE (?:IF EXISTS )?(\w+)", sql, re.I)
+        if match:
+            return [], [match.group(1).lower()], "drop"
+        match = re.match(r"CREATE (?:UNLOGGED )?TABLE (?:IF NOT EXISTS )?"
+                         r"(\w+)", sql, re.I)
+        if match:
+            return reads, [match.group(1).lower()], "create"
+        match = re.match(r"CREATE (?:UNIQUE )?INDEX (?:IF NOT EXISTS )?"
+                         r"(?:\w+ )?ON (\w+)", sql, re.I)
+        if match:
+            return [match.group(1).lower()], [match.group(1).lower()], "index"
+        match = re.match(r"ALTER TABLE (\w+)", sql, re.I)
+        if match:
+            table = match.group(1).lower()
+            return [table] + reads, [table], "alter"
+        return None, [], "barrier"
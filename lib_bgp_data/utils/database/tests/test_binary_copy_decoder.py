@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the binary_copy_decoder.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from collections import namedtuple
+import struct
+
+import numpy as np
+import pytest
+
+from ..binary_copy_decoder import Binary_Copy_Decoder
+
+Column = namedtuple("Column", ["name", "type_code"])
+
+
+def _get_copy_output(rows, formats):
+    """Returns rows in the binary COPY format, None for NULL"""
+
+    buf = Binary_Copy_Decoder.signature + struct.pack(">ii", 0, 0)
+    for row in rows:
+        buf += struct.pack(">h", len(row))
+        for value, fmt in zip(row, formats):
+            if value is None:
+                buf += struct.pack(">i", -1)
+            else:
+                buf += struct.pack(">i" + fmt, struct.calcsize(fmt), value)
+    return buf + struct.pack(">h", -1)
+
+
+@pytest.mark.database
+class Test_Binary_Copy_Decoder:
+    """Tests the Binary_Copy_Decoder class"""
+
+    def test_decode(self):
+        """Fixed width columns are decoded into native arrays"""
+
+        description = [Column("asn", 20), Column("impliment", 16),
+                       Column("percent", 701)]
+        rows = [(1, True, .5), (2**40, False, -1.0)]
+        buf = _get_copy_output(rows, ["q", "?", "d"])
+        columns = Binary_Copy_Decoder(description).decode(buf)
+        assert columns["asn"].tolist() == [1, 2**40]
+        assert columns["impliment"].tolist() == [True, False]
+        assert columns["percent"].tolist() == [.5, -1.0]
+        assert columns["asn"].dtype == np.dtype("=i8")
+
+    def test_empty(self):
+        """No rows gives empty arrays"""
+
+        decoder = Binary_Copy_Decoder([Column("asn", 23)])
+        assert decoder.decode(_get_copy_output([], ["i"]))["asn"].size == 0
+
+    def test_null(self):
+        """NULLs can't be decoded all at once"""
+
+        decoder = Binary_Copy_Decoder([Column("a", 23)])
+        assert decoder.decode(_get_copy_output([(1,), (None,)], ["i"])) is None
+        # Five NULL rows are the size of three rows, but still aren't read
+        assert decoder.decode(_get_copy_output([(None,)] * 5, ["i"])) is None
+
+    def test_unsupported_type(self):
+        """Variable width types aren't decoded"""
+
+        decoder = Binary_Copy_Decoder([Column("asn", 23),
+                                       Column("prefix", 650)])
+        assert decoder.dtype is None
+        assert decoder.decode(b"") is None
+
+    def test_rows_to_columns(self):
+        """Tuples are made into arrays, NULLs make object arrays"""
+
+        columns = Binary_Copy_Decoder.rows_to_columns([(1, None), (2, "a")],
+                                                      ["x", "y"])
+        assert columns["x"].tolist() == [1, 2]
+        assert columns["y"].dtype == object
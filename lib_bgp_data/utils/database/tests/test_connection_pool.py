@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the connection_pool.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import multiprocessing
+import os
+
+import pytest
+
+from ..config import Config
+from ..connection_pool import Connection_Pool
+from ..database import Database
+
+
+def _get_pool_pid(_):
+    """Returns the pid of the pool of the process it's run in"""
+
+    return os.getpid(), Connection_Pool.get().pid
+
+
+@pytest.mark.database
+class Test_Connection_Pool:
+    """Tests the Connection_Pool class"""
+
+    def test_pool_per_process(self):
+        """A forked child gets an empty pool of its own"""
+
+        parent = Connection_Pool.get()
+        assert parent is Connection_Pool.get()
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            pid, pool_pid = pool.map(_get_pool_pid, [0])[0]
+        assert pid == pool_pid != parent.pid
+
+    def test_foreign_connection_is_not_closed(self):
+        """Connections checked out by another process are only kept"""
+
+        class Connection:
+            def close(self):
+                raise AssertionError("Closed another process's connection")
+
+        conn = Connection()
+        Connection_Pool().checkin(conn, {})
+        assert conn in Connection_Pool._inherited
+        Connection_Pool._inherited.remove(conn)
+
+    def test_reuse(self):
+        """A closed Database's connection is handed to the next one"""
+
+        pool = Connection_Pool.get()
+        with Database() as db:
+            conn = db.conn
+        with Database() as db:
+            assert db.conn is conn
+            assert db.execute("SELECT 1 AS x") == [{"x": 1}]
+        assert pool.reuses >= 1
+
+    def test_cursor_factory_reset(self):
+        """A reused connection has the cursor factory it was asked for"""
+
+        with Database(cursor_factory=None) as db:
+            assert db.execute("SELECT 1 AS x") == [(1,)]
+        with Database() as db:
+            assert db.execute("SELECT 1 AS x") == [{"x": 1}]
+
+    def test_overflow(self):
+        """Past max_size, connections are opened and closed on return"""
+
+        pool = Connection_Pool(max_size=1)
+        creds = Config().get_db_creds()
+        first = pool.checkout(creds)
+        second = pool.checkout(creds)
+        pool.checkin(second, creds)
+        assert second.closed
+        pool.checkin(first, creds)
+        assert not first.closed
+        assert pool.idle_count == 1
+        pool.close_all()
+        assert first.closed
+
+    def test_broken_connection(self):
+        """A connection that was closed is never handed out again"""
+
+        pool = Connection_Pool()
+        creds = Config().get_db_creds()
+        conn = pool.checkout(creds)
+        pool.checkin(conn, creds)
+        conn.close()
+        assert pool.checkout(creds) is not conn
+        pool.close_all()
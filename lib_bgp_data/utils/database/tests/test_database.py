@@ -13,8 +13,10 @@ __email__ = "jfuruness@gmail.com"
 __status__ = "Development"
 
 
+import psycopg2.extensions
 import pytest
 
+from ..connection_pool import Connection_Pool
 from ..database import Database
 
 
@@ -79,3 +81,70 @@ class Test_Database:
         Restarting postgres should not have lots of extra memory
         """
         pass
+
+    def test_stream(self):
+        """Tests streaming rows and batches of rows from a query
+
+        Should give the same rows as execute, in itersize batches,
+        and leave the connection free for other queries meanwhile
+        """
+
+        sql = "SELECT generate_series(1, 25) AS x"
+        with Database() as db:
+            rows = db.stream(sql, itersize=10)
+            assert next(rows) == {"x": 1}
+            # The stream is on another connection
+            assert db.execute("SELECT 2 AS y") == [{"y": 2}]
+            assert [x["x"] for x in rows] == list(range(2, 26))
+            batches = list(db.stream(sql, itersize=10, batches=True))
+            assert [len(x) for x in batches] == [10, 10, 5]
+            assert sum(batches, []) == db.execute(sql)
+
+    def test_stream_closed_early(self):
+        """Tests that a stream that isn't finished is cleaned up"""
+
+        with Database() as db:
+            rows = db.stream("SELECT generate_series(1, 100) AS x",
+                             itersize=10)
+            assert next(rows) == {"x": 1}
+            rows.close()
+            assert db.execute("SELECT 1 AS x") == [{"x": 1}]
+
+    def test_stream_context_manager(self):
+        """Breaking out of a stream used with with gives back its connection
+
+        It must be idle in the pool again, with no transaction open.
+        """
+
+        pool = Connection_Pool.get()
+        with Database() as db:
+            idle = pool.idle_count
+            with db.stream("SELECT generate_series(1, 100) AS x",
+                           itersize=10) as rows:
+                for row in rows:
+                    if row["x"] == 5:
+                        break
+                assert pool.idle_count == max(idle - 1, 0)
+            assert pool.idle_count == max(idle, 1)
+            conn = pool.checkout(db._creds)
+            assert conn.status == psycopg2.extensions.STATUS_READY
+            pool.checkin(conn, db._creds)
+
+    def test_fetch(self):
+        """Tests the tuples and numpy fetch modes
+
+        Fixed width columns come from the binary copy, others and
+        NULLs from tuples, and both should give the same arrays
+        """
+
+        sql = """SELECT x AS asn, x %% 2 = 0 AS even, x::REAL / 2 AS half
+              FROM generate_series(1, 5) x WHERE x > %s"""
+        with Database() as db:
+            assert db.fetch(sql, [3]) == [(4, True, 2.0), (5, False, 2.5)]
+            columns = db.fetch(sql, [3], mode="numpy")
+            assert columns["asn"].tolist() == [4, 5]
+            assert columns["even"].tolist() == [True, False]
+            columns = db.fetch("SELECT NULL::INT AS x, '1.2.0.0/16'::CIDR AS y",
+                               mode="numpy")
+            assert columns["x"].tolist() == [None]
+            assert columns["y"].tolist() == ["1.2.0.0/16"]
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the metadata_cache.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import psycopg2.errors
+import pytest
+
+from ..generic_table import Generic_Table
+from ..metadata_cache import Metadata_Cache
+
+
+@pytest.fixture
+def cache():
+    """Caches tables a, b, and c, and clears the cache after"""
+
+    for name in ["a", "b", "c"]:
+        Metadata_Cache.add_table("db", name)
+        Metadata_Cache.set_columns("db", name, ["x"])
+    yield Metadata_Cache
+    Metadata_Cache.clear()
+
+
+@pytest.mark.database
+class Test_Metadata_Cache:
+    """Tests the Metadata_Cache class"""
+
+    @pytest.mark.parametrize("sql, removed",
+                             [("SELECT * FROM a", []),
+                              ("DROP TABLE IF EXISTS a, b", ["a", "b"]),
+                              ("ALTER TABLE ONLY public.c ADD y INT", ["c"]),
+                              ("""CREATE UNLOGGED TABLE IF NOT EXISTS a AS
+                                  (SELECT * FROM b)""", ["a"]),
+                              ("CREATE INDEX ON a(x)", []),
+                              ("DROP SCHEMA public CASCADE", ["a", "b", "c"])])
+    def test_invalidate_sql(self, cache, sql, removed):
+        """Only tables whose schema changes are removed"""
+
+        cache.invalidate_sql("db", sql)
+        for name in ["a", "b", "c"]:
+            assert cache.has_table("db", name) == (name not in removed)
+            assert (cache.get_columns("db", name) is None) == (name in removed)
+
+    def test_databases(self, cache):
+        """Tables of other databases are separate"""
+
+        assert not cache.has_table("other_db", "a")
+        cache.invalidate_sql("other_db", "DROP TABLE a")
+        assert cache.has_table("db", "a")
+
+    def test_subclass_checked_when_defined(self):
+        """A Table with CREATE TABLE fails when it's defined"""
+
+        with pytest.raises(Exception, match="unlogged"):
+            class Bad_Table(Generic_Table):
+                name = "bad"
+
+                def _create_tables(self):
+                    self.execute("CREATE TABLE bad (x INT)")
+
+    def test_create_tables_once(self):
+        """_create_tables is skipped once the table exists"""
+
+        class Cache_Test_Table(Generic_Table):
+            name = "metadata_cache_test"
+            creates = 0
+
+            def _create_tables(self):
+                Cache_Test_Table.creates += 1
+                self.execute(f"""CREATE UNLOGGED TABLE IF NOT EXISTS
+                             {self.name} (x INT, y_id INT)""")
+
+        Metadata_Cache.clear()
+        with Cache_Test_Table() as db:
+            assert db.columns == ["x"]
+            db.execute(f"ALTER TABLE {db.name} ADD COLUMN z INT")
+            assert db.columns == ["x", "z"]
+        with Cache_Test_Table(clear=True) as db:
+            assert db.columns == ["x"]
+        with Cache_Test_Table() as db:
+            db.clear_table()
+        # On the first connect, after the ALTER, and after the clear
+        assert Cache_Test_Table.creates == 3
+        Metadata_Cache.clear()
+
+    def test_dropped_elsewhere(self):
+        """A table dropped behind the cache's back is created again"""
+
+        class Dropped_Test_Table(Generic_Table):
+            name = "metadata_cache_dropped_test"
+
+            def _create_tables(self):
+                self.execute(f"""CREATE UNLOGGED TABLE IF NOT EXISTS
+                             {self.name} (x INT)""")
+
+        Metadata_Cache.clear()
+        with Dropped_Test_Table() as db:
+            database = db._creds["database"]
+            assert Metadata_Cache.has_table(database, db.name)
+            # Not through execute, so the cache isn't told
+            db.cursor.execute(f"DROP TABLE {db.name}")
+            assert Metadata_Cache.has_table(database, db.name)
+            assert db.get_count() == 0
+            # Another cached table that's gone is forgotten, not retried
+            Metadata_Cache.add_table(database, "metadata_cache_gone")
+            with pytest.raises(psycopg2.errors.UndefinedTable):
+                db.execute("SELECT * FROM metadata_cache_gone")
+            assert not Metadata_Cache.has_table(database,
+                                                "metadata_cache_gone")
+        Metadata_Cache.clear()
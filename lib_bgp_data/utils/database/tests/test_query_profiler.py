@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the query_profiler.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import pytest
+
+from ..database import Database
+from ..query_profiler import Query_Profiler
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    """Enables the profiler with a new file, and disables it after"""
+
+    Query_Profiler.enable(str(tmp_path / "profile.jsonl"),
+                          threshold_seconds=0)
+    yield Query_Profiler
+    Query_Profiler.disable()
+
+
+@pytest.mark.database
+class Test_Query_Profiler:
+    """Tests the Query_Profiler class"""
+
+    def test_report(self, profiler):
+        """Statements are grouped and ranked by total time"""
+
+        profiler.explain = False
+        for seconds in [1, 2, 3]:
+            profiler.record(None, "SELECT * FROM a WHERE x = %s", [1],
+                            seconds, 10)
+        profiler.record(None, "SELECT *\n   FROM b", [], 5, -1)
+        report = profiler.report()
+        assert [x["statement"] for x in report] == [
+            "SELECT * FROM a WHERE x = %s", "SELECT * FROM b"]
+        assert report[0]["calls"] == 3
+        assert report[0]["total_seconds"] == 6
+        assert report[0]["mean_seconds"] == 2
+        assert report[0]["max_seconds"] == 3
+        assert report[0]["rows"] == 30
+        assert report[1]["rows"] == 0
+        assert profiler.report(top=1) == report[:1]
+        assert profiler.report(since="9999") == []
+
+    @pytest.mark.parametrize("sql, explainable",
+                             [("SELECT 1", "SELECT 1"),
+                              ("""CREATE UNLOGGED TABLE IF NOT EXISTS t AS (
+                                  SELECT 1)""", "( SELECT 1)"),
+                              ("DELETE FROM t", "DELETE FROM t"),
+                              ("CREATE INDEX ON t(x)", None),
+                              ("VACUUM ANALYZE;", None)])
+    def test_get_explainable(self, sql, explainable):
+        """Only the statements EXPLAIN supports are explained"""
+
+        sql = Query_Profiler._get_explainable(sql)
+        if sql is not None:
+            sql = Query_Profiler.normalize(sql)
+        assert sql == explainable
+
+    def test_explain_once(self, profiler):
+        """Slow statements are explained the first time only"""
+
+        sql = "SELECT generate_series(1, 10) AS x"
+        with Database() as db:
+            db.execute(sql)
+            db.execute(sql)
+            db.execute("CREATE TEMP TABLE profiler_test AS (SELECT 1 AS x)")
+            db.execute("SELECT * FROM profiler_test")
+        records = profiler.read(profiler.path)
+        assert [x["rowcount"] for x in records[:2]] == [10, 10]
+        assert "Plan" in records[0]["plan"][0]
+        assert "plan" not in records[1]
+        # Only the query of CREATE TABLE AS is explained
+        assert "Plan" in records[2]["plan"][0]
+        # Plain EXPLAIN runs on the same connection, so sees temp tables
+        assert "Plan" in records[3]["plan"][0]
+        # Nothing was run again
+        assert "Actual Rows" not in records[0]["plan"][0]["Plan"]
+
+    def test_explain_analyze(self, profiler):
+        """With analyze, DML is explained and rolled back"""
+
+        profiler.analyze = True
+        with Database() as db:
+            db.execute("DROP TABLE IF EXISTS profiler_analyze")
+            db.execute("CREATE UNLOGGED TABLE profiler_analyze AS "
+                       "(SELECT 1 AS x)")
+            db.execute("DELETE FROM profiler_analyze")
+            db.execute("INSERT INTO profiler_analyze VALUES (1)")
+            records = profiler.read(profiler.path)
+            assert "Actual Rows" in records[-1]["plan"][0]["Plan"]
+            # The explained insert was rolled back
+            assert len(db.execute("SELECT * FROM profiler_analyze")) == 1
+            db.execute("DROP TABLE profiler_analyze")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the sql_pipeline.py file.
+
+For specifics on each test, see the docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from importlib.util import module_from_spec, spec_from_file_location
+import sys
+
+import pytest
+
+from ..database import Database
+from ..sql_pipeline import SQL_Pipeline, SQL_Pipeline_Steps_Table, SQL_Step
+
+
+@pytest.mark.database
+class Test_SQL_Pipeline:
+    """Tests the SQL_Pipeline class"""
+
+    def test_dependencies(self):
+        """Steps wait for writes of their inputs and reads of outputs"""
+
+        pipeline = SQL_Pipeline("test")
+        pipeline.add("a", sql="a", inputs=["x"], outputs=["a"])
+        pipeline.add("b", sql="b", inputs=["x"], outputs=["b"])
+        pipeline.add("a_index", sql="i", inputs=["a"], outputs=["a_i"])
+        pipeline.add("c", sql="c", inputs=["a", "b"], outputs=["c"])
+        # Overwrites x, so it must wait for everything that reads it
+        pipeline.add("x", sql="x", inputs=[], outputs=["x"])
+        assert pipeline.get_dependencies() == {"a": set(),
+                                               "b": set(),
+                                               "a_index": {"a"},
+                                               "c": {"a", "b"},
+                                               "x": {"a", "b"}}
+
+    def test_barrier(self):
+        """A barrier waits for all steps before it, and is waited on"""
+
+        pipeline = SQL_Pipeline("test")
+        pipeline.add("a", sql="a", inputs=[], outputs=["a"])
+        pipeline.add("vacuum", sql="VACUUM ANALYZE;", inputs=None)
+        pipeline.add("b", sql="b", inputs=[], outputs=["b"])
+        dependencies = pipeline.get_dependencies()
+        assert dependencies["vacuum"] == {"a"}
+        assert dependencies["b"] == {"vacuum"}
+
+    def test_critical_path(self):
+        """The longest chain of dependent steps, not the sum"""
+
+        pipeline = SQL_Pipeline("test")
+        pipeline.add("a", sql="a", inputs=[], outputs=["a"])
+        pipeline.add("b", sql="b", inputs=[], outputs=["b"])
+        pipeline.add("c", sql="c", inputs=["a"], outputs=["c"])
+        assert pipeline.get_critical_path({"a": 1, "b": 5, "c": 2}) == 5
+        assert pipeline.get_critical_path({"a": 4, "b": 5, "c": 2}) == 6
+
+    def test_from_statements(self):
+        """Tables are read from the sql, indexes don't wait on each other"""
+
+        sqls = ["DROP TABLE IF EXISTS t",
+                "CREATE UNLOGGED TABLE IF NOT EXISTS t AS (SELECT * FROM m)",
+                "CREATE INDEX ON t(a);",
+                "CREATE INDEX ON t USING GIST(prefix inet_ops, origin);",
+                """CREATE UNLOGGED TABLE u AS (SELECT * FROM t
+                    INNER JOIN m ON m.a = t.a)""",
+                "VACUUM ANALYZE;"]
+        pipeline = SQL_Pipeline.from_statements("test", sqls)
+        dependencies = pipeline.get_dependencies()
+        names = [x.name for x in pipeline.steps]
+        assert names == ["0_drop_t", "1_create_t", "2_index_t_index_2",
+                         "3_index_t_index_3", "4_create_u", "5_barrier"]
+        assert dependencies["1_create_t"] == {"0_drop_t"}
+        # Redundant dependencies (on 0_drop_t) are fine
+        assert dependencies["2_index_t_index_2"] >= {"1_create_t"}
+        assert dependencies["3_index_t_index_3"] >= {"1_create_t"}
+        assert "2_index_t_index_2" not in dependencies["3_index_t_index_3"]
+        assert dependencies["4_create_u"] >= {"1_create_t",
+                                              "2_index_t_index_2",
+                                              "3_index_t_index_3"}
+        assert dependencies["5_barrier"] == set(names[:5])
+
+    def test_definition_has_table_source(self, tmp_path, monkeypatch):
+        """Changing a Table's fill_table changes the step's definition"""
+
+        definitions = []
+        for i, sql in enumerate(["SELECT 1", "SELECT 2"]):
+            path = tmp_path / f"definition_test_{i}.py"
+            path.write_text("from lib_bgp_data.utils.database import "
+                            "Generic_Table\n\n"
+                            "class Definition_Test_Table(Generic_Table):\n"
+                            "    name = 'definition_test'\n\n"
+                            "    def fill_table(self):\n"
+                            f"        self.execute('{sql}')\n")
+            spec = spec_from_file_location(path.stem, path)
+            module = module_from_spec(spec)
+            # inspect finds a class's file through sys.modules
+            monkeypatch.setitem(sys.modules, path.stem, module)
+            spec.loader.exec_module(module)
+            Table = module.Definition_Test_Table
+            # The lambda's source is the same both times
+            step = SQL_Step(Table.name,
+                            func=lambda db, Table=Table: Table().fill_table(),
+                            outputs=[Table.name])
+            assert step._get_tables() == [Table]
+            definitions.append(step.get_definition())
+        assert definitions[0] != definitions[1]
+
+    def test_run(self):
+        """Steps run, and are skipped when their inputs are unchanged"""
+
+        sqls = ["DROP TABLE IF EXISTS pipeline_test_a",
+                """CREATE UNLOGGED TABLE pipeline_test_a AS
+                    (SELECT generate_series(1, 100) AS x)"""]
+        pipeline = SQL_Pipeline("test", workers=2, skip_unchanged=True)
+        pipeline.add("a", sql=sqls, inputs=[], outputs=["pipeline_test_a"])
+        pipeline.add("b",
+                     sql=["DROP TABLE IF EXISTS pipeline_test_b",
+                          """CREATE UNLOGGED TABLE pipeline_test_b AS
+                          (SELECT x FROM pipeline_test_a WHERE x > 50)"""],
+                     inputs=["pipeline_test_a"],
+                     outputs=["pipeline_test_b"])
+        timings = pipeline.run()
+        assert all(x is not None for x in timings.values())
+        with Database() as db:
+            sql = "SELECT COUNT(*) FROM pipeline_test_b"
+            assert db.execute(sql)[0]["count"] == 50
+        # Nothing changed, so both are skipped
+        assert all(x is None for x in pipeline.run().values())
+        with Database() as db:
+            db.execute("DROP TABLE pipeline_test_b")
+            db.execute("DROP TABLE pipeline_test_a")
+        with SQL_Pipeline_Steps_Table() as db:
+            db.execute(f"DELETE FROM {db.name} WHERE pipeline = 'test'")
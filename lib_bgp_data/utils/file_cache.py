@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This module contains class File_Cache
+
+The purpose of this class is to keep downloaded files on disk so that
+re-running a parser over the same data doesn't download it again. For
+example, re-running the MRT_Parser after a database crash, or with a
+different IPV4/IPV6 filter, used to re-download every RIB.
+
+Design choices:
+    -Files are stored under the sha256 of their url, next to a json
+     file with the url, size, ETag, and Last-Modified. A hit compares
+     these with a HEAD request first, so a file republished at the
+     same url is downloaded again. If the HEAD request fails (offline,
+     or the source is gone), the cached file is used. Pass
+     revalidate=False to skip the HEAD request entirely
+    -Downloads go to a .part file first, and utils.download_file
+     resumes it with an HTTP Range request. So a crashed run picks up
+     where it left off. The .part file has its own json file with the
+     ETag and Last-Modified it was downloaded with, sent as If-Range,
+     so a url that changed since is downloaded from the start. A .part
+     file without one is deleted
+    -Hits are hard linked into the requested path (copied if the cache
+     is on another filesystem). Parsers delete their files when done,
+     which only removes the link, not the cached file.
+    -Least recently used files are evicted once the cache is over
+     max_bytes. A hit touches the file, so mtime is the last use.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from hashlib import sha256
+import json
+import logging
+import os
+import shutil
+import ssl
+from threading import Lock
+import urllib.request
+
+from . import utils
+
+
+class File_Cache:
+    """On disk cache of downloaded files with LRU eviction.
+
+    In depth explanation at the top of the module.
+    """
+
+    __slots__ = ["cache_dir", "max_bytes", "_lock"]
+
+    def __init__(self,
+                 cache_dir: str = "/tmp/lib_bgp_data_cache",
+                 max_bytes: int = 200 * 10**9):
+        """Creates the cache dir if it doesn't exist"""
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Downloads run in threads, eviction must not run twice at once
+        self._lock = Lock()
+        os.makedirs(self.cache_dir, mode=0o777, exist_ok=True)
+
+    def download_file(self, url: str, path: str, *args, revalidate=True,
+                      **kwargs):
+        """Same as utils.download_file, but served from cache if possible
+
+        args and kwargs are passed to utils.download_file on a miss.
+        """
+
+        data_path = self._data_path(url)
+        verify = kwargs.get("verify", True)
+        if self._is_cached(url, revalidate, verify):
+            logging.debug(f"Cache hit for {url}")
+            # Touch the file so that it's the most recently used
+            os.utime(data_path)
+        else:
+            part_path = f"{data_path}.part"
+            part_meta_path = f"{part_path}.json"
+            remote = self._remote_info(url, verify)
+            part_meta = self._read_meta(part_meta_path)
+            if part_meta is None:
+                # Unknown where the bytes came from, so they can't be used
+                utils.delete_paths(part_path)
+            if part_meta is None or not os.path.exists(part_path):
+                part_meta = remote
+                with open(part_meta_path, "w") as f:
+                    json.dump(part_meta, f)
+            # Resume in case a previous run was interrupted
+            utils.download_file(url, part_path, *args, resume=True,
+                                if_range=self._get_validator(part_meta),
+                                **kwargs)
+            os.replace(part_path, data_path)
+            utils.delete_paths(part_meta_path)
+            remote["size"] = os.path.getsize(data_path)
+            with open(self._meta_path(url), "w") as f:
+                json.dump(remote, f)
+            self._evict(keep=data_path)
+        self._link(data_path, path)
+
+    def clear(self):
+        """Deletes everything in the cache"""
+
+        utils.delete_paths(self.cache_dir)
+        os.makedirs(self.cache_dir, mode=0o777, exist_ok=True)
+
+########################
+### Helper Functions ###
+########################
+
+    def _is_cached(self, url: str, revalidate: bool, verify=True) -> bool:
+        """Returns True if the url is fully downloaded and still valid"""
+
+        meta = self._read_meta(self._meta_path(url))
+        if meta is None:
+            return False
+        data_path = self._data_path(url)
+        if (not os.path.exists(data_path)
+                or os.path.getsize(data_path) != meta["size"]):
+            return False
+        if not revalidate:
+            return True
+        remote = self._remote_info(url, verify)
+        # The HEAD request failed, so there's nothing to compare with
+        if "size" not in remote:
+            return True
+        # Validators the server doesn't send can't be compared
+        return all(remote.get(x) in [None, meta.get(x)]
+                   for x in ["size", "etag", "last_modified"])
+
+    def _read_meta(self, meta_path: str) -> dict:
+        """Returns the contents of a json metadata file, or None"""
+
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _get_validator(meta: dict) -> str:
+        """Returns the ETag or Last-Modified to send as If-Range, or None
+
+        If-Range needs a strong validator, so weak ETags aren't used.
+        """
+
+        etag = meta.get("etag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return meta.get("last_modified")
+
+    def _remote_info(self, url: str, verify=True) -> dict:
+        """Returns the url, size, ETag, and Last-Modified of a url
+
+        These come from a HEAD request. Verify: SSL certificate
+        """
+
+        info = {"url": url}
+        try:
+            request = urllib.request.Request(url, method="HEAD")
+            context = None if verify else ssl._create_unverified_context()
+            with urllib.request.urlopen(request,
+                                        timeout=60,
+                                        context=context) as response:
+                length = response.headers.get("Content-Length")
+                info["size"] = int(length) if length else None
+                info["etag"] = response.headers.get("ETag")
+                info["last_modified"] = response.headers.get("Last-Modified")
+        # The download itself will retry and fail loudly if needed
+        except Exception as e:
+            logging.debug(f"HEAD request failed for {url}: {e}")
+        return info
+
+    def _evict(self, keep: str):
+        """Removes least recently used files until under max_bytes"""
+
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                # Only complete data files count, json files are tiny
+                if "." in name or path == keep:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(x[1] for x in entries)
+            if os.path.exists(keep):
+                total += os.path.getsize(keep)
+            # Oldest first
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                logging.debug(f"Evicting {path} from cache")
+                utils.delete_paths([path, f"{path}.json"])
+                total -= size
+
+    def _link(self, data_path: str, path: str):
+        """Hard links the cached file to path, copies if that fails"""
+
+        utils.delete_paths(path)
+        try:
+            os.link(data_path, path)
+        except OSError:
+            shutil.copyfile(data_path, path)
+
+    def _data_path(self, url: str) -> str:
+        """Returns the path of the cached file for a url"""
+
+        return os.path.join(self.cache_dir,
+                            sha256(url.encode()).hexdigest())
+
+    def _meta_path(self, url: str) -> str:
+        """Returns the path of the json metadata for a url"""
+
+        return f"{self._data_path(url)}.json"
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the file_cache.py file.
+For specifics on each test, see docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from threading import Thread
+import time
+
+import pytest
+
+from ..file_cache import File_Cache
+from .. import utils
+
+
+class Range_Handler(BaseHTTPRequestHandler):
+    """Serves server.data with Range and If-Range, like an archive"""
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def _respond(self, head: bool):
+        data, etag = self.server.data, self.server.etag
+        start = 0
+        byte_range = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        # A changed file is sent whole, as If-Range requires
+        if byte_range and if_range in [None, etag]:
+            start = int(byte_range[len("bytes="):].rstrip("-"))
+        if (start >= len(data) and start > 0) or self.server.always_416:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(data)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        if not head:
+            self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Returns a local server, set its data and etag to serve a file"""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Range_Handler)
+    server.data, server.etag = b"0123456789", '"v1"'
+    server.always_416 = False
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/rib.bz2"
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.utils
+class Test_File_Cache:
+    """Tests the File_Cache class, using file:// urls"""
+
+    def _source(self, tmp_path, name: str, data: bytes) -> str:
+        """Writes a source file and returns its url"""
+
+        path = tmp_path / name
+        path.write_bytes(data)
+        return f"file://{path}"
+
+    def test_hit_without_source(self, tmp_path):
+        """Second download must work with the source gone"""
+
+        cache = File_Cache(str(tmp_path / "cache"), 10**6)
+        url = self._source(tmp_path, "src", b"rib data")
+        cache.download_file(url, str(tmp_path / "a"))
+        os.remove(url[len("file://"):])
+        cache.download_file(url, str(tmp_path / "b"))
+        assert (tmp_path / "b").read_bytes() == b"rib data"
+        # Deleting the output (like parse_file does) keeps the cache
+        os.remove(tmp_path / "b")
+        cache.download_file(url, str(tmp_path / "c"))
+        assert (tmp_path / "c").read_bytes() == b"rib data"
+
+    def test_lru_eviction(self, tmp_path):
+        """The least recently used file is evicted over max_bytes"""
+
+        cache = File_Cache(str(tmp_path / "cache"), 25)
+        urls = [self._source(tmp_path, f"src{i}", bytes(10))
+                for i in range(3)]
+        cache.download_file(urls[0], str(tmp_path / "out"))
+        cache.download_file(urls[1], str(tmp_path / "out"))
+        # Make sure mtimes differ, then use the first file again
+        past = time.time() - 100
+        os.utime(cache._data_path(urls[1]), (past, past))
+        cache.download_file(urls[0], str(tmp_path / "out"))
+        cache.download_file(urls[2], str(tmp_path / "out"))
+        assert cache._is_cached(urls[0], False)
+        assert not cache._is_cached(urls[1], False)
+        assert cache._is_cached(urls[2], False)
+
+    def test_partial_download(self, tmp_path):
+        """A leftover .part file must not end up in the output"""
+
+        cache = File_Cache(str(tmp_path / "cache"), 10**6)
+        url = self._source(tmp_path, "src", b"0123456789")
+        with open(f"{cache._data_path(url)}.part", "wb") as f:
+            f.write(b"01234")
+        assert not cache._is_cached(url, False)
+        cache.download_file(url, str(tmp_path / "out"))
+        assert (tmp_path / "out").read_bytes() == b"0123456789"
+
+    def test_revalidate(self, tmp_path):
+        """A changed source is downloaded again, unless revalidate=False"""
+
+        cache = File_Cache(str(tmp_path / "cache"), 10**6)
+        url = self._source(tmp_path, "src", b"old")
+        cache.download_file(url, str(tmp_path / "out"))
+        self._source(tmp_path, "src", b"newer")
+        cache.download_file(url, str(tmp_path / "out"), revalidate=False)
+        assert (tmp_path / "out").read_bytes() == b"old"
+        cache.download_file(url, str(tmp_path / "out"))
+        assert (tmp_path / "out").read_bytes() == b"newer"
+
+    def test_republished_etag(self, tmp_path, server):
+        """A file republished with a new ETag is downloaded again"""
+
+        cache = File_Cache(str(tmp_path / "cache"), 10**6)
+        cache.download_file(server.url, str(tmp_path / "out"))
+        server.data, server.etag = b"abcdefghij", '"v2"'
+        cache.download_file(server.url, str(tmp_path / "out"))
+        assert (tmp_path / "out").read_bytes() == b"abcdefghij"
+
+    def test_416_last_retry(self, tmp_path, server):
+        """Running out of retries on a 416 must fail loudly"""
+
+        path = tmp_path / "out"
+        path.write_bytes(b"0123456789ab")
+        # Restarting from byte 0 never helps
+        server.always_416 = True
+        with pytest.raises(SystemExit):
+            utils.download_file(server.url, str(path), resume=True)
+
+    @pytest.mark.parametrize("etag, expected", [('"v1"', b"0123456789"),
+                                                ('"v0"', b"abcdefghij")])
+    def test_resume_if_range(self, tmp_path, server, etag, expected):
+        """A .part file is resumed only if its ETag still matches"""
+
+        cache = File_Cache(str(tmp_path / "cache"), 10**6)
+        server.data = expected
+        part_path = f"{cache._data_path(server.url)}.part"
+        with open(part_path, "wb") as f:
+            f.write(b"01234")
+        with open(f"{part_path}.json", "w") as f:
+            json.dump({"url": server.url, "etag": etag}, f)
+        cache.download_file(server.url, str(tmp_path / "out"))
+        assert (tmp_path / "out").read_bytes() == expected
+        assert not os.path.exists(f"{part_path}.json")
+
+    @pytest.mark.parametrize("local", [b"0123456789", b"0123456789ab"])
+    def test_416(self, tmp_path, server, local):
+        """A 416 is only done if the local size is the total size"""
+
+        path = tmp_path / "out"
+        path.write_bytes(local)
+        utils.download_file(server.url, str(path), resume=True)
+        assert path.read_bytes() == b"0123456789"
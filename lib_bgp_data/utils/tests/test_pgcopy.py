@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the pgcopy.py file.
+For specifics on each test, see docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+import logging
+import random
+from struct import pack
+import time
+
+import pytest
+
+from .. import utils
+from ..pgcopy import PGCOPY_Encoder
+
+
+@pytest.mark.utils
+class Test_PGCOPY_Encoder:
+    """Tests the binary COPY encoder against the documented format"""
+
+    def test_header_and_trailer(self):
+        """The stream must start with the signature and end with -1"""
+
+        chunks = list(PGCOPY_Encoder(["bigint"]).encode([]))
+        assert chunks[0] == b"PGCOPY\n\xff\r\n\x00" + bytes(8)
+        assert chunks[-1] == b"\xff\xff"
+
+    def test_integers_and_null(self):
+        """Each field is a length then the big endian value"""
+
+        encoder = PGCOPY_Encoder(["BIGINT", "integer", "smallint", "boolean"])
+        assert encoder.encode_row([-1, 2, 3, True]) == (
+            pack("!h", 4)
+            + pack("!iq", 8, -1)
+            + pack("!ii", 4, 2)
+            + pack("!ih", 2, 3)
+            + pack("!iB", 1, 1))
+        assert encoder.encode_row([None] * 4) == \
+            pack("!h", 4) + pack("!i", -1) * 4
+
+    @pytest.mark.parametrize("_type, prefix, expected", [
+        ("cidr", "1.2.3.0/24",
+         pack("!BBBB", 2, 24, 1, 4) + bytes([1, 2, 3, 0])),
+        ("inet", "1.2.3.4", pack("!BBBB", 2, 32, 0, 4) + bytes([1, 2, 3, 4])),
+        ("cidr", "2001:db8::/32",
+         pack("!BBBB", 3, 32, 1, 16) + bytes.fromhex("20010db8") + bytes(12))])
+    def test_networks(self, _type, prefix, expected):
+        """Family, bits, is_cidr, address length, then the address"""
+
+        row = PGCOPY_Encoder([_type]).encode_row([prefix])
+        assert row == pack("!hi", 1, len(expected)) + expected
+
+    def test_bigint_array(self):
+        """One dimension starting at 1, no nulls, int8 elements"""
+
+        row = PGCOPY_Encoder(["bigint[]"]).encode_row([(5, 6)])
+        body = pack("!iiiii", 1, 0, 20, 2, 1) + pack("!iqiq", 8, 5, 8, 6)
+        assert row == pack("!hi", 1, len(body)) + body
+        empty = PGCOPY_Encoder(["bigint[]"]).encode_row([[]])
+        assert empty == pack("!hi", 1, 12) + pack("!iii", 0, 0, 20)
+
+    def test_chunks(self):
+        """Rows are joined into chunks, so that reads are large"""
+
+        encoder = PGCOPY_Encoder(["integer"])
+        chunks = list(encoder.encode(([i] for i in range(5)),
+                                     rows_per_chunk=2))
+        # header, 3 chunks, trailer
+        assert len(chunks) == 5
+        assert b"".join(chunks[1:-1]) == b"".join(encoder.encode_row([i])
+                                                  for i in range(5))
+
+    def test_unsupported_type(self):
+        """Types without an encoder must fail before anything is sent"""
+
+        with pytest.raises(NotImplementedError):
+            PGCOPY_Encoder(["bigint", "text"])
+
+    @pytest.mark.slow
+    def test_text_vs_binary(self):
+        """Benchmarks text vs binary COPY for mrt_w_metadata rows
+
+        Both load the same rows. Counts must match, and the times for
+        each are logged.
+        """
+
+        from ...collectors.mrt.mrt_metadata.tables import MRT_W_Metadata_Table
+
+        random.seed(0)
+        rows = []
+        for i in range(200000):
+            path = [random.randrange(1, 400000) for _ in range(5)]
+            rows.append([f"{i % 250}.{i % 200}.0.0/16", path, path[-1], i,
+                         path[0], i, path[-1], i, i % 400, i % 4, i % 400,
+                         None, None])
+        text_rows = [[str(x).replace("[", "{").replace("]", "}")
+                      if isinstance(x, list) else x for x in row]
+                     for row in rows]
+        times = {}
+        csv_path = "/tmp/test_pgcopy.csv"
+        for binary, _rows in [(False, text_rows), (True, rows)]:
+            start = time.perf_counter()
+            utils.rows_to_db(_rows, csv_path, MRT_W_Metadata_Table,
+                             binary=binary)
+            times[binary] = time.perf_counter() - start
+            with MRT_W_Metadata_Table() as db:
+                assert db.get_count() == len(rows)
+        utils.delete_paths(csv_path)
+        logging.info(f"text: {times[False]}s binary: {times[True]}s")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This file contains tests for the utils.py file.
+For specifics on each test, see docstrings under each function.
+"""
+
+__authors__ = ["Justin Furuness"]
+__credits__ = ["Justin Furuness"]
+__Lisence__ = "BSD"
+__maintainer__ = "Justin Furuness"
+__email__ = "jfuruness@gmail.com"
+__status__ = "Development"
+
+
+import pytest
+
+from .. import utils
+
+
+@pytest.mark.utils
+class Test_Stream_File:
+    """Tests the Stream_File class used for COPY streaming"""
+
+    @pytest.mark.parametrize("size", [1, 3, 7, 100, -1])
+    def test_read(self, size):
+        """Reading in chunks of any size must return all the lines"""
+
+        lines = [f"{i}\t{{1, 2}}\t2\t{i}\n" for i in range(50)]
+        stream = utils.Stream_File(line for line in lines)
+        chunks = []
+        while True:
+            chunk = stream.read(size)
+            if not chunk:
+                break
+            if size > 0:
+                assert len(chunk) <= size
+            chunks.append(chunk)
+        assert "".join(chunks) == "".join(lines)
+
+    def test_empty(self):
+        """An empty iterator reads as EOF"""
+
+        assert utils.Stream_File([]).read(10) == ""
+
+
+@pytest.mark.utils
+class Test_Open_Decompressed:
+    """Tests open_decompressed, which streams compressed files"""
+
+    @pytest.mark.parametrize("compression", [None, "bz2", "gz"])
+    @pytest.mark.parametrize("parallel_min_bytes", [0, 2**30])
+    def test_read(self, tmp_path, compression, parallel_min_bytes):
+        """Every compression must read back the same, with no copies"""
+
+        import bz2
+        import gzip
+
+        path = str(tmp_path / "file")
+        data = "".join(f"1|{i}|-1|bgp\n" for i in range(10000))
+        _open = {None: open, "bz2": bz2.open, "gz": gzip.open}[compression]
+        with _open(path, "wt") as f:
+            f.write(data)
+        with utils.open_decompressed(path,
+                                     "rt",
+                                     parallel_min_bytes=parallel_min_bytes)\
+                as f:
+            assert f.read() == data
+        assert [x.name for x in tmp_path.iterdir()] == ["file"]
+
+    def test_close_early(self, tmp_path):
+        """Closing before the end must not raise"""
+
+        import bz2
+
+        path = str(tmp_path / "file")
+        with bz2.open(path, "wb") as f:
+            f.write(bytes(10**7))
+        with utils.open_decompressed(path, parallel_min_bytes=0) as f:
+            assert f.read(10) == bytes(10)
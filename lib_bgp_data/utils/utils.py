@@ -16,17 +16,19 @@ import csv
 from datetime import datetime, timedelta
 import fileinput
 import functools
+import io
 import json
 import logging
 from multiprocessing import cpu_count
 import os
-from subprocess import check_call, DEVNULL
+from subprocess import check_call, CalledProcessError, DEVNULL, PIPE, Popen
 import sys
 import time
 import smtplib
 from email.message import EmailMessage
 
 from bs4 import BeautifulSoup as Soup
+import bz2
 from bz2 import BZ2Decompressor
 import gzip
 from pathos.multiprocessing import ProcessingPool
@@ -37,6 +39,8 @@ import shutil
 from psutil import process_iter
 from signal import SIGTERM
 
+from .pgcopy import PGCOPY_Encoder
+
 
 # This decorator deletes paths before and after func is called
 def delete_files(files=[]):
@@ -153,9 +157,20 @@ def download_file(url: str,
                   total_files=1,
                   sleep_time=0,
                   progress_bar=False,
-                  verify=True):
+                  verify=True,
+                  resume=False,
+                  if_range=None):
     """Downloads a file from a url into a path.
-       Verify: SSL certificate"""
+       Verify: SSL certificate
+       Resume: continue a partial file already at path
+       If_range: ETag or Last-Modified of the partial file
+
+    Retries continue from where the last attempt stopped with an HTTP
+    Range request, rather than starting over from byte 0. If the server
+    ignores the range, or if_range no longer matches the url, the file
+    is rewritten from the start. A 416 only means the file is done if
+    its size is the total in the Content-Range, otherwise it restarts.
+    """
 
     log_level = logging.root.level
     if progress_bar:  # mrt_parser or multithreaded app running, disable log
@@ -170,13 +185,22 @@ def download_file(url: str,
         try:
             # Code for downloading files off of the internet
             import ssl
-            ctx = ssl._create_unverified_context() if verify \
-                    else ssl.create_default_context()
-
-            with urllib.request.urlopen(url, timeout=60, context=ctx)\
-                    as response, open(path, 'wb') as out_file:
-                # Copy the file into the specified file_path
-                shutil.copyfileobj(response, out_file)
+            ctx = ssl.create_default_context() if verify \
+                    else ssl._create_unverified_context()
+
+            start = os.path.getsize(path) if resume and os.path.exists(path)\
+                else 0
+            headers = {"Range": f"bytes={start}-"} if start else {}
+            if start and if_range:
+                headers["If-Range"] = if_range
+            request = urllib.request.Request(url, headers=headers)
+            with urllib.request.urlopen(request, timeout=60, context=ctx)\
+                    as response:
+                # 206 means the server honored the range
+                partial = start and getattr(response, "status", None) == 206
+                with open(path, "ab" if partial else "wb") as out_file:
+                    # Copy the file into the specified file_path
+                    shutil.copyfileobj(response, out_file)
                 low_overhead_log(f"{file_num} / {total_files} downloaded",
                                  log_level)
                 if progress_bar:
@@ -186,12 +210,31 @@ def download_file(url: str,
         # And the download will be retried
         except Exception as e:
             retries -= 1
-            time.sleep(5)
+            if getattr(e, "code", None) == 416:
+                # Range starts at the end of the file, so it's done
+                size = os.path.getsize(path) if os.path.exists(path) else None
+                if size is not None and get_range_total(e.headers) == size:
+                    return
+                logging.debug(f"Partial {path} doesn't match {url}")
+                # Otherwise the partial file is wrong, start over
+                resume = False
+            else:
+                # Whatever was written so far is kept for the next attempt
+                resume = True
+                time.sleep(5)
             if retries <= 0 or "No such file" in str(e):
                 logging.error(f"Failed download {url}\nDue to: {e}")
                 sys.exit(1)
 
 
+def get_range_total(headers) -> int:
+    """Returns N from a Content-Range of bytes */N, or None"""
+
+    content_range = headers.get("Content-Range", "") if headers else ""
+    total = content_range.rpartition("/")[2].strip()
+    return int(total) if total.isdigit() else None
+
+
 def incriment_bar(log_level: int):
     # Needed here because mrt_parser can't log
     if log_level <= 20:  # INFO
@@ -262,6 +305,52 @@ def unzip_gz(path):
         with open(path.replace(".gz", ""), 'wb') as f_out:
             shutil.copyfileobj(f_in, f_out)
 
+
+@contextmanager
+def open_decompressed(path: str,
+                      mode="rb",
+                      parallel=True,
+                      parallel_min_bytes=32 * 2**20,
+                      **kwargs):
+    """Opens a raw, bz2, or gz file as a stream, decompressing as it's read
+
+    Unlike unzip_bz2 and unzip_gz, no decompressed copy is written to
+    disk. Compression is detected by magic bytes, not the extension.
+    If parallel, files over parallel_min_bytes are decompressed by
+    lbzip2/pbzip2 (multi-core, block-parallel) or pigz in a separate
+    process when they are installed. kwargs (encoding, errors) are
+    passed to io.TextIOWrapper when mode is "rt".
+    """
+
+    with open(path, "rb") as f:
+        magic = f.read(3)
+    if magic == b"BZh":
+        tools, _open = ["lbzip2", "pbzip2"], bz2.open
+    elif magic[:2] == b"\x1f\x8b":
+        tools, _open = ["pigz"], gzip.open
+    else:
+        tools, _open = [], open
+
+    tools = [x for x in tools if shutil.which(x)]
+    proc = None
+    if parallel and tools and os.path.getsize(path) >= parallel_min_bytes:
+        proc = Popen([tools[0], "-dc", path], stdout=PIPE)
+        f = proc.stdout
+    else:
+        f = _open(path, "rb")
+    if "t" in mode:
+        f = io.TextIOWrapper(f, **kwargs)
+    try:
+        yield f
+    finally:
+        f.close()
+        if proc is not None:
+            proc.wait()
+            # Negative codes are from signals, such as SIGPIPE when the
+            # stream was closed before the end of the file
+            if proc.returncode > 0:
+                raise CalledProcessError(proc.returncode, proc.args)
+
 def write_csv(rows: list, csv_path: str):
     """Writes rows into csv_path, a tab delimited csv"""
 
@@ -314,11 +403,128 @@ def csv_to_db(Table, csv_path: str, clear_table=False):
     delete_paths(csv_path)
 
 
-def rows_to_db(rows: list, csv_path: str, Table, clear_table=True):
-    """Writes rows to csv and from csv to database"""
+class Stream_File:
+    """File like object that reads from an iterator of lines
+
+    psycopg2's copy_expert only needs a read method. This lets a
+    generator of tab delimited lines be copied into the database
+    without ever being written to disk. Only about size bytes are
+    held in memory at a time. Pass empty=b"" for chunks of bytes, such
+    as binary COPY data.
+    """
+
+    __slots__ = ["_lines", "_leftover"]
+
+    def __init__(self, lines, empty=""):
+        self._lines = iter(lines)
+        self._leftover = empty
+
+    def read(self, size: int = -1) -> str:
+        """Returns up to size characters, all of them if size < 0"""
+
+        chunks = [self._leftover]
+        total = len(self._leftover)
+        if size < 0 or total < size:
+            for line in self._lines:
+                chunks.append(line)
+                total += len(line)
+                if 0 <= size <= total:
+                    break
+        data = self._leftover[:0].join(chunks)
+        if size < 0 or len(data) <= size:
+            self._leftover = data[:0]
+            return data
+        self._leftover = data[size:]
+        return data[:size]
+
+
+def stream_to_db(Table,
+                 lines,
+                 clear_table=False,
+                 buffer_size=2**16,
+                 columns=None,
+                 table=None,
+                 checkpoint=True):
+    """Copies lines straight into table, with no csv in between
+
+    lines can be a file like object (such as a subprocess pipe) or
+    any iterable of tab delimited lines. This is the same as
+    csv_to_db, but without the write then reread of a csv file.
+    columns defaults to all of the table's columns except id.
+    table defaults to Table's name, and can be set to copy into a
+    staging table instead. If checkpoint is False, the caller is
+    expected to run one CHECKPOINT once all of its copies are done.
+    """
+
+    if not hasattr(lines, "read"):
+        lines = Stream_File(lines)
+    with Table() as t:
+        if clear_table:
+            t.clear_table()
+        t._create_tables()
+        if columns is None:
+            columns = [x for x in t.columns if x != "id"]
+        columns = ", ".join(columns)
+        sql = f"COPY {table or t.name}({columns}) FROM STDIN WITH (NULL '')"
+        # No logging for mrt_announcements, overhead slows it down too much
+        t.cursor.copy_expert(sql, lines, size=buffer_size)
+        if checkpoint:
+            t.cursor.execute("CHECKPOINT;")
+
+
+def binary_to_db(Table,
+                 rows,
+                 clear_table=False,
+                 buffer_size=2**16,
+                 columns=None,
+                 table=None,
+                 checkpoint=True):
+    """Copies rows into table with binary COPY, see pgcopy.py
+
+    Rows are python values (ints, prefix strings, lists of ints), not
+    csv strings, and are encoded as they are copied, so there is no
+    csv and postgres doesn't parse any text. Column types are read
+    from the table. columns, table and checkpoint are the same as in
+    stream_to_db.
+    """
+
+    with Table() as t:
+        if clear_table:
+            t.clear_table()
+        t._create_tables()
+        if columns is None:
+            columns = [x for x in t.columns if x != "id"]
+        sql = """SELECT attname, format_type(atttypid, atttypmod) AS type
+                 FROM pg_attribute
+                 WHERE attrelid = %s::regclass
+                    AND attnum > 0 AND NOT attisdropped"""
+        table = table or t.name
+        types = {x["attname"]: x["type"] for x in t.execute(sql, [table])}
+        encoder = PGCOPY_Encoder([types[x] for x in columns])
+        stream = Stream_File(encoder.encode(rows), b"")
+        sql = (f"COPY {table}({', '.join(columns)}) "
+               "FROM STDIN WITH (FORMAT binary)")
+        t.cursor.copy_expert(sql, stream, size=buffer_size)
+        if checkpoint:
+            t.cursor.execute("CHECKPOINT;")
+
+
+def rows_to_db(rows: list,
+               csv_path: str,
+               Table,
+               clear_table=True,
+               binary=False):
+    """Writes rows to csv and from csv to database
+
+    If binary, rows are copied with binary_to_db instead and no csv
+    is written. Rows must then hold python values, not csv strings.
+    """
 
-    write_csv(rows, csv_path)
-    csv_to_db(Table, csv_path, clear_table)
+    if binary:
+        binary_to_db(Table, rows, clear_table)
+    else:
+        write_csv(rows, csv_path)
+        csv_to_db(Table, csv_path, clear_table)
 
 
 def get_tags(url: str, tag: str, verify=True):
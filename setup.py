@@ -54,12 +54,17 @@ setup(
         'beautifulsoup4>=4.8.1',
         'psycopg2>=2.8.4',
         'matplotlib',
+        'numpy',
         'multiprocessing_logging',
         'ripe.atlas.tools',
         'selenium>=3.141.0',
         'tikzplotlib',
         'geoip2',
     ],
+    extras_require={
+        # For Database.fetch(mode="arrow")
+        'arrow': ['pyarrow'],
+    },
     classifiers=[
         'Environment :: Console',
         'Intended Audience :: Developers',